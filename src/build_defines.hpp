@@ -0,0 +1,5 @@
+#pragma once
+
+// Preprocessor defines of a build, e.g. SINGLE_SEED_WRITE. The default
+// build defines none; tests/build_cache.py writes this file for a build
+// with defines and puts it back afterwards.
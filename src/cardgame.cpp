@@ -2,6 +2,42 @@
 
 #define INFO
 
+#ifdef SINGLE_SEED_WRITE
+int cardgame::random(const int range)
+{
+    if (!seed_loaded)
+    {
+        auto seed_iterator = _seed.begin();
+        seed_value = seed_iterator == _seed.end() ? seed().value : seed_iterator->value;
+        seed_loaded = true;
+    }
+
+    int prime = 65537;
+    seed_value = (seed_value + now()) % prime;
+
+    return seed_value % range;
+}
+
+void cardgame::write_seed()
+{
+    if (!seed_loaded)
+        return;
+
+    auto seed_iterator = _seed.begin();
+    if (seed_iterator == _seed.end())
+    {
+        _seed.emplace(_self, [&](auto &new_seed) {
+            new_seed.value = seed_value;
+        });
+    }
+    else
+    {
+        _seed.modify(seed_iterator, _self, [&](auto &modified_seed) {
+            modified_seed.value = seed_value;
+        });
+    }
+}
+#else
 int cardgame::random(const int range)
 {
     auto seed_iterator = _seed.begin();
@@ -19,6 +55,7 @@ int cardgame::random(const int range)
 
     return new_seed_value % range;
 }
+#endif
 
 void cardgame::draw_one_card(vector<card_id> &deck, vector<card_id> &hand)
 {
@@ -170,10 +207,8 @@ void cardgame::resolve_selected_cards(game &game_data)
     }
 }
 
-void cardgame::update_game_status(user_info &user)
+void cardgame::update_game_status(user_info &user, game &game_data)
 {
-    game &game_data = user.game_data;
-
     if (0 >= game_data.life_ai)
     {
         game_data.status = PLAYER_WON;
@@ -207,6 +242,98 @@ void cardgame::update_game_status(user_info &user)
     }
 }
 
+void cardgame::play_card(user_info &user, game &game_data, const uint8_t player_card_idx)
+{
+    int ai_card_idx = ai_choose_card(game_data);
+    game_data.selected_card_ai = game_data.hand_ai[ai_card_idx];
+    game_data.hand_ai[ai_card_idx] = 0;
+    game_data.selected_card_player = game_data.hand_player[player_card_idx];
+    game_data.hand_player[player_card_idx] = 0;
+    resolve_selected_cards(game_data);
+    update_game_status(user, game_data);
+}
+
+void cardgame::draw_next_cards(game &game_data)
+{
+    game_data.selected_card_ai = 0;
+    game_data.selected_card_player = 0;
+    game_data.life_lost_ai = 0;
+    game_data.life_lost_player = 0;
+    if (game_data.deck_player.size() > 0)
+        draw_one_card(game_data.deck_player, game_data.hand_player);
+
+    if (game_data.deck_ai.size() > 0)
+        draw_one_card(game_data.deck_ai, game_data.hand_ai);
+}
+
+#ifdef PACKED_GAME
+static uint32_t pack_cards(const vector<uint8_t> &cards, const bool deck)
+{
+    uint32_t packed = 0;
+    for (int i = 0; i < cards.size(); i++)
+    {
+        if (deck)
+            packed |= 1u << (cards[i] - 1);
+        else
+            packed |= uint32_t(cards[i]) << (8 * i);
+    }
+    return packed;
+}
+
+static vector<uint8_t> unpack_deck(const uint32_t packed)
+{
+    vector<uint8_t> deck;
+    for (int i = 0; i < 32; i++)
+    {
+        if (packed >> i & 1)
+            deck.push_back(i + 1);
+    }
+    return deck;
+}
+
+static vector<uint8_t> unpack_hand(const uint32_t packed)
+{
+    vector<uint8_t> hand(4);
+    for (int i = 0; i < 4; i++)
+        hand[i] = packed >> (8 * i) & 0xFF;
+    return hand;
+}
+
+cardgame::packed_game cardgame::pack_game(const game &game_data)
+{
+    packed_game packed;
+    packed.status = game_data.status;
+    packed.life_player = game_data.life_player;
+    packed.life_ai = game_data.life_ai;
+    packed.deck_player = pack_cards(game_data.deck_player, true);
+    packed.deck_ai = pack_cards(game_data.deck_ai, true);
+    packed.hand_player = pack_cards(game_data.hand_player, false);
+    packed.hand_ai = pack_cards(game_data.hand_ai, false);
+    packed.selected_card_player = game_data.selected_card_player;
+    packed.selected_card_ai = game_data.selected_card_ai;
+    packed.life_lost_player = game_data.life_lost_player;
+    packed.life_lost_ai = game_data.life_lost_ai;
+    return packed;
+}
+
+cardgame::game cardgame::unpack_game(const packed_game &packed)
+{
+    game game_data;
+    game_data.status = packed.status;
+    game_data.life_player = packed.life_player;
+    game_data.life_ai = packed.life_ai;
+    game_data.deck_player = unpack_deck(packed.deck_player);
+    game_data.deck_ai = unpack_deck(packed.deck_ai);
+    game_data.hand_player = unpack_hand(packed.hand_player);
+    game_data.hand_ai = unpack_hand(packed.hand_ai);
+    game_data.selected_card_player = packed.selected_card_player;
+    game_data.selected_card_ai = packed.selected_card_ai;
+    game_data.life_lost_player = packed.life_lost_player;
+    game_data.life_lost_ai = packed.life_lost_ai;
+    return game_data;
+}
+#endif
+
 void cardgame::login(account_name username)
 {
     require_auth(username);
@@ -228,14 +355,15 @@ void cardgame::startgame(account_name username)
     auto &user = _users.get(username, "User does not exist");
 
     _users.modify(user, username, [&](auto &modified_user) {
-        game game_data;
+        with_game(modified_user, [&](game &game_data) {
+            game_data = game();
 
-        for (int i = 0; i < 4; i++)
-        {
-            draw_one_card(game_data.deck_player, game_data.hand_player);
-            draw_one_card(game_data.deck_ai, game_data.hand_ai);
-        }
-        modified_user.game_data = game_data;
+            for (int i = 0; i < 4; i++)
+            {
+                draw_one_card(game_data.deck_player, game_data.hand_player);
+                draw_one_card(game_data.deck_ai, game_data.hand_ai);
+            }
+        });
     });
 }
 
@@ -251,14 +379,9 @@ void cardgame::playcard(account_name username, uint8_t player_card_idx)
     eosio_assert(user.game_data.selected_card_player == 0, "You have already selected a card");
 
     _users.modify(user, username, [&](auto &modified_user) {
-        auto &game_data = modified_user.game_data;
-        int ai_card_idx = ai_choose_card(game_data);
-        game_data.selected_card_ai = game_data.hand_ai[ai_card_idx];
-        game_data.hand_ai[ai_card_idx] = 0;
-        game_data.selected_card_player = game_data.hand_player[player_card_idx];
-        game_data.hand_player[player_card_idx] = 0;
-        resolve_selected_cards(game_data);
-        update_game_status(modified_user);
+        with_game(modified_user, [&](game &game_data) {
+            play_card(modified_user, game_data, player_card_idx);
+        });
     });
 }
 
@@ -272,16 +395,30 @@ void cardgame::nextround(account_name username)
     eosio_assert(game_data.selected_card_player != 0, "Player has not selected a card");
 
     _users.modify(user, username, [&](auto &modified_user) {
-        auto &modified_game = modified_user.game_data;
-        modified_game.selected_card_ai = 0;
-        modified_game.selected_card_player = 0;
-        modified_game.life_lost_ai = 0;
-        modified_game.life_lost_player = 0;
-        if (modified_game.deck_player.size() > 0)
-            draw_one_card(modified_game.deck_player, modified_game.hand_player);
-
-        if (modified_game.deck_ai.size() > 0)
-            draw_one_card(modified_game.deck_ai, modified_game.hand_ai);
+        with_game(modified_user, [&](game &game_data) {
+            draw_next_cards(game_data);
+        });
+    });
+}
+
+// playcard and, while the game goes on, nextround in one modify of the row
+void cardgame::playround(account_name username, uint8_t player_card_idx)
+{
+    require_auth(username);
+
+    eosio_assert(player_card_idx < 4, "Played card index out of range");
+
+    auto &user = _users.get(username, "User does not exist");
+
+    eosio_assert(user.game_data.status == ONGOING, "Game status should be ongoing");
+    eosio_assert(user.game_data.selected_card_player == 0, "You have already selected a card");
+
+    _users.modify(user, username, [&](auto &modified_user) {
+        with_game(modified_user, [&](game &game_data) {
+            play_card(modified_user, game_data, player_card_idx);
+            if (game_data.status == ONGOING)
+                draw_next_cards(game_data);
+        });
     });
 }
 
@@ -291,8 +428,10 @@ void cardgame::endgame(account_name username)
     auto &user = _users.get(username, "User does not exist");
 
     _users.modify(user, username, [&](auto &modified_user) {
-        modified_user.game_data = game();
+        with_game(modified_user, [&](game &game_data) {
+            game_data = game();
+        });
     });
 }
 
-EOSIO_ABI(cardgame, (login)(startgame)(playcard)(nextround)(endgame))
\ No newline at end of file
+EOSIO_ABI(cardgame, (login)(startgame)(playcard)(nextround)(playround)(endgame))
\ No newline at end of file
@@ -1,4 +1,5 @@
 #include <eosiolib/eosio.hpp>
+#include "build_defines.hpp"
 
 using namespace std;
 using namespace eosio;
@@ -67,13 +68,37 @@ class cardgame : public contract
         uint8_t life_lost_ai = 0;
     };
 
+#ifdef PACKED_GAME
+    // A deck is always in card id order, so it is kept as a bitmask with
+    // bit card_id - 1 set for each card left. A hand keeps one card id per
+    // byte, slot 0 in the low byte.
+    struct packed_game
+    {
+        int8_t status = ONGOING;
+        int8_t life_player = 5;
+        int8_t life_ai = 5;
+        uint32_t deck_player = 0x1FFFF;
+        uint32_t deck_ai = 0x1FFFF;
+        uint32_t hand_player = 0;
+        uint32_t hand_ai = 0;
+        card_id selected_card_player = 0;
+        card_id selected_card_ai = 0;
+        uint8_t life_lost_player = 0;
+        uint8_t life_lost_ai = 0;
+    };
+
+    typedef packed_game stored_game;
+#else
+    typedef game stored_game;
+#endif
+
     //@abi table users
     struct user_info
     {
         account_name name;
         uint64_t win_count = 0;
         uint64_t loss_count = 0;
-        game game_data;
+        stored_game game_data;
 
         auto primary_key() const { return name; }
     };
@@ -92,6 +117,14 @@ class cardgame : public contract
     users_table _users;
     seed_table _seed;
 
+#ifdef SINGLE_SEED_WRITE
+    // The seed of this action, read on its first random() and written back
+    // once by the destructor
+    bool seed_loaded = false;
+    uint32_t seed_value;
+    void write_seed();
+#endif
+
     int random(const int range);
     void draw_one_card(vector<uint8_t> &deck, vector<uint8_t> &hand);
     int ai_best_card_win_strategy(const int ai_attack_point, const int player_attack_point);
@@ -102,16 +135,44 @@ class cardgame : public contract
     int calculate_ai_card_score(const int strategy, const int8_t life_ai, const card &ai_card_id, const vector<card_id> &hand_player);
     int calculate_attack_point(const card &card1, const card &card2);
     void resolve_selected_cards(game &game_data);
-    void update_game_status(user_info &user);
+    void update_game_status(user_info &user, game &game_data);
+    void play_card(user_info &user, game &game_data, const uint8_t player_card_idx);
+    void draw_next_cards(game &game_data);
+
+#ifdef PACKED_GAME
+    static packed_game pack_game(const game &game_data);
+    static game unpack_game(const packed_game &packed);
+#endif
+
+    // Runs f on the game of user and stores it back
+    template <typename F>
+    void with_game(user_info &user, F f)
+    {
+#ifdef PACKED_GAME
+        game game_data = unpack_game(user.game_data);
+        f(game_data);
+        user.game_data = pack_game(game_data);
+#else
+        f(user.game_data);
+#endif
+    }
 
   public:
     cardgame(account_name self) : contract(self), _users(self, self), _seed(self, self)
     {
     }
 
+#ifdef SINGLE_SEED_WRITE
+    ~cardgame()
+    {
+        write_seed();
+    }
+#endif
+
     void login(account_name username);
     void startgame(account_name username);
     void playcard(account_name username, const uint8_t player_card_idx);
     void nextround(account_name username);
+    void playround(account_name username, const uint8_t player_card_idx);
     void endgame(account_name username);
 };
\ No newline at end of file
@@ -0,0 +1,335 @@
+'''Binary (de)serialization of the contract tables, driven by cardgame.abi.
+
+For every struct of the ABI a decoder function is generated as Python
+source: consecutive fixed size fields are read with a single
+struct.unpack_from and card_id arrays are sliced straight into
+array('B'). The rows are objects of a __slots__ class named after the
+struct.
+
+decodeRows, for the raw rows of get_table_rows with json=false, only
+keeps the row bytes: a row is decoded the first time one of its fields
+is read, so a dump costs one bytes.fromhex and one small object per row.
+
+This does not reach 10x over json.loads for a full table dump. Measured
+with bench_abi_codec.py on 10k to 50k users:
+
+    full decode of every row         1.3x to 1.6x faster, 2x less memory
+    decodeRows, then read each row   1.1x to 1.5x faster
+    decodeRows alone                 20x to 35x faster, 7x less memory
+
+decodeRows alone decodes nothing, so it only pays off for dumps that read
+few of their rows.
+
+    codec = abi()
+    users = codec.decodeTable('users', host.table('users', host, binary=True).json['rows'])
+
+encode() is the reverse, for building raw rows, and is not optimized.
+'''
+import json
+import os
+import struct
+from array import array
+
+from cardgame_engine import NAME_CHARMAP, name_to_uint64
+
+ABI_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        '..', 'build', 'cardgame.abi')
+
+FIXED_TYPES = {
+    'bool': '?',
+    'int8': 'b',
+    'uint8': 'B',
+    'int16': 'h',
+    'uint16': 'H',
+    'int32': 'i',
+    'uint32': 'I',
+    'int64': 'q',
+    'uint64': 'Q',
+    'name': 'Q'
+}
+BYTE_TYPES = ('uint8', 'int8')
+
+# Two name characters (10 bits) per lookup
+_NAME_PAIRS = [NAME_CHARMAP[i >> 5] + NAME_CHARMAP[i & 0x1f] for i in range(1024)]
+
+
+def decodeName(value):
+    '''uint64_to_name with six table lookups instead of thirteen shifts.
+    '''
+    pairs = _NAME_PAIRS
+    high = value >> 4
+    return (pairs[high >> 50] + pairs[(high >> 40) & 0x3ff] +
+            pairs[(high >> 30) & 0x3ff] + pairs[(high >> 20) & 0x3ff] +
+            pairs[(high >> 10) & 0x3ff] + pairs[high & 0x3ff] +
+            NAME_CHARMAP[value & 0x0f]).rstrip('.')
+
+
+def readVaruint32(buf, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def writeVaruint32(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+class Row:
+    '''Base of the generated struct classes. A row built by decodeRows
+    holds only _buf until a field is read.
+    '''
+
+    __slots__ = ('_buf',)
+    _fields = ()
+    _decoder = None
+
+    def __getattr__(self, field):
+        # Only called for slots that are not set yet
+        if field not in self._fields or self._buf is None:
+            raise AttributeError(field)
+        buf = self._buf
+        self._buf = None
+        self._decoder(buf, 0)
+        return getattr(self, field)
+
+    def toJson(self):
+        json = {}
+        for field in self._fields:
+            value = getattr(self, field)
+            if isinstance(value, Row):
+                value = value.toJson()
+            elif isinstance(value, array):
+                value = value.tolist()
+            elif isinstance(value, list):
+                value = [item.toJson() if isinstance(item, Row) else item for item in value]
+            json[field] = value
+        return json
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.toJson() == other.toJson()
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.toJson())
+
+
+class Abi:
+
+    def __init__(self, abi):
+        self.abi = abi
+        self.typedefs = {t['new_type_name']: t['type']
+                         for t in abi.get('types', [])}
+        self.structs = {s['name']: s for s in abi['structs']}
+        self.tables = {t['name']: t['type'] for t in abi.get('tables', [])}
+        self.classes = {}
+        self.decoders = {}
+        self.jsonDecoders = {}
+        self.source = {}
+        for name in self.structs:
+            self._generate(name)
+
+    @classmethod
+    def load(cls, path=ABI_FILE):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def resolve(self, typeName):
+        while typeName in self.typedefs:
+            typeName = self.typedefs[typeName]
+        if typeName.endswith('[]'):
+            return self.resolve(typeName[:-2]) + '[]'
+        return typeName
+
+    def fields(self, structName):
+        struct = self.structs[structName]
+        base = self.fields(struct['base']) if struct.get('base') else []
+        return base + [(field['name'], self.resolve(field['type'])) for field in struct['fields']]
+
+    def _generate(self, structName):
+        if structName in self.decoders:
+            return
+        fields = self.fields(structName)
+        for _, typeName in fields:
+            elementType = typeName[:-2] if typeName.endswith('[]') else typeName
+            if elementType in self.structs:
+                self._generate(elementType)
+
+        names = tuple(name for name, _ in fields)
+        cls = type(structName, (Row,), {'__slots__': names, '_fields': names})
+        self.classes[structName] = cls
+        decoder = self._compile(structName, fields, cls, self.decoders)
+        cls._decoder = lambda self, buf, pos: decoder(buf, pos, self)
+        self.decoders[structName] = decoder
+        self.jsonDecoders[structName] = self._compile(structName, fields, None, self.jsonDecoders)
+
+    def _compile(self, structName, fields, cls, decoders):
+        '''Compiles decode_<struct>(buf, pos, obj=None) returning the
+        struct and the end position. With a class it fills obj (a new
+        instance by default), without one it returns the json dict the
+        node would, with lists for the arrays.
+        '''
+        lines = ['def decode_{}(buf, pos, obj=None):'.format(structName)]
+        pending = []
+
+        def flush():
+            if not pending:
+                return
+            fmt = '<' + ''.join(FIXED_TYPES[t] for _, t in pending)
+            lines.append('    {}, = unpack_from({!r}, buf, pos)'.format(
+                ', '.join('v_' + n for n, _ in pending), fmt))
+            lines.append('    pos += {}'.format(struct.calcsize(fmt)))
+            for n, t in pending:
+                if t == 'name':
+                    lines.append('    v_{0} = decodeName(v_{0})'.format(n))
+            del pending[:]
+
+        for name, typeName in fields:
+            if typeName in FIXED_TYPES:
+                pending.append((name, typeName))
+                continue
+            flush()
+            if typeName.endswith('[]') and typeName[:-2] in BYTE_TYPES:
+                lines.append('    size = buf[pos]')
+                lines.append('    if size < 0x80:')
+                lines.append('        pos += 1')
+                lines.append('    else:')
+                lines.append('        size, pos = readVaruint32(buf, pos)')
+                if cls is not None:
+                    lines.append('    v_{} = array({!r}, buf[pos:pos + size])'.format(
+                        name, FIXED_TYPES[typeName[:-2]]))
+                elif typeName[:-2] == 'uint8':
+                    lines.append('    v_{} = list(buf[pos:pos + size])'.format(name))
+                else:
+                    lines.append("    v_{} = array('b', buf[pos:pos + size]).tolist()".format(name))
+                lines.append('    pos += size')
+            elif typeName.endswith('[]'):
+                lines.append('    size, pos = readVaruint32(buf, pos)')
+                lines.append('    v_{} = []'.format(name))
+                lines.append('    for _ in range(size):')
+                lines.append('        item, pos = {}'.format(
+                    self._decodeExpression(typeName[:-2])))
+                lines.append('        v_{}.append(item)'.format(name))
+            elif typeName == 'string':
+                lines.append('    size, pos = readVaruint32(buf, pos)')
+                lines.append('    v_{} = bytes(buf[pos:pos + size]).decode()'.format(name))
+                lines.append('    pos += size')
+            else:
+                lines.append('    v_{}, pos = {}'.format(
+                    name, self._decodeExpression(typeName)))
+        flush()
+        if cls is not None:
+            lines.append('    if obj is None:')
+            lines.append('        obj = new(cls)')
+            lines.append('        obj._buf = None')
+            for name, _ in fields:
+                lines.append('    obj.{0} = v_{0}'.format(name))
+            lines.append('    return obj, pos')
+        else:
+            lines.append('    return {{{}}}, pos'.format(', '.join(
+                '{0!r}: v_{0}'.format(name) for name, _ in fields)))
+
+        source = '\n'.join(lines) + '\n'
+        namespace = {
+            'unpack_from': struct.unpack_from,
+            'array': array,
+            'readVaruint32': readVaruint32,
+            'decodeName': decodeName,
+            'new': object.__new__,
+            'cls': cls,
+            'decoders': decoders
+        }
+        exec(compile(source, '<abi {}>'.format(structName), 'exec'), namespace)
+        self.source[structName, cls is None] = source
+        return namespace['decode_' + structName]
+
+    def _decodeExpression(self, typeName):
+        if typeName in self.structs:
+            return 'decoders[{!r}](buf, pos)'.format(typeName)
+        if typeName in FIXED_TYPES:
+            fmt = '<' + FIXED_TYPES[typeName]
+            return 'unpack_from({!r}, buf, pos)[0], pos + {}'.format(fmt, struct.calcsize(fmt))
+        raise ValueError('Unsupported ABI type {}'.format(typeName))
+
+    def decode(self, structName, data):
+        '''Decodes one serialized struct, from bytes or a hex string, now.
+        '''
+        if isinstance(data, str):
+            data = bytes.fromhex(data)
+        return self.decoders[structName](data, 0)[0]
+
+    def decodeJson(self, structName, data):
+        '''Decodes one serialized struct into plain dicts and lists.
+        '''
+        if isinstance(data, str):
+            data = bytes.fromhex(data)
+        return self.jsonDecoders[structName](data, 0)[0]
+
+    def decodeRows(self, structName, rows):
+        '''Returns a lazily decoded object per raw row (hex string or bytes).
+        '''
+        cls = self.classes[structName]
+        new = object.__new__
+        fromhex = bytes.fromhex
+        decoded = []
+        append = decoded.append
+        for row in rows:
+            obj = new(cls)
+            obj._buf = fromhex(row) if isinstance(row, str) else row
+            append(obj)
+        return decoded
+
+    def decodeTable(self, tableName, rows):
+        return self.decodeRows(self.tables[tableName], rows)
+
+    def encode(self, typeName, value):
+        typeName = self.resolve(typeName)
+        if typeName in FIXED_TYPES:
+            if typeName == 'name' and isinstance(value, str):
+                value = name_to_uint64(value)
+            return struct.pack('<' + FIXED_TYPES[typeName], int(value))
+        if typeName == 'string':
+            data = value.encode()
+            return writeVaruint32(len(data)) + data
+        if typeName == 'uint8[]':
+            return writeVaruint32(len(value)) + bytes(value)
+        if typeName.endswith('[]'):
+            return writeVaruint32(len(value)) + b''.join(
+                self.encode(typeName[:-2], item) for item in value)
+        if typeName in self.structs:
+            get = value.__getitem__ if isinstance(value, dict) else value.__getattribute__
+            return b''.join(self.encode(fieldType, get(name))
+                            for name, fieldType in self.fields(typeName))
+        raise ValueError('Unsupported ABI type {}'.format(typeName))
+
+    def encodeRow(self, tableName, row):
+        '''Returns row serialized as the hex string get_table_rows returns.
+        '''
+        return self.encode(self.tables[tableName], row).hex()
+
+
+_abi = None
+
+
+def abi():
+    '''Returns the Abi of build/cardgame.abi, loaded on first use.
+    '''
+    global _abi
+    if _abi is None:
+        _abi = Abi.load()
+    return _abi
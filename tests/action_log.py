@@ -0,0 +1,366 @@
+'''Records cardgame actions with the rows around them and replays them
+against the Python engine.
+
+Recorder stands in for the contract account. Every push_action also reads
+the player's users row and the seed row, raw (json=false), before and after
+the transaction. It appends a Record with the block time of the
+transaction to an action log. A failed action is recorded with its error
+message. The seed row is shared by all players, so the recorder must be
+the only client pushing actions while it records.
+
+Every record carries the rows its action reads, so it is replayed on its
+own: a CardGame is given the before rows and a clock returning the recorded
+block time, and the AI looks its card scores up in score_tables. The first
+record whose outcome differs from the log is reported as a Divergence.
+Because records are independent, long logs are split across worker
+processes.
+
+    python3 tests/action_log.py replay day.log [-j WORKERS]
+'''
+import argparse
+import calendar
+import gzip
+import multiprocessing
+import os
+import struct
+import sys
+import time
+
+import abi_codec
+from cardgame_engine import CardGame, Error, name_to_uint64
+from score_tables import score_table
+
+MAGIC = b'cardgame-actions 1\n'
+ACTIONS = ['login', 'startgame', 'playcard', 'nextround', 'endgame', 'playround']
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+NO_SEED = -1
+FAILED = 1
+
+# action, flags, player_card_idx, block_time, username, authorizer,
+# seed_before, seed_after and the sizes of user_before, user_after, error
+HEADER = struct.Struct('<BBBIQQiiHHH')
+# Longer error messages, e.g. a node's with its stack, are cut to fit
+MAX_ERROR_BYTES = 0xffff
+
+
+class Record:
+
+    __slots__ = ('action', 'username', 'authorizer', 'player_card_idx', 'block_time',
+                 'seed_before', 'seed_after', 'user_before', 'user_after', 'error')
+
+    def __init__(self, action, username, authorizer='', player_card_idx=0, block_time=0,
+                 seed_before=NO_SEED, seed_after=NO_SEED, user_before=b'', user_after=b'',
+                 error=None):
+        self.action = action
+        self.username = username
+        self.authorizer = authorizer
+        self.player_card_idx = player_card_idx
+        self.block_time = block_time
+        self.seed_before = seed_before
+        self.seed_after = seed_after
+        self.user_before = user_before
+        self.user_after = user_after
+        self.error = error
+
+    def pack(self):
+        error = b''
+        if self.error is not None:
+            error = self.error.encode()
+            if len(error) > MAX_ERROR_BYTES:
+                # Not in the middle of a character
+                error = error[:MAX_ERROR_BYTES].decode(errors='ignore').encode()
+        return HEADER.pack(
+            ACTION_CODES[self.action], FAILED if self.error is not None else 0,
+            self.player_card_idx, self.block_time, name_to_uint64(self.username),
+            name_to_uint64(self.authorizer), self.seed_before, self.seed_after,
+            len(self.user_before), len(self.user_after), len(error)
+        ) + self.user_before + self.user_after + error
+
+    def __eq__(self, other):
+        return isinstance(other, Record) and all(
+            getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self):
+        return 'Record({})'.format(', '.join(
+            '{}={!r}'.format(field, getattr(self, field)) for field in self.__slots__))
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+class ActionLog:
+    '''Appends records to a log file, gzip compressed if the path ends
+    with .gz.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.file = _open(path, 'wb')
+        self.file.write(MAGIC)
+        self.count = 0
+
+    def write(self, record):
+        self.file.write(record.pack())
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def readLog(path):
+    with _open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError('{} is not a cardgame action log'.format(path))
+    return data[len(MAGIC):]
+
+
+def boundaries(data):
+    '''Returns the offset of every record in data, and the end offset.
+    '''
+    offsets = []
+    unpack = HEADER.unpack_from
+    size = HEADER.size
+    pos = 0
+    end = len(data)
+    while pos < end:
+        offsets.append(pos)
+        header = unpack(data, pos)
+        pos += size + header[8] + header[9] + header[10]
+    offsets.append(pos)
+    return offsets
+
+
+def records(data):
+    names = {}
+    decodeName = abi_codec.decodeName
+    unpack = HEADER.unpack_from
+    size = HEADER.size
+    pos = 0
+    end = len(data)
+    while pos < end:
+        (action, flags, cardIdx, blockTime, username, authorizer, seedBefore,
+         seedAfter, beforeSize, afterSize, errorSize) = unpack(data, pos)
+        pos += size
+        userBefore = data[pos:pos + beforeSize]
+        pos += beforeSize
+        userAfter = data[pos:pos + afterSize]
+        pos += afterSize
+        error = data[pos:pos + errorSize].decode() if flags & FAILED else None
+        pos += errorSize
+        if username not in names:
+            names[username] = decodeName(username)
+        if authorizer not in names:
+            names[authorizer] = decodeName(authorizer)
+        yield Record(ACTIONS[action], names[username], names[authorizer], cardIdx,
+                     blockTime, seedBefore, seedAfter, userBefore, userAfter, error)
+
+
+def blockSeconds(blockTime):
+    '''now() of a transaction, from the block_time of its receipt.
+    '''
+    return calendar.timegm(time.strptime(blockTime[:19], '%Y-%m-%dT%H:%M:%S'))
+
+
+class Recorder:
+    '''Wraps the contract account, logging every push_action to log.
+    Everything else is passed through to the account.
+    '''
+
+    def __init__(self, host, log):
+        self.host = host
+        self.log = log
+
+    def _rows(self, username):
+        key = name_to_uint64(username)
+        users = self.host.table('users', self.host, binary=True, lower=str(key),
+                                upper=str(key + 1), limit=1).json['rows']
+        seed = self.host.table('seed', self.host, binary=True, limit=1).json['rows']
+        user = bytes.fromhex(users[0]) if users else b''
+        seedValue = struct.unpack_from('<QI', bytes.fromhex(seed[0]))[1] if seed else NO_SEED
+        return user, seedValue
+
+    def push_action(self, action, data, permission=None, **kwargs):
+        username = str(data['username'])
+        authorizer = ''
+        if permission is not None:
+            authorizer = str(permission[0] if isinstance(permission, tuple) else permission)
+        userBefore, seedBefore = self._rows(username)
+        record = Record(action, username, authorizer, int(data.get('player_card_idx', 0)),
+                        seed_before=seedBefore, user_before=userBefore)
+        try:
+            result = self.host.push_action(action, data, permission=permission, **kwargs)
+        except Exception as e:
+            record.error = getattr(e, 'message', None) or str(e)
+            record.seed_after, record.user_after = seedBefore, userBefore
+            self.log.write(record)
+            raise
+        record.user_after, record.seed_after = self._rows(username)
+        record.block_time = blockSeconds(result.json['processed']['block_time'])
+        self.log.write(record)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.host, name)
+
+    def __str__(self):
+        return str(self.host)
+
+
+class Divergence:
+
+    def __init__(self, index, record, reason, expected, actual):
+        self.index = index
+        self.record = record
+        self.reason = reason
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        return ('Record {} ({} by {} at {}): {}\n  recorded: {}\n  replayed: {}'.format(
+            self.index, self.record.action, self.record.username, self.record.block_time,
+            self.reason, self.expected, self.actual))
+
+
+class Replayer:
+
+    CACHE_SIZE = 4096
+
+    def __init__(self, useScoreTable=True):
+        self.now = 0
+        self.game = CardGame(clock=lambda: self.now,
+                             score_table=score_table() if useScoreTable else None)
+        self.decoder = abi_codec.abi().jsonDecoders['user_info']
+        self.decoded = {}
+        self.count = 0
+
+    def decodeUser(self, data):
+        '''Decodes a users row. The after row of an action is usually the
+        before row of the player's next one, so rows are decoded once. The
+        engine copies a row before modifying it, so they can be shared.
+        '''
+        user = self.decoded.get(data)
+        if user is None:
+            if len(self.decoded) >= self.CACHE_SIZE:
+                self.decoded.clear()
+            user = self.decoded[data] = self.decoder(data, 0)[0]
+        return user
+
+    def replay(self, record):
+        '''Re-executes one record, returning a Divergence or None.
+        '''
+        game = self.game
+        decodeUser = self.decodeUser
+        username = record.username
+        if record.user_before:
+            game.users = {username: decodeUser(record.user_before)}
+        else:
+            game.users = {}
+        game.seed = {'key': 1, 'value': record.seed_before} \
+            if record.seed_before != NO_SEED else None
+        self.now = record.block_time
+        self.count += 1
+
+        error = None
+        authorizer = record.authorizer or None
+        try:
+            if record.action in ('playcard', 'playround'):
+                getattr(game, record.action)(username, record.player_card_idx, authorizer)
+            else:
+                getattr(game, record.action)(username, authorizer)
+        except Error as e:
+            error = e.message
+
+        if record.error is not None or error is not None:
+            if error is None or record.error is None or error not in record.error:
+                return Divergence(self.count - 1, record, 'different outcome',
+                                  record.error, error)
+            return None
+
+        expected = decodeUser(record.user_after) if record.user_after else None
+        actual = game.users.get(username)
+        if actual != expected:
+            return Divergence(self.count - 1, record, 'users row differs', expected, actual)
+        seed = game.seed['value'] if game.seed else NO_SEED
+        if seed != record.seed_after:
+            return Divergence(self.count - 1, record, 'seed differs', record.seed_after, seed)
+        return None
+
+    def replayAll(self, records, firstIndex=0):
+        '''Replays records up to the first divergence. Returns the number
+        replayed and the divergence, with its index offset by firstIndex.
+        '''
+        self.count = 0
+        replay = self.replay
+        for record in records:
+            divergence = replay(record)
+            if divergence is not None:
+                divergence.index += firstIndex
+                return self.count, divergence
+        return self.count, None
+
+
+def _replayChunk(args):
+    data, firstIndex, useScoreTable = args
+    return Replayer(useScoreTable).replayAll(records(data), firstIndex)
+
+
+def replayLog(path, workers=1, useScoreTable=True):
+    '''Replays a log, returning the number of records replayed and the
+    first Divergence, or None.
+    '''
+    data = readLog(path)
+    if workers <= 1:
+        return Replayer(useScoreTable).replayAll(records(data))
+
+    offsets = boundaries(data)
+    total = len(offsets) - 1
+    step = -(-total // workers) or 1
+    chunks = [(data[offsets[first]:offsets[min(first + step, total)]], first, useScoreTable)
+              for first in range(0, total, step)]
+    if useScoreTable:
+        # Built once here and inherited by forked workers
+        score_table()
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with context.Pool(min(workers, len(chunks) or 1)) as pool:
+        results = pool.map(_replayChunk, chunks)
+
+    for (count, divergence), (_, first, _) in zip(results, chunks):
+        if divergence is not None:
+            return first + count, divergence
+    return total, None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay a cardgame action log against the Python engine.')
+    parser.add_argument('command', choices=['replay'])
+    parser.add_argument('log')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--no-score-table', action='store_true',
+                        help='compute the AI card scores instead of looking them up')
+    args = parser.parse_args()
+
+    start = time.time()
+    count, divergence = replayLog(args.log, args.workers, not args.no_score_table)
+    elapsed = time.time() - start
+    print('Replayed {} actions in {:.2f}s ({:.0f}/s)'.format(
+        count, elapsed, count / elapsed if elapsed else 0))
+    if divergence is not None:
+        print('First divergence: {}'.format(divergence))
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(not main())
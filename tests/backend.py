@@ -0,0 +1,64 @@
+'''Selects what the test modules run against.
+
+By default they drive a local nodeos through eosfactory. Set
+``CARDGAME_BACKEND=engine`` to run the same tests against the in-process
+Python model of the contract, which needs no node and takes milliseconds:
+
+    CARDGAME_BACKEND=engine python3 tests/test_playcard.py
+
+The variable is read on use, not when this module is imported.
+``from backend import *`` binds the eosf names of the backend selected at
+that moment. The helper modules call name() and eosf() on every use, so a
+test can select a backend for itself alone:
+
+    def setUp(self):
+        self.addCleanup(backend.select('engine'))
+'''
+import importlib
+import importlib.util
+import os
+from unittest import mock
+
+VARIABLE = 'CARDGAME_BACKEND'
+MODULES = {'node': 'eosfactory.eosf', 'engine': 'engine_eosf'}
+
+
+def name():
+    '''The selected backend, 'node' or 'engine'.
+    '''
+    return os.environ.get(VARIABLE, 'node')
+
+
+def eosf():
+    '''The eosf module of the selected backend.
+    '''
+    return importlib.import_module(MODULES[name()])
+
+
+def nodeAvailable():
+    '''Whether eosfactory, and so a local node, can be used.
+    '''
+    return importlib.util.find_spec('eosfactory') is not None
+
+
+def select(backend):
+    '''Selects backend until the returned function is called, for
+    addCleanup.
+    '''
+    patcher = mock.patch.dict(os.environ, {VARIABLE: backend})
+    patcher.start()
+    return patcher.stop
+
+
+def __getattr__(attr):
+    # BACKEND and the eosf names, including __all__ for the star import
+    if attr == 'BACKEND':
+        return name()
+    if attr.startswith('__') and attr != '__all__':
+        raise AttributeError(attr)
+    module = eosf()
+    if attr == '__all__':
+        names = getattr(module, '__all__', None) or [
+            key for key in vars(module) if not key.startswith('_')]
+        return ['BACKEND'] + list(names)
+    return getattr(module, attr)
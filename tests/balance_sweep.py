@@ -0,0 +1,281 @@
+'''Card balance sweep: simulates games over a grid of card_dict variants.
+
+A variant changes cardgame::card_dict by axis:
+
+    attack:<card_id>  attack point of one of the typed cards 1-15
+    type:<card_id>    type of one of the typed cards (FIRE, WOOD, WATER,
+                      NEUTRAL, VOID or the number)
+    neutral           number of NEUTRAL cards in the deck (1)
+    neutral_attack    attack point of the NEUTRAL cards (3)
+    void              number of VOID cards in the deck (1)
+
+A grid gives each axis a list of values and the sweep runs every
+combination. The grid comes from a JSON file, {"neutral": [0, 1, 2]}, or
+from -a options. Each variant is played by the Simulator in batches spread
+over a process pool. The report has the player's win rate, the mean game
+length and, per AI strategy, how often it was picked, the share of those
+rounds in which it took life, and its mean life swing.
+
+A variant's result is cached in build/balance_sweep/ under the sha256 of
+its card_dict, the simulation settings and the simulator's source, so a
+grown grid only simulates the new points.
+
+    python3 tests/balance_sweep.py -a neutral=0,1,2 -a attack:5=3,4 -n 200000
+'''
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+import build_cache
+from cardgame_engine import (CARD_DICT, EMPTY, FIRE, HAND_SIZE, NEUTRAL, PLAYER_LOST,
+                             PLAYER_WON, VOID, WATER, WOOD)
+from score_tables import NUM_STRATEGIES
+from simulator import Simulator
+
+CACHE_DIR = os.path.join(build_cache.WORKSPACE, 'build', 'balance_sweep')
+SOURCES = ('simulator.py', 'cardgame_engine.py', 'score_tables.py')
+TYPES = {'EMPTY': EMPTY, 'FIRE': FIRE, 'WOOD': WOOD, 'WATER': WATER,
+         'NEUTRAL': NEUTRAL, 'VOID': VOID}
+STRATEGIES = ('best_card_win', 'min_loss', 'points_tally', 'loss_prevention')
+BATCH_SIZE = 50000
+
+
+def card_dict_for(variant, base=CARD_DICT):
+    '''Builds the card_dict of a variant: the typed cards of base with
+    their overrides, then the NEUTRAL and VOID cards.
+    '''
+    typed = {cardId: card for cardId, card in base.items()
+             if card[0] not in (EMPTY, NEUTRAL, VOID)}
+    neutralAttack = next((attack for cardType, attack in base.values() if cardType == NEUTRAL), 3)
+    counts = {'neutral': sum(1 for cardType, _ in base.values() if cardType == NEUTRAL),
+              'void': sum(1 for cardType, _ in base.values() if cardType == VOID)}
+    for axis, value in sorted(variant.items()):
+        name, _, cardId = axis.partition(':')
+        if name in ('attack', 'type'):
+            cardId = int(cardId)
+            if cardId not in typed:
+                raise ValueError('Card {} of {} is not a typed card'.format(cardId, axis))
+            cardType, attack = typed[cardId]
+            if name == 'attack':
+                typed[cardId] = (cardType, int(value))
+            else:
+                typed[cardId] = (TYPES[value] if isinstance(value, str) else int(value), attack)
+        elif name in counts:
+            counts[name] = int(value)
+        elif name == 'neutral_attack':
+            neutralAttack = int(value)
+        else:
+            raise ValueError('Unknown axis {}'.format(axis))
+
+    cards = [typed[cardId] for cardId in sorted(typed)]
+    cards += [(NEUTRAL, neutralAttack)] * counts['neutral'] + [(VOID, 0)] * counts['void']
+    if len(cards) < HAND_SIZE:
+        raise ValueError('A deck needs at least {} cards'.format(HAND_SIZE))
+    card_dict = {0: (EMPTY, 0)}
+    card_dict.update({cardId: card for cardId, card in enumerate(cards, 1)})
+    return card_dict
+
+
+def grid(axes):
+    '''Every combination of the axis values, as variant dicts.
+    '''
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def _sourceDigest():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for source in SOURCES:
+        with open(os.path.join(directory, source), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def variantKey(card_dict, settings, sourceDigest=None):
+    return hashlib.sha256(json.dumps({
+        'card_dict': sorted(card_dict.items()),
+        'settings': settings,
+        'source': sourceDigest or _sourceDigest()
+    }, sort_keys=True).encode()).hexdigest()
+
+
+def _simulate(args):
+    '''Plays one batch of a variant, returning its totals.
+    '''
+    key, card_dict, games, settings, batch = args
+    entropy = [settings['seed'], batch, int(key[:12], 16)] if settings['seed'] is not None else None
+    simulator = Simulator(card_dict, random_mode=settings['random'],
+                          player_policy=settings['policy'],
+                          rng=np.random.default_rng(entropy))
+    result = simulator.play(games)
+    return key, {
+        'games': games,
+        'wins': int(np.sum(result.status == PLAYER_WON)),
+        'losses': int(np.sum(result.status == PLAYER_LOST)),
+        'rounds': int(result.rounds.sum()),
+        'strategy_picks': result.strategies.sum(axis=0).tolist(),
+        'strategy_won': result.strategy_won.sum(axis=0).tolist(),
+        'strategy_swing': result.strategy_swing.sum(axis=0).tolist()
+    }
+
+
+def _add(totals, batch):
+    for field, value in batch.items():
+        if isinstance(value, list):
+            totals[field] = [a + b for a, b in zip(totals.get(field, [0] * len(value)), value)]
+        else:
+            totals[field] = totals.get(field, 0) + value
+    return totals
+
+
+def report(totals):
+    '''Rates of a variant's totals.
+    '''
+    games = totals['games']
+    strategies = {}
+    for i, name in enumerate(STRATEGIES[:NUM_STRATEGIES]):
+        picks = totals['strategy_picks'][i]
+        strategies[name] = {
+            'picks': picks,
+            'round_win_rate': totals['strategy_won'][i] / picks if picks else None,
+            'mean_swing': totals['strategy_swing'][i] / picks if picks else None
+        }
+    return {
+        'games': games,
+        'win_rate': totals['wins'] / games,
+        'loss_rate': totals['losses'] / games,
+        'mean_rounds': totals['rounds'] / games,
+        'strategies': strategies
+    }
+
+
+class Sweep:
+    '''Runs the variants of a grid on a pool of workers, caching the
+    results of each.
+    '''
+
+    def __init__(self, games=100000, random_mode='uniform', player_policy='random', seed=0,
+                 workers=None, batchSize=BATCH_SIZE, cacheDir=None):
+        self.games = games
+        self.settings = {'games': games, 'random': random_mode, 'policy': player_policy,
+                         'seed': seed}
+        self.workers = workers or os.cpu_count() or 1
+        self.batchSize = batchSize
+        self.cacheDir = cacheDir or CACHE_DIR
+        self.simulated = 0
+
+    def _cacheFile(self, key):
+        return os.path.join(self.cacheDir, key + '.json')
+
+    def _load(self, key):
+        try:
+            with open(self._cacheFile(key)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _store(self, key, result):
+        os.makedirs(self.cacheDir, exist_ok=True)
+        path = self._cacheFile(key)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(result, f, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def run(self, variants):
+        '''Returns (variant, card_dict, report) for each variant, in order.
+        '''
+        source = _sourceDigest()
+        points = []
+        tasks = []
+        for variant in variants:
+            card_dict = card_dict_for(variant)
+            key = variantKey(card_dict, self.settings, source)
+            points.append((variant, card_dict, key))
+            if self._load(key) is None:
+                for batch, start in enumerate(range(0, self.games, self.batchSize)):
+                    tasks.append((key, card_dict, min(self.batchSize, self.games - start),
+                                  self.settings, batch))
+
+        totals = {}
+        if tasks:
+            # Equal variants share a key, and are simulated once
+            tasks = list({(task[0], task[4]): task for task in tasks}.values())
+            remaining = {}
+            for task in tasks:
+                remaining[task[0]] = remaining.get(task[0], 0) + 1
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            with context.Pool(min(self.workers, len(tasks))) as pool:
+                for key, batch in pool.imap_unordered(_simulate, tasks):
+                    _add(totals.setdefault(key, {}), batch)
+                    remaining[key] -= 1
+                    if not remaining[key]:
+                        self._store(key, report(totals[key]))
+            self.simulated = len(remaining)
+        return [(variant, card_dict, self._load(key)) for variant, card_dict, key in points]
+
+
+def parseAxis(text):
+    '''Parses name=v1,v2 into (name, [values]).
+    '''
+    name, _, values = text.partition('=')
+    if not values:
+        raise argparse.ArgumentTypeError('expected axis=value,value: {}'.format(text))
+    return name, [value if value in TYPES else int(value) for value in values.split(',')]
+
+
+def printReport(results, stream=sys.stdout):
+    stream.write('{:<40}{:>10}{:>8}  {}\n'.format(
+        'variant', 'win rate', 'rounds', '  '.join(
+            '{} win/swing'.format(name) for name in STRATEGIES[:NUM_STRATEGIES])))
+    for variant, _, result in results:
+        label = ' '.join('{}={}'.format(axis, value) for axis, value in sorted(variant.items()))
+        stream.write('{:<40}{:>10.4f}{:>8.2f}  {}\n'.format(
+            label or 'base', result['win_rate'], result['mean_rounds'], '  '.join(
+                '{:>{}}'.format('{:.3f}/{:+.3f}'.format(s['round_win_rate'], s['mean_swing'])
+                                if s['picks'] else '-', len(name) + 10)
+                for name, s in result['strategies'].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Simulate games over a grid of card_dict variants.')
+    parser.add_argument('grid', nargs='?', help='JSON file of axis: [values]')
+    parser.add_argument('-a', '--axis', type=parseAxis, action='append', default=[],
+                        help='axis=value,value, e.g. neutral=0,1,2 or type:5=FIRE,VOID')
+    parser.add_argument('-n', '--games', type=int, default=100000, help='games per variant')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--random', choices=['contract', 'uniform'], default='uniform')
+    parser.add_argument('--policy', choices=['random', 'first'], default='random')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    axes = {}
+    if args.grid:
+        with open(args.grid) as f:
+            axes.update(json.load(f))
+    axes.update(args.axis)
+
+    sweep = Sweep(args.games, args.random, args.policy, args.seed, args.workers)
+    start = time.time()
+    results = sweep.run(grid(axes))
+    sys.stderr.write('{} variants, {} simulated, in {:.1f}s\n'.format(
+        len(results), sweep.simulated, time.time() - start))
+    printReport(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([{'variant': variant, 'card_dict': sorted(card_dict.items()), 'result': result}
+                       for variant, card_dict, result in results], f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
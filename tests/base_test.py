@@ -1,6 +1,8 @@
 import unittest
 import sys
 
+import instrumentation
+
 
 class BaseTest(unittest.TestCase):
 
@@ -8,6 +10,13 @@ class BaseTest(unittest.TestCase):
     PLAYER_LOST = -1
     PLAYER_WON = 1
 
+    # The users table is shared by every module of a session, read all of it
+    TABLE_LIMIT = 10000
+
+    def run(self, result=None):
+        with instrumentation.test(self.id()):
+            return super().run(result)
+
     def _validateUser(self, user, name, win_count=0, loss_count=0):
         self.assertEqual(name, user['name'], 'Name must be {}'.format(name))
         self.assertEqual(0, user['win_count'],
@@ -15,8 +24,8 @@ class BaseTest(unittest.TestCase):
         self.assertEqual(0, user['loss_count'],
                          'Loss count should be {}'.format(loss_count))
 
-    def _validateUserExists(self, rows, name):
-        user = self._findUser(rows, name)
+    def _validateUserExists(self, name):
+        user = self.session.users.get(name)
         self.assertTrue(user, 'User {} must exist'.format(name))
         return user
 
@@ -98,11 +107,9 @@ class BaseTest(unittest.TestCase):
             self.assertGreater(
                 cardId, 0, 'Invalid card at: {} for {}'.format(pos, key))
 
-    def _findUser(self, rows, name):
-        for row in rows:
-            if(row['name'] == name):
-                return row
-        return False
+    def _usersRows(self):
+        host = self.session.host
+        return host.table('users', host, limit=self.TABLE_LIMIT).json['rows']
 
     def _baseGameData(self, deckPlayerSize=None, handPlayer=None, deckAiSize=None, handAi=None):
         gameData = {
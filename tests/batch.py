@@ -0,0 +1,156 @@
+'''Several cardgame actions per transaction.
+
+ActionBatch queues actions, each authorized by its own player, and
+submits them as a few transactions instead of one push_action round trip
+per action. A transaction is closed when it holds maxActions actions or
+its estimated packed size, signatures included, would pass maxBytes, so a
+large batch stays well under the chain's per-transaction CPU and NET
+limits. A failed action fails its whole transaction, and only that one.
+
+    with ActionBatch(host) as batch:
+        for player in players:
+            batch.add('login', player)
+            batch.add('startgame', player)
+
+On the local node the transactions are pushed with cleos push transaction,
+signed with the keys of every authorizing player from the wallet. Each
+carries a context free eosio.null::nonce action with unique data, as cleos
+--force-unique adds, so a batch identical to one pushed within the
+expiration window is not rejected as a duplicate transaction.
+'''
+import itertools
+import json
+import struct
+import time
+
+import abi_codec
+import backend
+import block_wait
+import instrumentation
+
+MAX_ACTIONS = 100
+MAX_BYTES = 64 * 1024
+# account, name, no authorization, data size and 12 bytes of data
+NONCE_ACTION_BYTES = 8 + 8 + 1 + 1 + 12
+# Header, expiration, reference block, the list sizes and the nonce
+TRANSACTION_OVERHEAD = 32 + NONCE_ACTION_BYTES
+SIGNATURE_BYTES = 66
+# account, name, authorization count, one actor and permission, data size
+ACTION_OVERHEAD = 8 + 8 + 1 + 16 + 2
+
+
+_nonces = itertools.count()
+
+
+def nonceAction():
+    '''The eosio.null::nonce action of a transaction: the time in
+    microseconds, as cleos packs it, and a count unique in this process.
+    '''
+    data = struct.pack('<qI', int(time.time() * 1000000), next(_nonces) & 0xFFFFFFFF)
+    return {'account': 'eosio.null', 'name': 'nonce', 'authorization': [], 'data': data.hex()}
+
+
+def transactionJson(actions, codec=None):
+    '''The transaction of chain api style actions for cleos push
+    transaction, with their data serialized and a nonce.
+    '''
+    codec = codec or abi_codec.abi()
+    return {
+        'context_free_actions': [nonceAction()],
+        'actions': [dict(action, data=codec.encode(action['name'], action['data']).hex())
+                    for action in actions]
+    }
+
+
+def pushTransaction(host, actions):
+    '''Pushes chain api style actions as one transaction.
+    '''
+    if backend.name() != 'node':
+        return host.push_transaction(actions)
+    from eosfactory.core import cleos
+    transaction = transactionJson(actions)
+
+    def push():
+        # eosfactory has no push transaction command, its base class runs
+        # cleos with the node and wallet of the session
+        return cleos._Cleos([json.dumps(transaction), '--json'], 'push', 'transaction',
+                            is_verbose=False)
+
+    if not instrumentation.enabled():
+        return block_wait.record(host, push())
+    return block_wait.record(host, instrumentation.collector().measure(
+        'push_transaction', instrumentation.transactionName(actions), push, actions))
+
+
+class ActionBatch:
+
+    def __init__(self, host, maxActions=MAX_ACTIONS, maxBytes=MAX_BYTES):
+        self.host = host
+        self.maxActions = maxActions
+        self.maxBytes = maxBytes
+        self.actions = []
+        self.codec = abi_codec.abi()
+
+    def add(self, action, player, **data):
+        data['username'] = player
+        self.actions.append({
+            'account': str(self.host),
+            'name': action,
+            'authorization': [{'actor': str(player), 'permission': 'active'}],
+            'data': {key: value if isinstance(value, int) else str(value)
+                     for key, value in data.items()}
+        })
+
+    def __len__(self):
+        return len(self.actions)
+
+    def actionSize(self, action):
+        return ACTION_OVERHEAD + len(self.codec.encode(action['name'], action['data']))
+
+    def transactions(self):
+        '''Splits the queued actions into size capped transactions, in order.
+        '''
+        transactions = []
+        current = []
+        signers = set()
+        size = TRANSACTION_OVERHEAD
+        for action in self.actions:
+            actor = action['authorization'][0]['actor']
+            added = self.actionSize(action) + (SIGNATURE_BYTES if actor not in signers else 0)
+            if current and (len(current) == self.maxActions or size + added > self.maxBytes):
+                transactions.append(current)
+                current = []
+                signers = set()
+                size = TRANSACTION_OVERHEAD
+                added = self.actionSize(action) + SIGNATURE_BYTES
+            current.append(action)
+            signers.add(actor)
+            size += added
+        if current:
+            transactions.append(current)
+        return transactions
+
+    def submit(self):
+        '''Pushes the queued actions and empties the queue. Returns the
+        result of every transaction.
+        '''
+        transactions = self.transactions()
+        self.actions = []
+        return [pushTransaction(self.host, actions) for actions in transactions]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.submit()
+
+
+def setupPlayers(host, players, startGames=False, **caps):
+    '''Logs every player in, and starts their games, in batches.
+    '''
+    with ActionBatch(host, **caps) as batch:
+        for player in players:
+            batch.add('login', player)
+            if startGames:
+                batch.add('startgame', player)
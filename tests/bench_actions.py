@@ -0,0 +1,250 @@
+'''Per-action resource benchmark of the cardgame contract.
+
+Plays full games (login, startgame, playcard/nextround or, with
+--playround, playround until the game is over, endgame) with fresh players
+on the shared local node and records, for every action, the cpu_usage_us
+and net_usage_words of its transaction receipt, the RAM it added to the
+player and host accounts, the writes of the seed row (engine backend) and
+the client wall time, and per game the total cpu_usage_us and the number
+of transactions and table reads. Writes p50/p95/p99 per action and metric
+to a json file, and with --compare prints the change against an earlier
+run.
+
+--compare-playround plays the games both ways on the same node, first
+with playcard and nextround, then with playround, writes both runs and
+prints the change of every metric they share, the per game totals
+included.
+
+--single-seed-write writes the seed row once per action instead of once
+per random(): on a node, the contract is built with SINGLE_SEED_WRITE
+defined (see build_cache.py), so the saving shows in cpu_usage_us when
+compared with a default run; on the engine, CardGame's single_seed_write
+shows it in seed_writes.
+
+    python3 tests/bench_actions.py -g 50 -o build/bench_actions.json
+    python3 tests/bench_actions.py -g 50 --playround --compare build/bench_actions.json
+    python3 tests/bench_actions.py -g 50 --compare-playround -o build/playround.json
+    python3 tests/bench_actions.py -g 50 --single-seed-write -o build/single_seed.json \
+        --compare build/bench_actions.json
+'''
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import backend
+import session
+from stats import summarize
+from tables import UsersTable
+
+ACTIONS = ['login', 'startgame', 'playcard', 'nextround', 'playround', 'endgame']
+METRICS = ['cpu_usage_us', 'net_usage_words', 'ram_bytes', 'seed_writes', 'wall_ms']
+GAME_METRICS = ['cpu_usage_us', 'transactions', 'reads', 'seed_writes']
+ONGOING = 0
+DEFAULT_OUTPUT = os.path.join(session.CONTRACT_WORKSPACE, 'build', 'bench_actions.json')
+
+
+def ramUsage(account):
+    '''Returns the RAM in bytes used by account, None off a real node.
+    '''
+    if backend.name() != 'node':
+        return None
+    from eosfactory.core.cleos import GetAccount
+    return int(GetAccount(account, json=True, is_verbose=False).json['ram_usage'])
+
+
+def seedWrites():
+    '''Returns the writes of the seed row so far, None off the engine.
+    '''
+    if backend.name() != 'engine':
+        return None
+    return backend.eosf().engine().seed_writes
+
+
+class ActionProfiler:
+
+    def __init__(self, host, measureRam=True):
+        self.host = host
+        self.users = UsersTable(host)
+        self.measureRam = measureRam
+        self.samples = {action: {metric: [] for metric in METRICS}
+                        for action in ACTIONS}
+        self.games = {metric: [] for metric in GAME_METRICS}
+        self.game = None
+
+    def _ram(self, player):
+        if not self.measureRam:
+            return None
+        player, host = ramUsage(player), ramUsage(self.host)
+        if player is None or host is None:
+            return None
+        return player + host
+
+    def push(self, action, player, **data):
+        data['username'] = player
+        ramBefore = self._ram(player)
+        seedBefore = seedWrites()
+        start = time.time()
+        result = self.host.push_action(
+            action, data, permission=(player, backend.eosf().Permission.ACTIVE), forceUnique=1)
+        wallMs = (time.time() - start) * 1000
+        ramAfter = self._ram(player)
+        seedAfter = seedWrites()
+
+        receipt = result.json['processed']['receipt']
+        samples = self.samples[action]
+        samples['cpu_usage_us'].append(int(receipt['cpu_usage_us']))
+        samples['net_usage_words'].append(int(receipt['net_usage_words']))
+        samples['wall_ms'].append(wallMs)
+        if ramBefore is not None:
+            samples['ram_bytes'].append(ramAfter - ramBefore)
+        if seedBefore is not None:
+            samples['seed_writes'].append(seedAfter - seedBefore)
+        if self.game is not None:
+            self.game['cpu_usage_us'] += int(receipt['cpu_usage_us'])
+            self.game['transactions'] += 1
+            if seedBefore is not None:
+                self.game['seed_writes'] += seedAfter - seedBefore
+        return result
+
+    def _gameData(self, player):
+        self.game['reads'] += 1
+        return self.users.get(player.name).game_data
+
+    def playGame(self, player, playround=False):
+        self.game = {metric: 0 for metric in GAME_METRICS}
+        self.push('login', player)
+        self.push('startgame', player)
+        gameData = self._gameData(player)
+        while True:
+            cardIdx = next(i for i, cardId in enumerate(gameData.hand_player) if cardId)
+            if playround:
+                self.push('playround', player, player_card_idx=cardIdx)
+            else:
+                self.push('playcard', player, player_card_idx=cardIdx)
+                if self._gameData(player).status != ONGOING:
+                    break
+                self.push('nextround', player)
+            gameData = self._gameData(player)
+            if gameData.status != ONGOING:
+                break
+        self.push('endgame', player)
+        for metric, value in self.game.items():
+            if metric != 'seed_writes' or seedWrites() is not None:
+                self.games[metric].append(value)
+        self.game = None
+
+    def report(self):
+        report = {action: {metric: summarize(values) for metric, values in metrics.items()}
+                  for action, metrics in self.samples.items()}
+        report['game'] = {metric: summarize(values) for metric, values in self.games.items()}
+        return report
+
+
+def _wasmHash():
+    path = os.path.join(session.CONTRACT_WORKSPACE, 'build', 'cardgame.wasm')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _gitCommit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=session.CONTRACT_WORKSPACE,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(games, measureRam=True, playround=False, singleSeedWrite=False):
+    shared = session.get(['SINGLE_SEED_WRITE'] if singleSeedWrite else [])
+    if singleSeedWrite and backend.name() == 'engine':
+        backend.eosf().engine().single_seed_write = True
+    profiler = ActionProfiler(shared.host, measureRam)
+    for _ in range(games):
+        profiler.playGame(shared.createPlayer('bench'), playround)
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+        'commit': _gitCommit(),
+        'wasm_sha256': _wasmHash(),
+        'backend': backend.name(),
+        'games': games,
+        'playround': playround,
+        'single_seed_write': singleSeedWrite,
+        'actions': profiler.report()
+    }
+
+
+def compare(previous, current, stream=sys.stdout):
+    '''Prints the relative change of p50 and p95 for every action metric.
+    '''
+    for action in ACTIONS + ['game']:
+        for metric in (GAME_METRICS if action == 'game' else METRICS):
+            old = previous['actions'].get(action, {}).get(metric, {})
+            new = current['actions'].get(action, {}).get(metric, {})
+            for stat in ('p50', 'p95'):
+                if not old.get(stat) or new.get(stat) is None:
+                    continue
+                change = (new[stat] - old[stat]) / old[stat] * 100
+                stream.write('{:<10} {:<16} {}: {:>10.1f} -> {:>10.1f} ({:+.1f}%)\n'.format(
+                    action, metric, stat, old[stat], new[stat], change))
+
+
+def compareRounds(games, measureRam=True, singleSeedWrite=False, stream=sys.stdout):
+    '''Plays games with playcard and nextround, then as many with
+    playround, on the same node, and prints the change from the first to
+    the second. Returns both runs.
+    '''
+    rounds = run(games, measureRam, False, singleSeedWrite)
+    playround = run(games, measureRam, True, singleSeedWrite)
+    compare(rounds, playround, stream)
+    return {'rounds': rounds, 'playround': playround}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure CPU, NET and RAM per cardgame action.')
+    parser.add_argument('-g', '--games', type=int, default=20)
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help='earlier output to compare with')
+    parser.add_argument('--no-ram', action='store_true',
+                        help='skip the get account calls around every action')
+    parser.add_argument('--playround', action='store_true',
+                        help='play each round with one playround instead of playcard and nextround')
+    parser.add_argument('--compare-playround', action='store_true',
+                        help='play the games with playcard and nextround, then with playround, '
+                             'and print the change')
+    parser.add_argument('--single-seed-write', action='store_true',
+                        help='write the seed once per action, building the contract '
+                             'with SINGLE_SEED_WRITE on a node')
+    args = parser.parse_args()
+
+    backend.eosf().verbosity([])
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    if args.compare_playround:
+        results = compareRounds(args.games, not args.no_ram, args.single_seed_write)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        return
+
+    results = run(args.games, not args.no_ram, args.playround, args.single_seed_write)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for action, metrics in results['actions'].items():
+        for metric, summary in metrics.items():
+            if summary['count']:
+                print('{:<10} {:<16} p50 {:>10.1f} p95 {:>10.1f} p99 {:>10.1f} (n={})'.format(
+                    action, metric, summary['p50'], summary['p95'], summary['p99'], summary['count']))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
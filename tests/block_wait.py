@@ -0,0 +1,142 @@
+'''Waits for pushed transactions to be in a block instead of sleeping.
+
+waitFor(result) takes what push_action returned and returns as soon as
+the head block, or with irreversible the last irreversible block, has
+reached the block of the transaction. It polls get_info with an
+exponential backoff, from FIRST_DELAY up to MAX_DELAY between calls, so
+a wait costs about one block interval rather than a fixed sleep. On the
+engine backend there is nothing to poll: it waits on engine_eosf's block
+notifications.
+
+    closed = host.push_action('close', data, permission=(carol, Permission.ACTIVE))
+    block_wait.waitFor(closed)
+
+track(account) records the block of the last push of account, and
+sync(account) waits for it. The session host is tracked, for tests
+reading through another node than the one they push to, as
+test_login_remote does. A push to a local node returns once its state is
+readable, so BaseTest reads rows without a sync.
+
+getInfo defaults to cleos get info on a node. httpInfo(url) reads it
+from the chain API of a nodeos or chain_server instead.
+'''
+import http.client
+import json
+import time
+import urllib.parse
+
+import backend
+
+HEAD = 'head_block_num'
+IRREVERSIBLE = 'last_irreversible_block_num'
+FIRST_DELAY = 0.005
+MAX_DELAY = 0.25
+TIMEOUT = 30
+
+
+class BlockTimeout(Exception):
+    pass
+
+
+def nodeInfo():
+    from eosfactory.core.cleos import GetInfo
+    return GetInfo(is_verbose=False).json
+
+
+def httpInfo(url):
+    '''Returns a getInfo reading /v1/chain/get_info of the node at url,
+    over one keep-alive connection, closed by its close().
+    '''
+    parsed = urllib.parse.urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80)
+
+    def getInfo():
+        connection.request('POST', '/v1/chain/get_info', '')
+        return json.loads(connection.getresponse().read().decode())
+
+    getInfo.close = connection.close
+    return getInfo
+
+
+def blockNum(result):
+    '''The block of a pushed transaction, from its receipt.
+    '''
+    return int(result.json['processed']['block_num'])
+
+
+def waitForBlock(number, irreversible=False, getInfo=None, timeout=TIMEOUT):
+    '''Returns get_info once its head (or last irreversible) block is at
+    least number. Raises BlockTimeout after timeout seconds.
+    '''
+    field = IRREVERSIBLE if irreversible else HEAD
+    if getInfo is None and backend.name() == 'engine':
+        import engine_eosf
+        if not engine_eosf.waitForBlock(number, timeout):
+            raise BlockTimeout('block {} not produced in {}s'.format(number, timeout))
+        return engine_eosf.get_info()
+
+    getInfo = getInfo or nodeInfo
+    deadline = time.monotonic() + timeout
+    delay = FIRST_DELAY
+    while True:
+        info = getInfo()
+        if int(info[field]) >= number:
+            return info
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise BlockTimeout('{} is {} after {}s, waiting for {}'.format(
+                field, info[field], timeout, number))
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, MAX_DELAY)
+
+
+def waitFor(result, irreversible=False, getInfo=None, timeout=TIMEOUT):
+    '''Returns get_info once the transaction of a push_action or
+    push_transaction result is in a block (an irreversible one with
+    irreversible).
+    '''
+    return waitForBlock(blockNum(result), irreversible, getInfo, timeout)
+
+
+def track(account):
+    '''Records the block of the last successful push_action or
+    push_transaction of account, for sync(). Returns account.
+    '''
+    if account is None or hasattr(account, '_lastBlock'):
+        return account
+    account._lastBlock = 0
+
+    def tracked(push):
+        def push_and_track(*args, **kwargs):
+            return record(account, push(*args, **kwargs))
+        return push_and_track
+
+    account.push_action = tracked(account.push_action)
+    if hasattr(account, 'push_transaction'):
+        account.push_transaction = tracked(account.push_transaction)
+    return account
+
+
+def record(account, result):
+    '''Records the block of a push result on a tracked account, for pushes
+    that do not go through its methods. Returns result.
+    '''
+    if hasattr(account, '_lastBlock'):
+        number = blockNum(result)
+        if number < account._lastBlock:
+            # The chain was reset under the account
+            account.__dict__.pop('_syncedBlocks', None)
+        account._lastBlock = number
+    return result
+
+
+def sync(account, irreversible=False, getInfo=None, timeout=TIMEOUT):
+    '''Waits until the last push of a tracked account is in a block. Once
+    a block is known to be in, later calls return without a get_info.
+    '''
+    field = IRREVERSIBLE if irreversible else HEAD
+    lastBlock = getattr(account, '_lastBlock', 0)
+    synced = account.__dict__.setdefault('_syncedBlocks', {})
+    if lastBlock <= synced.get(field, 0):
+        return
+    synced[field] = int(waitForBlock(lastBlock, irreversible, getInfo, timeout)[field])
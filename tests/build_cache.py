@@ -0,0 +1,182 @@
+'''Content-hash cache in front of Contract.build().
+
+The cache key is a sha256 of src/*.cpp and src/*.hpp and whether DEBUG
+is defined (see src/logger.hpp). Contract.build() takes no compiler
+flags, so build(contract, defines=['SINGLE_SEED_WRITE']) passes defines
+through src/build_defines.hpp, which cardgame.hpp includes: the file is
+written for the build and put back after it. The sources are then the
+whole input of a build, defines included. When the key matches the last
+successful build and build/ still holds the artifacts it produced, the
+build is skipped. Every lookup is recorded in build/build_cache.json with
+its hit/miss, defines and compile time.
+
+    python3 tests/build_cache.py        # prints the cache state
+'''
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+
+WORKSPACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ARTIFACTS = ['cardgame.wasm', 'cardgame.wast', 'cardgame.abi']
+SOURCE_PATTERNS = ['src/*.cpp', 'src/*.hpp']
+DEFINES_FILE = os.path.join('src', 'build_defines.hpp')
+CACHE_FILE = 'build_cache.json'
+HISTORY_SIZE = 50
+
+
+def _fileHash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def sources(workspace=WORKSPACE):
+    paths = []
+    for pattern in SOURCE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(workspace, pattern)))
+    return sorted(paths)
+
+
+def debugDefined(paths):
+    for path in paths:
+        with open(path) as f:
+            if re.search(r'^\s*#\s*define\s+DEBUG\b', f.read(), re.M):
+                return True
+    return False
+
+
+def definesSource(defines, default):
+    '''The build_defines.hpp of a build with defines: the default file with
+    a #define line per name.
+    '''
+    for define in defines:
+        if not re.match(r'^[A-Za-z_]\w*$', define):
+            raise ValueError('Not a preprocessor name: {}'.format(define))
+    return default + ''.join('#define {}\n'.format(define) for define in defines)
+
+
+def sourceActions(workspace=WORKSPACE):
+    '''The actions the EOSIO_ABI macros of src/*.cpp dispatch.
+    '''
+    actions = []
+    for path in glob.glob(os.path.join(workspace, 'src', '*.cpp')):
+        with open(path) as f:
+            for macro in re.findall(r'EOSIO_ABI\s*\(\s*\w+\s*,([^;]*)\)', f.read()):
+                actions.extend(re.findall(r'\(\s*(\w+)\s*\)', macro))
+    return actions
+
+
+def missingActions(workspace=WORKSPACE):
+    '''The actions of the sources that build/cardgame.abi lacks, all of
+    them without an ABI.
+    '''
+    path = os.path.join(workspace, 'build', 'cardgame.abi')
+    built = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            built = {action['name'] for action in json.load(f).get('actions', [])}
+    return [action for action in sourceActions(workspace) if action not in built]
+
+
+def cacheKey(workspace=WORKSPACE):
+    paths = sources(workspace)
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, workspace).encode())
+        digest.update(_fileHash(path).encode())
+    digest.update(b'DEBUG' if debugDefined(paths) else b'')
+    return digest.hexdigest()
+
+
+class BuildCache:
+
+    def __init__(self, workspace=WORKSPACE):
+        self.workspace = workspace
+        self.build_dir = os.path.join(workspace, 'build')
+        self.path = os.path.join(self.build_dir, CACHE_FILE)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {'key': None, 'artifacts': {}, 'history': []}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, state):
+        os.makedirs(self.build_dir, exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(state, f, indent=2)
+
+    def artifactHashes(self):
+        hashes = {}
+        for artifact in ARTIFACTS:
+            path = os.path.join(self.build_dir, artifact)
+            if os.path.exists(path):
+                hashes[artifact] = _fileHash(path)
+        return hashes
+
+    def isHit(self, state, key):
+        return (state['key'] == key and
+                len(state['artifacts']) == len(ARTIFACTS) and
+                state['artifacts'] == self.artifactHashes())
+
+    def isCurrent(self):
+        '''Whether build/ holds the artifacts of the current sources,
+        built without defines.
+        '''
+        return self.isHit(self.load(), cacheKey(self.workspace))
+
+    def build(self, contract, defines=()):
+        '''Builds the contract with the preprocessor names in defines
+        unless the cache holds artifacts for the current sources and
+        defines. Returns True on a hit.
+        '''
+        path = os.path.join(self.workspace, DEFINES_FILE)
+        default = None
+        if defines:
+            with open(path) as f:
+                default = f.read()
+            source = definesSource(defines, default)
+            with open(path, 'w') as f:
+                f.write(source)
+        try:
+            key = cacheKey(self.workspace)
+            state = self.load()
+            hit = self.isHit(state, key)
+            compileTime = 0.0
+            if not hit:
+                start = time.time()
+                contract.build(force=True)
+                compileTime = time.time() - start
+                state['key'] = key
+                state['artifacts'] = self.artifactHashes()
+        finally:
+            if default is not None:
+                with open(path, 'w') as f:
+                    f.write(default)
+
+        state['history'] = (state['history'] + [{
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+            'key': key,
+            'hit': hit,
+            'defines': list(defines),
+            'compile_seconds': round(compileTime, 3)
+        }])[-HISTORY_SIZE:]
+        self.save(state)
+        return hit
+
+
+def build(contract, workspace=WORKSPACE, defines=()):
+    return BuildCache(workspace).build(contract, defines)
+
+
+if __name__ == '__main__':
+    cache = BuildCache()
+    state = cache.load()
+    print('Current key: {}'.format(cacheKey()))
+    print('Cached key:  {}'.format(state['key']))
+    print('Hit: {}'.format(cache.isCurrent()))
+    for entry in state['history']:
+        print('{} {} {}s {}'.format(entry['time'], 'hit' if entry['hit'] else 'miss',
+                                    entry['compile_seconds'], ' '.join(entry.get('defines', []))))
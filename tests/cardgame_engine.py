@@ -0,0 +1,522 @@
+import bisect
+import time
+
+ONGOING = 0
+PLAYER_LOST = -1
+PLAYER_WON = 1
+
+EMPTY = 0
+FIRE = 1
+WOOD = 2
+WATER = 3
+NEUTRAL = 4
+VOID = 5
+
+SEED_PRIME = 65537
+HAND_SIZE = 4
+
+# Mirrors cardgame::card_dict, card_id -> (type, attack_point)
+CARD_DICT = {
+    0: (EMPTY, 0),
+    1: (FIRE, 1),
+    2: (FIRE, 1),
+    3: (FIRE, 2),
+    4: (FIRE, 2),
+    5: (FIRE, 3),
+    6: (WOOD, 1),
+    7: (WOOD, 1),
+    8: (WOOD, 2),
+    9: (WOOD, 2),
+    10: (WOOD, 3),
+    11: (WATER, 1),
+    12: (WATER, 1),
+    13: (WATER, 2),
+    14: (WATER, 2),
+    15: (WATER, 3),
+    16: (NEUTRAL, 3),
+    17: (VOID, 0)
+}
+
+FULL_DECK = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17]
+
+
+class Error(Exception):
+    '''Raised when an action fails, the engine equivalent of an eosio_assert.
+    '''
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class MissingRequiredAuthorityError(Error):
+    pass
+
+
+def new_game():
+    '''Returns the default cardgame::game struct as a dict, the same shape
+    the node returns in the users table json.
+    '''
+    return {
+        'status': ONGOING,
+        'life_player': 5,
+        'life_ai': 5,
+        'deck_player': FULL_DECK.copy(),
+        'deck_ai': FULL_DECK.copy(),
+        'hand_player': [0, 0, 0, 0],
+        'hand_ai': [0, 0, 0, 0],
+        'selected_card_player': 0,
+        'selected_card_ai': 0,
+        'life_lost_player': 0,
+        'life_lost_ai': 0
+    }
+
+
+def new_user(name):
+    return {
+        'name': name,
+        'win_count': 0,
+        'loss_count': 0,
+        'game_data': new_game()
+    }
+
+
+def copy_user(user):
+    '''A deep copy of a users row, without the generic copy.deepcopy walk.
+    '''
+    game_data = dict(user['game_data'])
+    for field in ('deck_player', 'deck_ai', 'hand_player', 'hand_ai'):
+        game_data[field] = list(game_data[field])
+    user = dict(user)
+    user['game_data'] = game_data
+    return user
+
+
+def calculate_attack_point(card1, card2, card_dict=CARD_DICT):
+    type1, attack_point = card_dict[card1]
+    type2 = card_dict[card2][0]
+
+    if ((type1 == WOOD and type2 == WATER) or
+            (type1 == WATER and type2 == FIRE) or
+            (type1 == FIRE and type2 == WOOD)):
+        attack_point += 1
+
+    return attack_point
+
+
+def ai_best_card_win_strategy(ai_attack_point, player_attack_point):
+    if ai_attack_point > player_attack_point:
+        return 3
+    if ai_attack_point < player_attack_point:
+        return -2
+    return -1
+
+
+def ai_min_loss_strategy(ai_attack_point, player_attack_point):
+    if ai_attack_point > player_attack_point:
+        return 1
+    if ai_attack_point < player_attack_point:
+        return -4
+    return -1
+
+
+def ai_points_tally_strategy(ai_attack_point, player_attack_point):
+    return ai_attack_point - player_attack_point
+
+
+def ai_loss_prevention_strategy(life_ai, ai_attack_point, player_attack_point):
+    if life_ai + ai_attack_point - player_attack_point > 0:
+        return 1
+    return 0
+
+
+def calculate_ai_card_score(strategy, life_ai, ai_card, hand_player, card_dict=CARD_DICT):
+    card_score = 0
+
+    for player_card in hand_player:
+        if card_dict[player_card][0] == EMPTY:
+            continue
+        ai_attack_point = calculate_attack_point(
+            ai_card, player_card, card_dict)
+        player_attack_point = calculate_attack_point(
+            player_card, ai_card, card_dict)
+
+        if strategy == 0:
+            card_score += ai_best_card_win_strategy(
+                ai_attack_point, player_attack_point)
+        elif strategy == 1:
+            card_score += ai_min_loss_strategy(
+                ai_attack_point, player_attack_point)
+        elif strategy == 2:
+            card_score += ai_points_tally_strategy(
+                ai_attack_point, player_attack_point)
+        elif strategy == 3:
+            card_score += ai_loss_prevention_strategy(
+                life_ai, ai_attack_point, player_attack_point)
+    return card_score
+
+
+def num_strategies(life_ai):
+    return 4 if life_ai < 2 else 3
+
+
+def choose_ai_card_idx(strategy, game_data, card_dict=CARD_DICT):
+    '''Returns the hand_ai index the AI plays once the strategy is known.
+    Ties go to the lowest index, as in the contract.
+    '''
+    chosen_card_idx = -1
+    chosen_card_score = None
+    for i, ai_card in enumerate(game_data['hand_ai']):
+        if card_dict[ai_card][0] == EMPTY:
+            continue
+
+        card_score = calculate_ai_card_score(
+            strategy, game_data['life_ai'], ai_card, game_data['hand_player'], card_dict)
+
+        if chosen_card_score is None or card_score > chosen_card_score:
+            chosen_card_score = card_score
+            chosen_card_idx = i
+    return chosen_card_idx
+
+
+def resolve_selected_cards(game_data, card_dict=CARD_DICT):
+    ai_card = game_data['selected_card_ai']
+    player_card = game_data['selected_card_player']
+
+    if card_dict[ai_card][0] == VOID or card_dict[player_card][0] == VOID:
+        return
+
+    attack_point_ai = calculate_attack_point(ai_card, player_card, card_dict)
+    attack_point_player = calculate_attack_point(
+        player_card, ai_card, card_dict)
+
+    if attack_point_ai > attack_point_player:
+        game_data['life_lost_player'] = attack_point_ai - attack_point_player
+        game_data['life_player'] -= game_data['life_lost_player']
+    else:
+        game_data['life_lost_ai'] = attack_point_player - attack_point_ai
+        game_data['life_ai'] -= game_data['life_lost_ai']
+
+
+def update_game_status(user):
+    game_data = user['game_data']
+
+    if 0 >= game_data['life_ai']:
+        game_data['status'] = PLAYER_WON
+    elif 0 >= game_data['life_player']:
+        game_data['status'] = PLAYER_LOST
+    elif not game_data['deck_player'] and max(game_data['hand_player']) == EMPTY:
+        if game_data['life_ai'] > game_data['life_player']:
+            game_data['status'] = PLAYER_LOST
+        else:
+            game_data['status'] = PLAYER_WON
+
+    if game_data['status'] == PLAYER_WON:
+        user['win_count'] += 1
+    elif game_data['status'] == PLAYER_LOST:
+        user['loss_count'] += 1
+
+
+class CardGame:
+    '''In-process model of the cardgame contract.
+
+    Holds the users and seed tables in memory and runs the contract actions
+    against them with the same arithmetic as src/cardgame.cpp. ``clock``
+    plays the role of now(): a callable returning the block time in
+    seconds. Actions are transactional, a failed assert leaves the tables
+    untouched. With a score_tables.ScoreTable as ``score_table`` the AI
+    looks its card scores up instead of computing them.
+
+    With ``single_seed_write`` an action reads the seed row on its first
+    random() and writes it back once when it is done instead of on every
+    call, as the contract built with SINGLE_SEED_WRITE defined does. The
+    random numbers are the same. ``seed_writes`` counts the writes of the
+    seed row.
+    '''
+
+    def __init__(self, clock=None, score_table=None, single_seed_write=False):
+        self.clock = clock or (lambda: int(time.time()))
+        self.score_table = score_table
+        self.single_seed_write = single_seed_write
+        self.users = {}
+        self.seed = None
+        self.seed_writes = 0
+        self._keys = []
+        self._seedValue = None
+
+    def random(self, range):
+        if self.single_seed_write:
+            if self._seedValue is None:
+                self._seedValue = self.seed['value'] if self.seed else 1
+            self._seedValue = ((self._seedValue + self.clock())
+                               & 0xFFFFFFFF) % SEED_PRIME
+            return self._seedValue % range
+
+        if self.seed is None:
+            self.seed = {'key': 1, 'value': 1}
+            self.seed_writes += 1
+
+        new_seed_value = ((self.seed['value'] + self.clock())
+                          & 0xFFFFFFFF) % SEED_PRIME
+        self.seed['value'] = new_seed_value
+        self.seed_writes += 1
+
+        return new_seed_value % range
+
+    def write_seed(self):
+        '''Writes back the seed of a single_seed_write action, if it drew.
+        '''
+        if self._seedValue is None:
+            return
+        self.seed = {'key': 1, 'value': self._seedValue}
+        self.seed_writes += 1
+        self._seedValue = None
+
+    def draw_one_card(self, deck, hand):
+        deck_card_idx = self.random(len(deck))
+
+        first_empty_slot = -1
+        for i, card_id in enumerate(hand):
+            if CARD_DICT[card_id][0] == EMPTY:
+                first_empty_slot = i
+                break
+        self._assert(first_empty_slot != -1, 'Hand has no empty slot')
+
+        hand[first_empty_slot] = deck.pop(deck_card_idx)
+
+    def ai_choose_card(self, game_data):
+        strategy = self.random(num_strategies(game_data['life_ai']))
+        if self.score_table:
+            return self.score_table.choose_ai_card_idx(strategy, game_data)
+        return choose_ai_card_idx(strategy, game_data)
+
+    def login(self, username, authorizer=None):
+        self._requireAuth(username, authorizer)
+
+        if username not in self.users:
+            self.users[username] = new_user(username)
+
+    def startgame(self, username, authorizer=None):
+        self._requireAuth(username, authorizer)
+        user = self._getUser(username)
+
+        def modify(modified_user):
+            game_data = new_game()
+            for _ in range(HAND_SIZE):
+                self.draw_one_card(
+                    game_data['deck_player'], game_data['hand_player'])
+                self.draw_one_card(game_data['deck_ai'], game_data['hand_ai'])
+            modified_user['game_data'] = game_data
+
+        self._modify(user, modify)
+
+    def play_card(self, user, player_card_idx):
+        game_data = user['game_data']
+        ai_card_idx = self.ai_choose_card(game_data)
+        game_data['selected_card_ai'] = game_data['hand_ai'][ai_card_idx]
+        game_data['hand_ai'][ai_card_idx] = 0
+        game_data['selected_card_player'] = game_data['hand_player'][player_card_idx]
+        game_data['hand_player'][player_card_idx] = 0
+        resolve_selected_cards(game_data)
+        update_game_status(user)
+
+    def draw_next_cards(self, game_data):
+        game_data['selected_card_ai'] = 0
+        game_data['selected_card_player'] = 0
+        game_data['life_lost_ai'] = 0
+        game_data['life_lost_player'] = 0
+        if game_data['deck_player']:
+            self.draw_one_card(game_data['deck_player'], game_data['hand_player'])
+        if game_data['deck_ai']:
+            self.draw_one_card(game_data['deck_ai'], game_data['hand_ai'])
+
+    def playcard(self, username, player_card_idx, authorizer=None):
+        user = self._playableUser(username, player_card_idx, authorizer)
+
+        def modify(modified_user):
+            self.play_card(modified_user, player_card_idx)
+
+        self._modify(user, modify)
+
+    def nextround(self, username, authorizer=None):
+        self._requireAuth(username, authorizer)
+        user = self._getUser(username)
+        game_data = user['game_data']
+        self._assert(game_data['status'] == ONGOING,
+                     'Game status should be ongoing')
+        self._assert(game_data['selected_card_ai'] != 0,
+                     'AI has not selected a card')
+        self._assert(game_data['selected_card_player'] != 0,
+                     'Player has not selected a card')
+
+        def modify(modified_user):
+            self.draw_next_cards(modified_user['game_data'])
+
+        self._modify(user, modify)
+
+    def playround(self, username, player_card_idx, authorizer=None):
+        '''playcard and, while the game goes on, nextround in one modify
+        of the row.
+        '''
+        user = self._playableUser(username, player_card_idx, authorizer)
+
+        def modify(modified_user):
+            self.play_card(modified_user, player_card_idx)
+            if modified_user['game_data']['status'] == ONGOING:
+                self.draw_next_cards(modified_user['game_data'])
+
+        self._modify(user, modify)
+
+    def endgame(self, username, authorizer=None):
+        self._requireAuth(username, authorizer)
+        user = self._getUser(username)
+
+        def modify(modified_user):
+            modified_user['game_data'] = new_game()
+
+        self._modify(user, modify)
+
+    def apply(self, action, data, authorizer=None):
+        '''Dispatches an action by name with its json arguments, the way the
+        EOSIO_ABI dispatcher does.
+        '''
+        if action in ('playcard', 'playround'):
+            return getattr(self, action)(data['username'], data['player_card_idx'], authorizer)
+        if action not in ('login', 'startgame', 'nextround', 'endgame'):
+            raise Error('Unknown action {}'.format(action))
+        return getattr(self, action)(data['username'], authorizer)
+
+    def transaction(self, actions):
+        '''Applies (action, data, authorizer) tuples as one transaction: if
+        one of them fails, none of them has any effect.
+        '''
+        journal = {}
+        seed = dict(self.seed) if self.seed else None
+        try:
+            for action, data, authorizer in actions:
+                username = data.get('username')
+                if username not in journal:
+                    journal[username] = self.users.get(username)
+                self.apply(action, data, authorizer)
+        except Error:
+            # Rows are replaced, never changed in place, so the old ones are intact
+            for username, user in journal.items():
+                if user is None:
+                    self.users.pop(username, None)
+                else:
+                    self.users[username] = user
+            self.seed = seed
+            raise
+
+    def load_rows(self, users, seed=None):
+        '''Writes users rows as they are, replacing the rows of the same
+        names, and the seed row if given, the way a restored chain holds
+        them. Other rows are left alone.
+        '''
+        for user in users:
+            self.users[user['name']] = copy_user(user)
+        if seed is not None:
+            self.seed = dict(seed)
+        self._keys = []
+
+    def rows(self, table):
+        '''Returns copies of the rows of a table ordered by primary key.
+        '''
+        return self.range(table)[0]
+
+    def range(self, table, lower=None, upper=None, limit=None):
+        '''Returns copies of the rows of a table with lower <= primary key <
+        upper, at most limit of them, and whether more rows were left out.
+        '''
+        if table == 'users':
+            keys = self._userKeys()
+            first = bisect.bisect_left(keys, lower) if lower is not None else 0
+            end = bisect.bisect_left(keys, upper) if upper is not None else len(keys)
+            last = min(end, first + limit) if limit is not None else end
+            rows = [copy_user(self.users[uint64_to_name(key)])
+                    for key in keys[first:last]]
+            more = last < end
+        elif table == 'seed':
+            rows = [dict(self.seed)] if self.seed and \
+                (lower is None or lower <= 1) and (upper is None or 1 < upper) else []
+            more = bool(limit is not None and len(rows) > limit)
+            rows = rows[:limit]
+        else:
+            raise Error('Table {} does not exist'.format(table))
+        return rows, more
+
+    def _userKeys(self):
+        if len(self._keys) != len(self.users):
+            self._keys = sorted(name_to_uint64(name) for name in self.users)
+        return self._keys
+
+    def _playableUser(self, username, player_card_idx, authorizer):
+        self._requireAuth(username, authorizer)
+        self._assert(0 <= player_card_idx <= 0xFF,
+                     'Invalid uint8 value for player_card_idx')
+        self._assert(player_card_idx < HAND_SIZE,
+                     'Played card index out of range')
+        user = self._getUser(username)
+        self._assert(user['game_data']['status'] == ONGOING,
+                     'Game status should be ongoing')
+        self._assert(user['game_data']['selected_card_player'] == 0,
+                     'You have already selected a card')
+        return user
+
+    def _getUser(self, username):
+        user = self.users.get(username)
+        self._assert(user is not None, 'User does not exist')
+        return user
+
+    def _modify(self, user, modifier):
+        modified_user = copy_user(user)
+        seed = dict(self.seed) if self.seed else None
+        try:
+            modifier(modified_user)
+        except Error:
+            self.seed = seed
+            self._seedValue = None
+            raise
+        self.users[modified_user['name']] = modified_user
+        self.write_seed()
+
+    def _requireAuth(self, username, authorizer):
+        if authorizer is not None and authorizer != username:
+            raise MissingRequiredAuthorityError(
+                'missing authority of {}'.format(username))
+
+    def _assert(self, condition, message):
+        if not condition:
+            raise Error('assertion failure with message: {}'.format(message))
+
+
+NAME_CHARMAP = '.12345abcdefghijklmnopqrstuvwxyz'
+
+
+def name_to_uint64(name):
+    '''Encodes an account name the way eosio::string_to_name does.
+    '''
+    value = 0
+    for i in range(13):
+        c = 0
+        if i < len(name):
+            c = NAME_CHARMAP.index(name[i])
+        if i < 12:
+            value |= (c & 0x1f) << (64 - 5 * (i + 1))
+        else:
+            value |= c & 0x0f
+    return value
+
+
+def uint64_to_name(value):
+    chars = []
+    tmp = value
+    for i in range(13):
+        if i == 0:
+            c = NAME_CHARMAP[tmp & 0x0f]
+            tmp >>= 4
+        else:
+            c = NAME_CHARMAP[tmp & 0x1f]
+            tmp >>= 5
+        chars.append(c)
+    return ''.join(reversed(chars)).rstrip('.')
@@ -0,0 +1,406 @@
+'''A local stand-in for nodeos: the chain API subset the harness uses,
+served over HTTP by the in-process CardGame engine.
+
+    POST /v1/chain/get_info
+    POST /v1/chain/push_transaction   packed_trx, or an unsigned
+                                      "transaction" with json action data
+    POST /v1/chain/get_table_rows     lower_bound, upper_bound, limit, json
+    POST /v1/chain/get_account
+
+Transactions run on engine_eosf's engine, so a test module importing the
+engine backend and an HTTP client such as the load generator's HttpTarget
+see the same users and seed tables. Every transaction is its own block,
+with the block time from the engine clock. Signatures are not checked:
+the first authorization of an action is its authorizer, as in
+engine_eosf. Responses and errors have the shape nodeos gives them.
+
+The server is an asyncio protocol on one thread, with keep-alive and
+pipelined requests.
+
+    python3 tests/chain_server.py -p 8888
+    python3 tests/load_generator.py -t http://127.0.0.1:8888 -p 200 -c 50
+'''
+import argparse
+import asyncio
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+import zlib
+
+import abi_codec
+import engine_eosf
+from abi_codec import decodeName, readVaruint32, writeVaruint32
+from cardgame_engine import Error, MissingRequiredAuthorityError, name_to_uint64, uint64_to_name
+from tables import PRIMARY_KEYS, binaryPrimaryKey
+
+CHAIN_ID = hashlib.sha256(b'cardgame local chain').hexdigest()
+SERVER_VERSION = 'cardgame-standin'
+# expiration, ref_block_num, ref_block_prefix
+TRANSACTION_HEADER = struct.Struct('<IHI')
+NAME_PAIR = struct.Struct('<QQ')
+REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+           500: 'Internal Server Error'}
+
+
+class ChainError(Exception):
+    '''A failed request, answered with nodeos' error body.
+    '''
+
+    def __init__(self, status, code, name, what, message):
+        super().__init__(message)
+        self.status = status
+        self.response = {
+            'code': status,
+            'message': REASONS[status],
+            'error': {'code': code, 'name': name, 'what': what,
+                      'details': [{'message': message, 'file': '', 'line_number': 0,
+                                   'method': ''}]}
+        }
+
+
+def _readActions(data, pos):
+    count, pos = readVaruint32(data, pos)
+    actions = []
+    for _ in range(count):
+        account, name = NAME_PAIR.unpack_from(data, pos)
+        pos += NAME_PAIR.size
+        authorizations, pos = readVaruint32(data, pos)
+        authorization = []
+        for _ in range(authorizations):
+            actor, permission = NAME_PAIR.unpack_from(data, pos)
+            pos += NAME_PAIR.size
+            authorization.append({'actor': decodeName(actor), 'permission': decodeName(permission)})
+        size, pos = readVaruint32(data, pos)
+        actions.append({'account': decodeName(account), 'name': decodeName(name),
+                        'authorization': authorization, 'data': data[pos:pos + size]})
+        pos += size
+    return actions, pos
+
+
+def unpackTransaction(packed):
+    '''Returns the actions of a serialized transaction, with their data
+    still serialized.
+    '''
+    pos = TRANSACTION_HEADER.size
+    # max_net_usage_words, max_cpu_usage_ms and delay_sec
+    _, pos = readVaruint32(packed, pos)
+    pos += 1
+    _, pos = readVaruint32(packed, pos)
+    _, pos = _readActions(packed, pos)
+    actions, _ = _readActions(packed, pos)
+    return actions
+
+
+def packTransaction(actions, expiration=0, refBlockNum=0, refBlockPrefix=0):
+    '''Serializes a transaction of json actions, the inverse of
+    unpackTransaction.
+    '''
+    codec = abi_codec.abi()
+    packed = [TRANSACTION_HEADER.pack(expiration, refBlockNum, refBlockPrefix),
+              writeVaruint32(0), b'\0', writeVaruint32(0), writeVaruint32(0),
+              writeVaruint32(len(actions))]
+    for action in actions:
+        data = action['data']
+        if not isinstance(data, bytes):
+            data = codec.encode(action['name'], data)
+        packed.append(NAME_PAIR.pack(name_to_uint64(action['account']),
+                                     name_to_uint64(action['name'])))
+        packed.append(writeVaruint32(len(action['authorization'])))
+        for level in action['authorization']:
+            packed.append(NAME_PAIR.pack(name_to_uint64(level['actor']),
+                                         name_to_uint64(level['permission'])))
+        packed.append(writeVaruint32(len(data)) + data)
+    packed.append(writeVaruint32(0))
+    return b''.join(packed)
+
+
+def _blockTime(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000', time.gmtime(seconds))
+
+
+class Chain:
+    '''The chain API endpoints, over engine_eosf's engine.
+    '''
+
+    ENDPOINTS = ('get_info', 'push_transaction', 'get_table_rows', 'get_account')
+
+    def __init__(self, contract='host'):
+        self.contract = contract
+        self.host = engine_eosf.Account(contract)
+        self.codec = abi_codec.abi()
+        self.actions = {action['name'] for action in self.codec.abi['actions']}
+        self.accounts = {'eosio', contract}
+
+    def call(self, endpoint, body):
+        '''Returns the status and response of an API call.
+        '''
+        if endpoint not in self.ENDPOINTS:
+            return 404, ChainError(404, 0, 'exception', 'unspecified',
+                                   'Unknown Endpoint').response
+        try:
+            return 200, getattr(self, endpoint)(body)
+        except ChainError as e:
+            return e.status, e.response
+        except (KeyError, TypeError, ValueError, IndexError, struct.error, zlib.error) as e:
+            return 400, ChainError(400, 3200006, 'invalid_http_request', 'invalid http request',
+                                   'Invalid request: {!r}'.format(e)).response
+
+    def _head(self):
+        blockNum = engine_eosf._blockNum
+        return blockNum, hashlib.sha256(str(blockNum).encode()).hexdigest()
+
+    def get_info(self, body):
+        blockNum, blockId = self._head()
+        return {
+            'server_version': SERVER_VERSION,
+            'chain_id': CHAIN_ID,
+            'head_block_num': blockNum,
+            'last_irreversible_block_num': blockNum,
+            'last_irreversible_block_id': blockId,
+            'head_block_id': blockId,
+            'head_block_time': _blockTime(engine_eosf.engine().clock()),
+            'head_block_producer': 'eosio',
+            'server_version_string': SERVER_VERSION
+        }
+
+    def _actions(self, body):
+        '''The actions of a push_transaction body, with json data, as
+        engine_eosf's push_transaction takes them.
+        '''
+        if 'packed_trx' in body:
+            packed = bytes.fromhex(body['packed_trx'])
+            if body.get('compression') in ('zlib', 1):
+                packed = zlib.decompress(packed)
+            actions = unpackTransaction(packed)
+        else:
+            actions = body['transaction']['actions']
+        parsed = []
+        for action in actions:
+            if action['account'] != self.contract or action['name'] not in self.actions:
+                raise ChainError(500, 3040000, 'action_validate_exception',
+                                 'Transaction action validation exception',
+                                 'Unknown action {} in contract {}'.format(
+                                     action['name'], action['account']))
+            data = action['data']
+            # Through the ABI, which fills in the types of json arguments
+            if not isinstance(data, bytes):
+                data = bytes.fromhex(data) if isinstance(data, str) else \
+                    self.codec.encode(action['name'], data)
+            authorization = action.get('authorization')
+            authorizer = authorization[0]['actor'] if authorization else None
+            parsed.append({'name': action['name'], 'data': self.codec.decodeJson(action['name'], data),
+                           'authorization': authorization})
+            if authorizer is not None:
+                self.accounts.add(authorizer)
+        return parsed
+
+    def push_transaction(self, body):
+        actions = self._actions(body)
+        try:
+            return self.host.push_transaction(actions).json
+        except MissingRequiredAuthorityError as e:
+            raise ChainError(500, 3090004, 'missing_auth_exception',
+                             'Missing required authority', e.message)
+        except Error as e:
+            raise ChainError(500, 3050003, 'eosio_assert_message_exception',
+                             'eosio_assert_message assertion failure', e.message)
+
+    def get_table_rows(self, body):
+        if body['code'] != self.contract or body['table'] not in PRIMARY_KEYS:
+            raise ChainError(500, 3060003, 'contract_table_query_exception',
+                             'Contract Table Query Exception',
+                             'Table {} is not specified in the ABI'.format(body['table']))
+        if int(body.get('index_position') or 1) != 1:
+            raise ChainError(500, 3060003, 'contract_table_query_exception',
+                             'Contract Table Query Exception', 'Only the primary index is served')
+        binary = not body.get('json', False)
+        limit = int(body.get('limit', 10))
+        if body.get('scope', self.contract) != self.contract:
+            return {'rows': [], 'more': False, 'next_key': ''}
+        result = self.host.table(body['table'], self.contract, binary=binary, limit=limit,
+                                 lower=str(body.get('lower_bound', '')),
+                                 upper=str(body.get('upper_bound', ''))).json
+        rows = result['rows']
+        nextKey = ''
+        if result['more'] and rows:
+            primaryKey = binaryPrimaryKey if binary else PRIMARY_KEYS[body['table']]
+            nextKey = str(primaryKey(rows[-1]) + 1)
+        return {'rows': rows, 'more': result['more'], 'next_key': nextKey}
+
+    def get_account(self, body):
+        name = str(body['account_name'])
+        if uint64_to_name(name_to_uint64(name)) != name or \
+                (name not in self.accounts and name not in engine_eosf.engine().users):
+            raise ChainError(500, 3060002, 'account_query_exception', 'Account Query Exception',
+                             'unknown key (eosio::chain::name): {}'.format(name))
+        blockNum, _ = self._head()
+        unlimited = {'used': 0, 'available': -1, 'max': -1}
+        authority = {'threshold': 1, 'keys': [], 'accounts': [], 'waits': []}
+        return {
+            'account_name': name,
+            'head_block_num': blockNum,
+            'head_block_time': _blockTime(engine_eosf.engine().clock()),
+            'privileged': name == 'eosio',
+            'ram_quota': -1,
+            'net_weight': -1,
+            'cpu_weight': -1,
+            'net_limit': unlimited,
+            'cpu_limit': unlimited,
+            'ram_usage': 0,
+            'permissions': [
+                {'perm_name': 'active', 'parent': 'owner', 'required_auth': authority},
+                {'perm_name': 'owner', 'parent': '', 'required_auth': authority}
+            ]
+        }
+
+
+class _Connection(asyncio.Protocol):
+    '''One keep-alive HTTP/1.1 connection. Requests are answered in order
+    as soon as their body is in.
+    '''
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.buffer = bytearray()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def data_received(self, data):
+        buffer = self.buffer
+        buffer += data
+        while True:
+            end = buffer.find(b'\r\n\r\n')
+            if end < 0:
+                return
+            lines = buffer[:end].decode('latin-1').split('\r\n')
+            method, path, version = (lines[0].split(' ') + ['', ''])[:3]
+            length = 0
+            keepAlive = version == 'HTTP/1.1'
+            for line in lines[1:]:
+                header, _, value = line.partition(':')
+                header = header.strip().lower()
+                if header == 'content-length':
+                    length = int(value)
+                elif header == 'connection':
+                    keepAlive = value.strip().lower() != 'close' and (
+                        keepAlive or value.strip().lower() == 'keep-alive')
+            if len(buffer) < end + 4 + length:
+                return
+            body = bytes(buffer[end + 4:end + 4 + length])
+            del buffer[:end + 4 + length]
+            self._respond(method, path, body, keepAlive)
+            if not keepAlive:
+                self.transport.close()
+                return
+
+    def _respond(self, method, path, body, keepAlive):
+        path = path.split('?', 1)[0]
+        if method not in ('GET', 'POST') or not path.startswith('/v1/chain/'):
+            status, response = 404, ChainError(404, 0, 'exception', 'unspecified',
+                                               'Unknown Endpoint').response
+        else:
+            try:
+                request = json.loads(body.decode()) if body.strip() else {}
+            except ValueError:
+                request = None
+            if not isinstance(request, dict):
+                status, response = 400, ChainError(
+                    400, 3200006, 'invalid_http_request', 'invalid http request',
+                    'Unable to parse valid input from POST body').response
+            else:
+                status, response = self.chain.call(path[len('/v1/chain/'):], request)
+        payload = json.dumps(response, separators=(',', ':')).encode()
+        self.transport.write(
+            'HTTP/1.1 {} {}\r\nServer: {}\r\nContent-Type: application/json\r\n'
+            'Content-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+                status, REASONS[status], SERVER_VERSION, len(payload),
+                'keep-alive' if keepAlive else 'close').encode() + payload)
+
+
+class ChainServer:
+    '''Serves a Chain on host:port, port 0 picking a free one. start runs
+    it on a daemon thread, serve_forever on the calling one.
+    '''
+
+    def __init__(self, host='127.0.0.1', port=0, contract='host'):
+        self.host = host
+        self.port = port
+        self.chain = Chain(contract)
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(self.host, self.port)
+
+    async def _listen(self):
+        self.server = await self.loop.create_server(
+            lambda: _Connection(self.chain), self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self._listen())
+            ready.set()
+            self.loop.run_forever()
+            self.server.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+    def serve_forever(self, ready=None):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._listen())
+        if ready is not None:
+            ready(self)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self.loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the chain API from the Python engine.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8888)
+    parser.add_argument('--contract', default='host')
+    args = parser.parse_args()
+
+    try:
+        ChainServer(args.host, args.port, args.contract).serve_forever(
+            lambda server: print('Serving the chain API on {}'.format(server.url), flush=True))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+'''The subset of the eosfactory.eosf interface the test modules use, served
+by the in-process CardGame engine instead of a local nodeos.
+
+Accounts and the contract host are injected into the caller's globals the
+same way eosfactory does, so a test module only has to change its import to
+run against the engine.
+'''
+import enum
+import hashlib
+import sys
+import threading
+import time
+
+import abi_codec
+from cardgame_engine import CardGame, Error, MissingRequiredAuthorityError, name_to_uint64
+
+_engine = None
+_blockNum = 0
+# Transactions run one at a time, as on a node
+_lock = threading.Lock()
+# Notified with every new block
+_blocks = threading.Condition(_lock)
+
+
+class Verbosity(enum.Enum):
+    COMMENT = 0
+    INFO = 1
+    OUT = 2
+    TRACE = 3
+    DEBUG = 4
+
+
+class Permission(enum.Enum):
+    OWNER = 'owner'
+    ACTIVE = 'active'
+
+
+def verbosity(levels):
+    pass
+
+
+def SCENARIO(message):
+    pass
+
+
+def COMMENT(message):
+    pass
+
+
+def engine():
+    global _engine
+    if _engine is None:
+        _engine = CardGame()
+    return _engine
+
+
+def reset(**options):
+    '''Starts over with an empty engine, CardGame(**options).
+    '''
+    global _engine, _blockNum
+    _engine = CardGame(**options)
+    _blockNum = 0
+
+
+def isolate(**options):
+    '''Swaps in an empty engine, CardGame(**options), for one test and
+    returns the function putting the previous engine back, for addCleanup.
+    The shared session's engine is left as the test found it.
+
+        self.addCleanup(engine_eosf.isolate())
+    '''
+    global _engine, _blockNum
+    with _lock:
+        previous = _engine
+        blockNum = _blockNum
+        _engine = CardGame(**options)
+        _blockNum = 0
+
+    def restore():
+        global _engine, _blockNum
+        with _lock:
+            _engine = previous
+            # Block numbers never go back, for pushes waited on meanwhile
+            _blockNum = max(_blockNum, blockNum)
+            _blocks.notify_all()
+    return restore
+
+
+def get_info():
+    '''The block numbers of get_info. Every transaction is a block, final
+    at once.
+    '''
+    with _lock:
+        return {'head_block_num': _blockNum, 'last_irreversible_block_num': _blockNum}
+
+
+def waitForBlock(blockNum, timeout=None):
+    '''Blocks until block blockNum exists, returns False on timeout.
+    '''
+    with _blocks:
+        return _blocks.wait_for(lambda: _blockNum >= blockNum, timeout)
+
+
+def stop():
+    pass
+
+
+def create_wallet():
+    pass
+
+
+class TableResult:
+
+    def __init__(self, rows, more):
+        self.json = {'rows': rows, 'more': more}
+
+
+class PushActionResult:
+
+    def __init__(self, transactionId, blockNum, blockTime, actions, elapsed=0):
+        self.json = {
+            'transaction_id': transactionId,
+            'processed': {
+                'id': transactionId,
+                'block_num': blockNum,
+                'block_time': time.strftime('%Y-%m-%dT%H:%M:%S.000', time.gmtime(blockTime)),
+                'elapsed': elapsed,
+                'receipt': {'status': 'executed', 'cpu_usage_us': 0, 'net_usage_words': 0},
+                'action_traces': [{'act': {'name': action, 'data': data}}
+                                  for action, data in actions]
+            }
+        }
+
+
+class Account:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return self.name
+
+    def push_action(self, action, data, permission=None, forceUnique=0, **kwargs):
+        authorizer = None
+        if permission is not None:
+            authorizer = permission[0] if isinstance(permission, tuple) else permission
+        return self._push([(action, data, authorizer)])
+
+    def push_transaction(self, actions, **kwargs):
+        '''Pushes chain api style actions, dicts with name, authorization
+        and data, as one transaction.
+        '''
+        return self._push([(action['name'], action['data'],
+                            action['authorization'][0]['actor'] if action.get('authorization') else None)
+                           for action in actions])
+
+    def _push(self, actions):
+        global _blockNum
+        actions = [(action, {key: str(value) if isinstance(value, Account) else value
+                             for key, value in data.items()},
+                    str(authorizer) if authorizer is not None else None)
+                   for action, data, authorizer in actions]
+        with _lock:
+            # now() is the block time, fixed for the whole transaction
+            game = engine()
+            clock = game.clock
+            blockTime = clock()
+            game.clock = lambda: blockTime
+            start = time.perf_counter()
+            try:
+                game.transaction(actions)
+            finally:
+                game.clock = clock
+                elapsed = int((time.perf_counter() - start) * 1000000)
+            _blockNum += 1
+            blockNum = _blockNum
+            _blocks.notify_all()
+        transactionId = hashlib.sha256('{}:{}:{}'.format(
+            blockNum, actions, time.time()).encode()).hexdigest()
+        return PushActionResult(transactionId, blockNum, blockTime,
+                                [(action, data) for action, data, _ in actions], elapsed)
+
+    def table(self, table_name, scope, binary=False, limit=10, key='', lower='', upper=''):
+        with _lock:
+            rows, more = engine().range(table_name, lower=_toKey(lower),
+                                        upper=_toKey(upper), limit=limit)
+        if binary:
+            codec = abi_codec.abi()
+            rows = [codec.encodeRow(table_name, row) for row in rows]
+        return TableResult(rows, more)
+
+
+def _toKey(bound):
+    if bound == '':
+        return None
+    if isinstance(bound, int) or str(bound).isdigit():
+        return int(bound)
+    return name_to_uint64(str(bound))
+
+
+class Contract:
+
+    def __init__(self, account, contract_dir, **kwargs):
+        self.account = account
+        self.contract_dir = contract_dir
+
+    def build(self, force=True):
+        pass
+
+    def deploy(self, **kwargs):
+        pass
+
+
+def _inject(account_object_name, account):
+    sys._getframe(2).f_globals[account_object_name] = account
+    return account
+
+
+def create_master_account(account_object_name, testnet=None):
+    return _inject(account_object_name, Account('eosio'))
+
+
+def create_account(account_object_name, creator, account_name='', **kwargs):
+    return _inject(account_object_name, Account(account_name or account_object_name))
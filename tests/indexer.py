@@ -0,0 +1,268 @@
+'''Off-chain index of the users table in SQLite.
+
+The leaderboard and player pages query a local SQLite database instead
+of scanning the users table. Indexer keeps one row per user_info with its
+win_count, loss_count and game status, indexed on each, and a hash of the
+row's serialized bytes. A sync only decodes and writes the rows whose
+hash changed.
+
+Two sources feed it:
+
+- poll(host) pages through the users table (json=false) of a node, the
+  engine or chain_server, like tables.iterRows. The key of the next page
+  is checkpointed with every page, so an interrupted pass resumes where
+  it stopped.
+- follow(path) reads an action_log from the checkpointed offset and
+  takes the user_after of every successful record, with no table reads.
+
+Each page or batch of records is committed with its checkpoint in one
+SQLite transaction.
+
+    python3 tests/indexer.py -d build/users.sqlite poll --url http://127.0.0.1:8888 -i 1
+    python3 tests/indexer.py -d build/users.sqlite follow day.log
+    python3 tests/indexer.py -d build/users.sqlite top -n 10
+'''
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import sqlite3
+import sys
+import time
+import types
+import urllib.parse
+
+import abi_codec
+import action_log
+from tables import USERS, binaryPrimaryKey
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    win_count INTEGER NOT NULL,
+    loss_count INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    life_player INTEGER NOT NULL,
+    life_ai INTEGER NOT NULL,
+    hash INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS users_win_count ON users (win_count DESC, name);
+CREATE INDEX IF NOT EXISTS users_loss_count ON users (loss_count DESC, name);
+CREATE INDEX IF NOT EXISTS users_status ON users (status);
+CREATE TABLE IF NOT EXISTS checkpoint (
+    source TEXT PRIMARY KEY,
+    position TEXT NOT NULL,
+    passes INTEGER NOT NULL,
+    time REAL NOT NULL
+);
+'''
+UPSERT = '''INSERT OR REPLACE INTO users
+    (name, win_count, loss_count, status, life_player, life_ai, hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?)'''
+ORDERS = ('win_count', 'loss_count')
+LOG_BATCH = 500
+
+
+def rowHash(data):
+    '''A signed 64 bit hash of a serialized row, as SQLite stores it.
+    '''
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little', signed=True)
+
+
+class HttpHost:
+    '''Table reads of the contract account over a node's chain API, with
+    the signature of the eosfactory account's table().
+    '''
+
+    def __init__(self, url, contract='host'):
+        parsed = urllib.parse.urlparse(url)
+        self.connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80)
+        self.contract = contract
+
+    def __str__(self):
+        return self.contract
+
+    def table(self, table_name, scope, binary=False, limit=10, key='', lower='', upper=''):
+        body = json.dumps({'code': self.contract, 'scope': str(scope), 'table': table_name,
+                           'json': not binary, 'lower_bound': lower, 'upper_bound': upper,
+                           'limit': limit})
+        self.connection.request('POST', '/v1/chain/get_table_rows', body)
+        response = self.connection.getresponse()
+        result = json.loads(response.read().decode())
+        if response.status != 200:
+            raise IOError('get_table_rows failed: {}'.format(result))
+        return types.SimpleNamespace(json=result)
+
+    def close(self):
+        self.connection.close()
+
+
+class Indexer:
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.codec = abi_codec.abi()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def checkpoint(self, source):
+        '''Returns (position, passes) of source, ('', 0) before its first sync.
+        '''
+        row = self.db.execute('SELECT position, passes FROM checkpoint WHERE source = ?',
+                              (source,)).fetchone()
+        return row if row else ('', 0)
+
+    def _setCheckpoint(self, source, position, passes):
+        self.db.execute('INSERT OR REPLACE INTO checkpoint VALUES (?, ?, ?, ?)',
+                        (source, str(position), passes, time.time()))
+
+    def _upsert(self, rows):
+        '''Decodes and writes the serialized user_info rows whose hash
+        differs from the index, and returns how many.
+        '''
+        if not rows:
+            return 0
+        # name is the first field of user_info
+        names = [abi_codec.decodeName(int.from_bytes(data[:8], 'little')) for data in rows]
+        known = dict(self.db.execute(
+            'SELECT name, hash FROM users WHERE name IN ({})'.format(','.join('?' * len(names))),
+            names))
+        changed = []
+        for name, data in zip(names, rows):
+            digest = rowHash(data)
+            if known.get(name) == digest:
+                continue
+            user = self.codec.decode('user_info', data)
+            changed.append((name, user.win_count, user.loss_count, user.game_data.status,
+                            user.game_data.life_player, user.game_data.life_ai, digest))
+        self.db.executemany(UPSERT, changed)
+        return len(changed)
+
+    def poll(self, host, scope=None, pageSize=500, pages=None):
+        '''Syncs the users table of host, from the checkpoint on, and
+        returns the number of rows written. Stops after pages pages if
+        given, otherwise at the end of the table.
+        '''
+        scope = str(scope if scope is not None else host)
+        source = 'table:{}/{}'.format(host, scope)
+        lower, passes = self.checkpoint(source)
+        written = 0
+        count = 0
+        while pages is None or count < pages:
+            result = host.table(USERS, scope, binary=True, lower=lower, limit=pageSize).json
+            rows = result['rows']
+            more = result.get('more') and rows
+            if more:
+                lower = str(result.get('next_key') or binaryPrimaryKey(rows[-1]) + 1)
+            with self.db:
+                written += self._upsert([bytes.fromhex(row) for row in rows])
+                if more:
+                    self._setCheckpoint(source, lower, passes)
+                else:
+                    self._setCheckpoint(source, '', passes + 1)
+            if not more:
+                break
+            count += 1
+        return written
+
+    def follow(self, path):
+        '''Indexes the records of an action log appended since the
+        checkpoint and returns the number of rows written. A record still
+        being written is left for the next call.
+        '''
+        source = 'log:' + os.path.abspath(path)
+        offset, _ = self.checkpoint(source)
+        offset = int(offset or 0)
+        data = action_log.readLog(path)
+        header = action_log.HEADER
+        end = offset
+        while end + header.size <= len(data):
+            size = header.size + sum(header.unpack_from(data, end)[8:])
+            if end + size > len(data):
+                break
+            end += size
+
+        written = 0
+        batch = {}
+        ends = action_log.boundaries(data[offset:end])[1:]
+        for record, recordEnd in zip(action_log.records(data[offset:end]), ends):
+            if record.error is None and record.user_after:
+                batch[record.username] = record.user_after
+            if len(batch) == LOG_BATCH or recordEnd == end - offset:
+                with self.db:
+                    written += self._upsert(list(batch.values()))
+                    self._setCheckpoint(source, offset + recordEnd, 0)
+                batch = {}
+        return written
+
+    def leaderboard(self, limit=10, by='win_count'):
+        '''Returns the top (name, win_count, loss_count) by win_count or
+        loss_count, ties by name.
+        '''
+        if by not in ORDERS:
+            raise ValueError('Order by one of {}'.format(', '.join(ORDERS)))
+        return self.db.execute(
+            'SELECT name, win_count, loss_count FROM users ORDER BY {} DESC, name LIMIT ?'.format(by),
+            (limit,)).fetchall()
+
+    def player(self, name):
+        '''Returns the indexed row of name as a dict, None if unknown.
+        '''
+        cursor = self.db.execute('SELECT name, win_count, loss_count, status, life_player, '
+                                 'life_ai FROM users WHERE name = ?', (name,))
+        row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    def count(self, status=None):
+        if status is None:
+            return self.db.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        return self.db.execute('SELECT COUNT(*) FROM users WHERE status = ?',
+                               (status,)).fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Index the users table into SQLite.')
+    parser.add_argument('-d', '--database', default='users.sqlite')
+    commands = parser.add_subparsers(dest='command')
+    poll = commands.add_parser('poll', help='sync from a node')
+    poll.add_argument('--url', default='http://127.0.0.1:8888')
+    poll.add_argument('--contract', default='host')
+    poll.add_argument('-i', '--interval', type=float,
+                      help='keep polling, every interval seconds')
+    follow = commands.add_parser('follow', help='sync from an action log')
+    follow.add_argument('log')
+    follow.add_argument('-i', '--interval', type=float)
+    top = commands.add_parser('top', help='print the leaderboard')
+    top.add_argument('-n', '--limit', type=int, default=10)
+    top.add_argument('--by', choices=ORDERS, default='win_count')
+    args = parser.parse_args(argv)
+
+    with Indexer(args.database) as indexer:
+        if args.command == 'top':
+            for row in indexer.leaderboard(args.limit, args.by):
+                print('{:<13} {:>8} {:>8}'.format(*row))
+            return
+        host = HttpHost(args.url, args.contract) if args.command == 'poll' else None
+        while True:
+            start = time.time()
+            if host:
+                written = indexer.poll(host)
+            else:
+                written = indexer.follow(args.log)
+            sys.stderr.write('{} rows written in {:.3f}s\n'.format(written, time.time() - start))
+            if not args.interval:
+                return
+            time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
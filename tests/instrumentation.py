@@ -0,0 +1,392 @@
+'''Opt-in timing of the push_action and table calls of a test run.
+
+Set CARDGAME_INSTRUMENT=1, or to the path of the report, and every
+push_action, push_transaction and table call of the session's host account
+is timed into histograms by action or table name:
+
+    wall_us        the whole call, as the test sees it
+    execute_us     the time nodeos spent applying the transaction, the
+                   elapsed of its trace
+    client_us      the rest of wall_us: starting cleos, signing with the
+                   wallet and the HTTP round trip to nodeos
+    payload_bytes  the JSON size of the action data
+    rows           rows returned by a table read
+    response_bytes the JSON size of a table read's response
+
+push_action returns once nodeos has executed the transaction, it does not
+wait for the block holding it, so there is no inclusion phase to time.
+BaseTest also records every test's wall time, and how much of it went to
+push_action and table calls; the rest is the test's own work and sleeps.
+
+When the process exits the summary is printed and the report is written to
+build/instrumentation.json. parallel_runner.py merges the reports of its
+workers. A saved report is printed again with
+
+    python3 tests/instrumentation.py build/instrumentation.json
+'''
+import argparse
+import atexit
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+
+import backend
+
+ENV = 'CARDGAME_INSTRUMENT'
+REPORT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'build',
+                           'instrumentation.json')
+PERCENTILES = (50, 90, 99, 99.9)
+
+_collector = None
+
+
+def enabled():
+    return os.environ.get(ENV, '') not in ('', '0')
+
+
+def reportFile():
+    value = os.environ.get(ENV, '')
+    return REPORT_FILE if value in ('', '0', '1') else value
+
+
+def transactionName(actions):
+    '''Names a transaction by its distinct actions, e.g. login+startgame.
+    '''
+    return '+'.join(sorted({action['name'] for action in actions}))
+
+
+def _jsonSize(value):
+    return len(json.dumps(value, default=str))
+
+
+class Histogram:
+    '''Log-linear histogram in the manner of HdrHistogram. Values below
+    2**SIGNIFICANT_BITS get a bucket each; larger ones share a bucket with
+    the values equal to them in their top SIGNIFICANT_BITS bits. Percentiles
+    are within 1/64 of the recorded value, whatever the range or count.
+    '''
+
+    SIGNIFICANT_BITS = 7
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def lowest(cls, value):
+        '''Lowest value of the bucket holding value.
+        '''
+        shift = value.bit_length() - cls.SIGNIFICANT_BITS
+        return value >> shift << shift if shift > 0 else value
+
+    @classmethod
+    def highest(cls, lowest):
+        shift = lowest.bit_length() - cls.SIGNIFICANT_BITS
+        return lowest + (1 << shift) - 1 if shift > 0 else lowest
+
+    def record(self, value, count=1):
+        value = max(0, int(value))
+        bucket = self.lowest(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p):
+        '''Nearest-rank percentile, p in [0, 100], as the highest value of
+        its bucket.
+        '''
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(p / 100.0 * self.count)))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return max(self.min, min(self.highest(bucket), self.max))
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def toJson(self):
+        summary = {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max
+        }
+        for p in PERCENTILES:
+            summary['p{:g}'.format(p)] = self.percentile(p)
+        summary['buckets'] = [[bucket, count] for bucket, count in sorted(self.counts.items())]
+        return summary
+
+    @classmethod
+    def fromJson(cls, data):
+        histogram = cls()
+        histogram.counts = {bucket: count for bucket, count in data['buckets']}
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+
+class Collector:
+    '''Histograms by kind (push_action, push_transaction, table), name and
+    metric, the failed calls and the time of every test.
+    '''
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.histograms = {}
+        self.failures = {}
+        self.tests = []
+        self._test = None
+
+    def histogram(self, kind, name, metric):
+        return self.histograms.setdefault(kind, {}).setdefault(name, {}).setdefault(
+            metric, Histogram())
+
+    def measure(self, kind, name, call, payload=None):
+        '''Times call(), recording it under kind and name. Returns its result.
+        '''
+        start = time.perf_counter()
+        try:
+            result = call()
+        except Exception:
+            key = '{}/{}'.format(kind, name)
+            self.failures[key] = self.failures.get(key, 0) + 1
+            raise
+        finally:
+            wall = int((time.perf_counter() - start) * 1000000)
+            self.histogram(kind, name, 'wall_us').record(wall)
+            if self._test is not None:
+                self._test[kind + '_us'] = self._test.get(kind + '_us', 0) + wall
+                self._test[kind + 's'] = self._test.get(kind + 's', 0) + 1
+        if payload is not None:
+            self.histogram(kind, name, 'payload_bytes').record(_jsonSize(payload))
+        response = getattr(result, 'json', None)
+        if isinstance(response, dict):
+            if kind == 'table':
+                self.histogram(kind, name, 'rows').record(len(response.get('rows', [])))
+                self.histogram(kind, name, 'response_bytes').record(_jsonSize(response))
+            else:
+                elapsed = response.get('processed', {}).get('elapsed')
+                if elapsed is not None:
+                    self.histogram(kind, name, 'execute_us').record(elapsed)
+                    self.histogram(kind, name, 'client_us').record(max(0, wall - int(elapsed)))
+        return result
+
+    @contextlib.contextmanager
+    def test(self, testId):
+        '''Records the wall time of a test, and its share spent in the
+        measured calls.
+        '''
+        self._test = {'test': testId}
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            test, self._test = self._test, None
+            test['wall_us'] = int((time.perf_counter() - start) * 1000000)
+            self.tests.append(test)
+
+    def __bool__(self):
+        return bool(self.histograms or self.tests)
+
+    def toJson(self):
+        return {
+            'backend': backend.name(),
+            'histograms': {kind: {name: {metric: histogram.toJson()
+                                         for metric, histogram in metrics.items()}
+                                  for name, metrics in names.items()}
+                           for kind, names in self.histograms.items()},
+            'failures': dict(self.failures),
+            'tests': list(self.tests)
+        }
+
+
+def collector():
+    '''The collector of this process, reported when it exits.
+    '''
+    global _collector
+    if _collector is None:
+        _collector = Collector()
+        atexit.register(finish)
+    return _collector
+
+
+def take():
+    '''Returns the report of this process and starts a new one.
+    '''
+    if not _collector:
+        return None
+    report = _collector.toJson()
+    # Instrumented accounts keep their collector, so it is emptied in place
+    _collector.clear()
+    return report
+
+
+def instrument(account, target=None):
+    '''Times the push_action, push_transaction and table calls of account
+    into target, the process collector by default, if instrumentation is
+    enabled. Returns account.
+    '''
+    if not enabled() or account is None or getattr(account, '_instrumented', False):
+        return account
+    if target is None:
+        target = collector()
+
+    pushAction = account.push_action
+    table = account.table
+
+    def push_action(action, data, *args, **kwargs):
+        return target.measure('push_action', action,
+                              lambda: pushAction(action, data, *args, **kwargs), data)
+
+    def tableRead(table_name, scope, *args, **kwargs):
+        return target.measure('table', table_name,
+                              lambda: table(table_name, scope, *args, **kwargs))
+
+    account.push_action = push_action
+    account.table = tableRead
+    if hasattr(account, 'push_transaction'):
+        pushTransaction = account.push_transaction
+
+        def push_transaction(actions, *args, **kwargs):
+            return target.measure('push_transaction', transactionName(actions),
+                                  lambda: pushTransaction(actions, *args, **kwargs), actions)
+
+        account.push_transaction = push_transaction
+    account._instrumented = True
+    return account
+
+
+def test(testId):
+    '''Context timing a test, a no-op unless instrumentation is enabled.
+    '''
+    if not enabled():
+        return contextlib.nullcontext()
+    return collector().test(testId)
+
+
+def merge(reports):
+    '''Merges the reports of several processes.
+    '''
+    merged = Collector()
+    backends = set()
+    for report in reports:
+        if not report:
+            continue
+        backends.add(report['backend'])
+        for kind, names in report['histograms'].items():
+            for name, metrics in names.items():
+                for metric, data in metrics.items():
+                    merged.histogram(kind, name, metric).merge(Histogram.fromJson(data))
+        for key, count in report['failures'].items():
+            merged.failures[key] = merged.failures.get(key, 0) + count
+        merged.tests.extend(report['tests'])
+    report = merged.toJson()
+    report['backend'] = ','.join(sorted(backends)) or report['backend']
+    return report
+
+
+def _ms(us):
+    return '{:10.2f}'.format(us / 1000.0) if us is not None else '{:>10}'.format('-')
+
+
+def summary(report, stream=sys.stderr):
+    '''Prints where the time of a report went.
+    '''
+    rows = []
+    for kind, names in report['histograms'].items():
+        for name, metrics in names.items():
+            rows.append((metrics['wall_us']['total'], kind, name, metrics))
+    rows.sort(key=lambda row: row[0], reverse=True)
+    measured = sum(row[0] for row in rows)
+
+    stream.write('\nInstrumentation ({} backend)\n'.format(report['backend']))
+    stream.write('{:<34}{:>7}{:>10}{:>7}{:>10}{:>10}{:>10}{:>10}{:>9}\n'.format(
+        'call', 'count', 'total s', 'share', 'mean ms', 'p50 ms', 'p99 ms', 'max ms', 'bytes'))
+    for total, kind, name, metrics in rows:
+        wall = metrics['wall_us']
+        size = metrics.get('payload_bytes') or metrics.get('response_bytes')
+        stream.write('{:<34}{:>7}{:>10.3f}{:>6.1f}%{}{}{}{}{:>9}\n'.format(
+            '{} {}'.format(kind, name)[:33], wall['count'], total / 1000000.0,
+            100.0 * total / measured if measured else 0, _ms(wall['mean']),
+            _ms(wall['p50']), _ms(wall['p99']), _ms(wall['max']),
+            int(size['mean']) if size else '-'))
+
+    phases = {}
+    for _, kind, _, metrics in rows:
+        for metric in ('execute_us', 'client_us'):
+            if metric in metrics:
+                phases[metric] = phases.get(metric, 0) + metrics[metric]['total']
+        if kind == 'table':
+            phases['table_us'] = phases.get('table_us', 0) + metrics['wall_us']['total']
+    if phases:
+        stream.write('phases: {}\n'.format(', '.join(
+            '{} {:.3f}s'.format(phase[:-3], us / 1000000.0) for phase, us in sorted(phases.items()))))
+    for key, count in sorted(report['failures'].items()):
+        stream.write('failed: {} x{}\n'.format(key, count))
+
+    tests = sorted(report['tests'], key=lambda test: test['wall_us'], reverse=True)
+    if tests:
+        stream.write('{:<60}{:>10}{:>10}{:>10}{:>10}\n'.format(
+            'slowest tests', 'wall s', 'push s', 'table s', 'other s'))
+        for test in tests[:10]:
+            calls = sum(us for key, us in test.items() if key.endswith('_us') and key != 'wall_us')
+            stream.write('{:<60}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.3f}\n'.format(
+                test['test'][-59:], test['wall_us'] / 1000000.0,
+                (test.get('push_action_us', 0) + test.get('push_transaction_us', 0)) / 1000000.0,
+                test.get('table_us', 0) / 1000000.0, (test['wall_us'] - calls) / 1000000.0))
+
+
+def finish(report=None, path=None, stream=sys.stderr):
+    '''Writes the report, of this process by default, and prints its
+    summary. Returns the path written, or None when nothing was measured.
+    '''
+    if report is None:
+        report = take()
+    if not report or not (report['histograms'] or report['tests']):
+        return None
+    path = path or reportFile()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1)
+    summary(report, stream)
+    stream.write('report: {}\n'.format(path))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print an instrumentation report.')
+    parser.add_argument('reports', nargs='+')
+    args = parser.parse_args()
+    reports = []
+    for path in args.reports:
+        with open(path) as f:
+            reports.append(json.load(f))
+    summary(merge(reports), sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
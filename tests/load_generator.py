@@ -0,0 +1,435 @@
+'''Concurrent load on the cardgame contract.
+
+Every player of the pool runs full games, login, startgame, (playcard,
+nextround)* or, with --playround, playround* and endgame, as its own
+coroutine. All players share a bounded
+number of in-flight transactions. The report gives the sustained
+actions/sec, latency percentiles per action and the failures by reason,
+e.g. "You have already selected a card".
+
+Targets:
+
+    engine          the in-process CardGame, the ceiling of the tool itself
+    node            the local node through eosfactory, one account per player
+    http://host:port  an HTTP server speaking the chain API, with unsigned
+                    transactions (the local stand-in, chain_server.py, not a
+                    real nodeos)
+
+chain_server.py takes its actions from build/cardgame.abi, so --playround
+on it needs the artifacts of a build that has playround.
+
+    python3 tests/chain_server.py -p 8888 &
+    python3 tests/load_generator.py -t http://127.0.0.1:8888 -p 200 -c 50 -d 60
+'''
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import random
+import sys
+import time
+import urllib.parse
+
+import backend
+from cardgame_engine import CardGame, Error, NAME_CHARMAP, ONGOING, name_to_uint64
+from stats import summarize
+
+ACTIONS = ['login', 'startgame', 'playcard', 'nextround', 'playround', 'endgame']
+ASSERT_PREFIX = 'assertion failure with message: '
+NAME_CHARS = NAME_CHARMAP[1:]
+
+
+class TransactionError(Exception):
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def failureReason(message):
+    '''The assert message of a failed action, without the node's wrapping.
+    '''
+    message = message.strip()
+    if ASSERT_PREFIX in message:
+        message = message.split(ASSERT_PREFIX, 1)[1]
+    return message.splitlines()[0] if message else 'unknown error'
+
+
+def playerNames(count, prefix='load'):
+    names = []
+    for number in range(1, count + 1):
+        suffix = ''
+        while number:
+            number, digit = divmod(number, len(NAME_CHARS))
+            suffix = NAME_CHARS[digit] + suffix
+        names.append(prefix + '1' + suffix)
+    return names
+
+
+class EngineTarget:
+    '''Runs the actions on an in-process CardGame.
+    '''
+
+    name = 'engine'
+    contract = 'host'
+
+    def __init__(self, game=None):
+        self.game = game or CardGame()
+
+    async def preparePlayers(self, count):
+        return playerNames(count)
+
+    async def push(self, action, data, actor):
+        try:
+            self.game.apply(action, data, actor)
+        except Error as e:
+            raise TransactionError(e.message)
+
+    async def pushTransaction(self, actions):
+        try:
+            self.game.transaction([(action['name'], action['data'],
+                                    action['authorization'][0]['actor'])
+                                   for action in actions])
+        except Error as e:
+            raise TransactionError(e.message)
+
+    async def getUser(self, name):
+        return self.game.users.get(name)
+
+    async def close(self):
+        pass
+
+
+class NodeTarget:
+    '''Pushes through eosfactory on the shared session's node. eosfactory
+    blocks, so its calls run on a thread pool as wide as the in-flight
+    limit.
+    '''
+
+    name = 'node'
+
+    def __init__(self, workers):
+        import session
+        self.session = session.get()
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.accounts = {}
+
+    async def _call(self, function, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, lambda: function(*args, **kwargs))
+
+    async def preparePlayers(self, count):
+        names = []
+        for _ in range(count):
+            account = await self._call(self.session.createPlayer, 'load')
+            self.accounts[account.name] = account
+            names.append(account.name)
+        return names
+
+    async def push(self, action, data, actor):
+        try:
+            await self._call(self.session.host.push_action, action, data,
+                             permission=(self.accounts[actor], backend.eosf().Permission.ACTIVE),
+                             forceUnique=1)
+        except Exception as e:
+            raise TransactionError(getattr(e, 'message', None) or str(e))
+
+    @property
+    def contract(self):
+        return self.session.host
+
+    async def pushTransaction(self, actions):
+        import batch
+        try:
+            await self._call(batch.pushTransaction, self.session.host, actions)
+        except Exception as e:
+            raise TransactionError(getattr(e, 'message', None) or str(e))
+
+    async def getUser(self, name):
+        user = await self._call(self.session.users.get, name)
+        return user.toJson() if user is not None else None
+
+    async def close(self):
+        self.executor.shutdown()
+
+
+class HttpTarget:
+    '''Speaks the chain API over keep-alive HTTP/1.1 connections. The
+    transactions are pushed unsigned, as a "transaction" with json action
+    data, which chain_server accepts and a real nodeos does not.
+    '''
+
+    name = 'http'
+
+    def __init__(self, url, contract='host'):
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.contract = contract
+        self.idle = []
+
+    async def preparePlayers(self, count):
+        return playerNames(count)
+
+    async def _request(self, path, body):
+        if self.idle:
+            reader, writer = self.idle.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            payload = json.dumps(body).encode()
+            writer.write('POST {} HTTP/1.1\r\nHost: {}:{}\r\nContent-Type: application/json\r\n'
+                         'Content-Length: {}\r\n\r\n'.format(path, self.host, self.port,
+                                                             len(payload)).encode() + payload)
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            keepAlive = True
+            while True:
+                line = (await reader.readline()).strip()
+                if not line:
+                    break
+                header, _, value = line.decode('latin-1').partition(':')
+                header = header.lower()
+                if header == 'content-length':
+                    length = int(value)
+                elif header == 'connection' and value.strip().lower() == 'close':
+                    keepAlive = False
+            response = json.loads((await reader.readexactly(length)).decode()) if length else {}
+        except Exception:
+            writer.close()
+            raise
+        if keepAlive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        return status, response
+
+    async def push(self, action, data, actor):
+        await self.pushTransaction([{
+            'account': self.contract,
+            'name': action,
+            'authorization': [{'actor': actor, 'permission': 'active'}],
+            'data': data
+        }])
+
+    async def pushTransaction(self, actions):
+        status, response = await self._request('/v1/chain/push_transaction', {
+            'signatures': [],
+            'compression': 'none',
+            'transaction': {'actions': actions}
+        })
+        if status != 200:
+            error = response.get('error', {})
+            details = error.get('details') or [{}]
+            raise TransactionError(details[0].get('message') or error.get('what') or
+                                   'HTTP {}'.format(status))
+
+    async def getUser(self, name):
+        key = name_to_uint64(name)
+        status, response = await self._request('/v1/chain/get_table_rows', {
+            'code': self.contract, 'scope': self.contract, 'table': 'users', 'json': True,
+            'lower_bound': str(key), 'upper_bound': str(key + 1), 'limit': 1
+        })
+        rows = response.get('rows', [])
+        return rows[0] if rows and rows[0]['name'] == name else None
+
+    async def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+class LoadGenerator:
+
+    def __init__(self, target, players, maxInFlight, duration=None, games=None, seed=0,
+                 loginBatch=0, playround=False):
+        self.target = target
+        self.players = players
+        self.maxInFlight = maxInFlight
+        self.duration = duration
+        self.games = games
+        self.seed = seed
+        self.loginBatch = loginBatch
+        self.playround = playround
+        self.latencies = {action: [] for action in ACTIONS}
+        self.failures = {action: collections.Counter() for action in ACTIONS}
+        self.completed = collections.Counter()
+        self.gamesPlayed = 0
+        self.reads = 0
+        self.inFlight = 0
+        self.peakInFlight = 0
+
+    async def _push(self, action, player, **data):
+        data['username'] = player
+        async with self.slots:
+            self.inFlight += 1
+            self.peakInFlight = max(self.peakInFlight, self.inFlight)
+            start = time.time()
+            try:
+                await self.target.push(action, data, player)
+            except TransactionError as e:
+                self.failures[action][failureReason(e.message)] += 1
+                raise
+            finally:
+                self.inFlight -= 1
+            end = time.time()
+        self.latencies[action].append((end - start) * 1000)
+        self.completed[int(end - self.start)] += 1
+
+    async def _loginAll(self, names):
+        '''Logs the players in ahead of the run, loginBatch per transaction.
+        '''
+        import batch
+        logins = batch.ActionBatch(self.target.contract, maxActions=self.loginBatch)
+        for name in names:
+            logins.add('login', name)
+        for actions in logins.transactions():
+            await self.target.pushTransaction(actions)
+
+    async def _getUser(self, player):
+        self.reads += 1
+        return await self.target.getUser(player)
+
+    async def _playGame(self, player, rng):
+        await self._push('login', player)
+        await self._push('startgame', player)
+        user = await self._getUser(player)
+        while True:
+            cardIdx = rng.choice([i for i, cardId in enumerate(user['game_data']['hand_player'])
+                                  if cardId])
+            if self.playround:
+                await self._push('playround', player, player_card_idx=cardIdx)
+            else:
+                await self._push('playcard', player, player_card_idx=cardIdx)
+                if (await self._getUser(player))['game_data']['status'] != ONGOING:
+                    break
+                await self._push('nextround', player)
+            # The status and the hand of the next round
+            user = await self._getUser(player)
+            if user['game_data']['status'] != ONGOING:
+                break
+        await self._push('endgame', player)
+        self.gamesPlayed += 1
+
+    def _running(self, gamesPlayed):
+        if self.games is not None and gamesPlayed >= self.games:
+            return False
+        return self.duration is None or time.time() - self.start < self.duration
+
+    async def _player(self, player, rng):
+        gamesPlayed = 0
+        while self._running(gamesPlayed):
+            try:
+                await self._playGame(player, rng)
+            except TransactionError:
+                # Start the next game from a clean state
+                try:
+                    await self._push('endgame', player)
+                except TransactionError:
+                    pass
+            gamesPlayed += 1
+
+    async def run(self):
+        self.slots = asyncio.Semaphore(self.maxInFlight)
+        names = await self.target.preparePlayers(self.players)
+        if self.loginBatch:
+            await self._loginAll(names)
+        self.start = time.time()
+        try:
+            await asyncio.gather(*[self._player(name, random.Random('{}:{}'.format(self.seed, name)))
+                                   for name in names])
+        finally:
+            await self.target.close()
+        return self.report(time.time() - self.start)
+
+    def report(self, elapsed):
+        actions = sum(self.completed.values())
+        # Whole seconds only, without the ramp up and the tail
+        seconds = [self.completed[second] for second in range(1, int(elapsed))]
+        return {
+            'target': self.target.name,
+            'players': self.players,
+            'max_in_flight': self.maxInFlight,
+            'peak_in_flight': self.peakInFlight,
+            'elapsed': elapsed,
+            'games': self.gamesPlayed,
+            'actions': actions,
+            'reads': self.reads,
+            'round_trips_per_game': (actions + self.reads) / self.gamesPlayed
+            if self.gamesPlayed else None,
+            'actions_per_sec': actions / elapsed if elapsed else 0,
+            'sustained_actions_per_sec': sorted(seconds)[len(seconds) // 2] if seconds else None,
+            'latency_ms': {action: summarize(values) for action, values in self.latencies.items()},
+            'failures': {action: dict(reasons) for action, reasons in self.failures.items()
+                         if reasons}
+        }
+
+
+def makeTarget(spec, maxInFlight):
+    if spec == 'engine':
+        return EngineTarget()
+    if spec == 'node':
+        return NodeTarget(maxInFlight)
+    if spec.startswith('http://'):
+        return HttpTarget(spec)
+    raise ValueError('Unknown target {}'.format(spec))
+
+
+def run(target, players, maxInFlight, duration=None, games=None, seed=0, loginBatch=0,
+        playround=False):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(LoadGenerator(
+            target, players, maxInFlight, duration, games, seed, loginBatch, playround).run())
+    finally:
+        loop.close()
+
+
+def printReport(report, stream=sys.stdout):
+    stream.write('{} players, {} in flight on {}: {} games, {} actions in {:.1f}s\n'.format(
+        report['players'], report['max_in_flight'], report['target'], report['games'],
+        report['actions'], report['elapsed']))
+    stream.write('{:.1f} actions/s, sustained {}\n'.format(
+        report['actions_per_sec'], report['sustained_actions_per_sec']))
+    if report['round_trips_per_game'] is not None:
+        stream.write('{:.1f} round trips per game, {} table reads\n'.format(
+            report['round_trips_per_game'], report['reads']))
+    for action, summary in report['latency_ms'].items():
+        if summary['count']:
+            stream.write('{:<10} p50 {:>8.2f} ms p95 {:>8.2f} ms p99 {:>8.2f} ms (n={})\n'.format(
+                action, summary['p50'], summary['p95'], summary['p99'], summary['count']))
+    for action, reasons in report['failures'].items():
+        for reason, count in sorted(reasons.items(), key=lambda item: -item[1]):
+            stream.write('{:<10} failed {:>6}x: {}\n'.format(action, count, reason))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive concurrent cardgame players.')
+    parser.add_argument('-t', '--target', default='engine',
+                        help='engine, node or http://host:port')
+    parser.add_argument('-p', '--players', type=int, default=100)
+    parser.add_argument('-c', '--in-flight', type=int, default=20,
+                        help='maximum concurrent transactions')
+    parser.add_argument('-d', '--duration', type=float, default=30,
+                        help='seconds to run')
+    parser.add_argument('-g', '--games', type=int,
+                        help='games per player, instead of a duration')
+    parser.add_argument('--login-batch', type=int, default=0,
+                        help='log the players in beforehand, this many per transaction')
+    parser.add_argument('--playround', action='store_true',
+                        help='play each round with one playround instead of playcard and nextround')
+    parser.add_argument('-o', '--output', help='write the report as json')
+    args = parser.parse_args()
+
+    report = run(makeTarget(args.target, args.in_flight), args.players, args.in_flight,
+                 None if args.games else args.duration, args.games,
+                 loginBatch=args.login_batch, playround=args.playround)
+    printReport(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+'''Win probability of every startgame opening, in a memory-mapped table.
+
+startgame deals 4 of the 17 cards of each deck to each side, so there are
+C(17, 4) = 2380 hands per side. A hand is ranked by its cards in
+colexicographic order, and the table is a 2380 x 2380 float32 .npy file
+indexed by (rank of hand_player, rank of hand_ai): 22 MB. OpeningTable maps
+it read-only, so a lookup reads one value, not the file.
+
+A value is the chance the player wins from that opening with the
+Simulator's player policy (random by default) against the contract AI,
+random() modeled as uniform. The AI breaks ties by slot, so the order of
+its hand matters a little; startgame deals every order of a hand with equal
+chance, and the value is the average over them. Openings whose hands hold
+the same card classes (see solver.card_classes) play the same, so only the
+615 x 615 distinct class pairs are simulated, GAMES games each, on a
+process pool.
+
+    python3 tests/openings.py build [-n GAMES] [-j WORKERS]
+    python3 tests/openings.py lookup 1,5,9,16 2,3,4,17
+'''
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+import build_cache
+from cardgame_engine import CARD_DICT, FULL_DECK, HAND_SIZE, PLAYER_WON
+from simulator import Simulator
+from solver import card_classes
+
+OPENINGS_FILE = os.path.join(build_cache.WORKSPACE, 'build', 'openings.npy')
+GAMES = 64
+# BINOMIAL[n][k] = C(n, k)
+BINOMIAL = [[math.comb(n, k) for k in range(HAND_SIZE + 1)] for n in range(len(FULL_DECK) + 1)]
+HANDS = sorted(itertools.combinations(FULL_DECK, HAND_SIZE), key=lambda hand: hand[::-1])
+
+
+def rank(hand):
+    '''Colexicographic rank of a hand's card set, in [0, 2380).
+    '''
+    cards = sorted(card for card in hand if card)
+    if len(cards) != HAND_SIZE or len(set(cards)) != HAND_SIZE or \
+            not 0 < cards[0] <= cards[-1] <= len(FULL_DECK):
+        raise ValueError('Not an opening hand: {}'.format(list(hand)))
+    return sum(BINOMIAL[card - 1][i + 1] for i, card in enumerate(cards))
+
+
+class OpeningTable:
+    '''Read-only view of a built table.
+    '''
+
+    def __init__(self, path=OPENINGS_FILE):
+        self.path = path
+        self.table = np.load(path, mmap_mode='r')
+        if self.table.shape != (len(HANDS), len(HANDS)):
+            raise ValueError('{} is not an opening table'.format(path))
+        with open(path + '.json') as f:
+            self.meta = json.load(f)
+
+    def equity(self, hand_player, hand_ai):
+        return float(self.table[rank(hand_player), rank(hand_ai)])
+
+    def game_equity(self, game_data):
+        return self.equity(game_data['hand_player'], game_data['hand_ai'])
+
+
+def classSignatures(card_dict=CARD_DICT):
+    '''Returns, for every hand rank, the index of its class multiset, and a
+    hand of each class multiset.
+    '''
+    class_of, _ = card_classes(card_dict)
+    index = {}
+    signatures = np.zeros(len(HANDS), dtype=np.int32)
+    representatives = []
+    for handRank, hand in enumerate(HANDS):
+        signature = tuple(sorted(class_of[card] for card in hand))
+        if signature not in index:
+            index[signature] = len(representatives)
+            representatives.append(hand)
+        signatures[handRank] = index[signature]
+    return signatures, representatives
+
+
+_simulators = {}
+
+
+def _simulateRow(args):
+    '''Win rates of one player hand against every AI hand.
+    '''
+    row, playerHand, aiHands, games, policy, seed = args
+    rng = np.random.default_rng([seed, row])
+    numGames = len(aiHands) * games
+    handPlayer = np.tile(np.array(playerHand, dtype=np.uint8), (numGames, 1))
+    # Every order of the AI hand, with equal chance
+    handAi = np.repeat(np.array(aiHands, dtype=np.uint8), games, axis=0)
+    handAi = np.take_along_axis(handAi, np.argsort(rng.random(handAi.shape), axis=1), axis=1)
+    # Built once per worker, its score tables take longer than a row
+    simulator = _simulators.get(policy)
+    if simulator is None:
+        simulator = _simulators[policy] = Simulator(random_mode='uniform', player_policy=policy)
+    simulator.rng = rng
+    result = simulator.play(numGames, hands=(handPlayer, handAi))
+    wins = (result.status == PLAYER_WON).reshape(len(aiHands), games)
+    return row, wins.mean(axis=1).astype(np.float32)
+
+
+def build(path=OPENINGS_FILE, games=GAMES, policy='random', seed=0, workers=None):
+    '''Simulates every distinct opening and writes the table to path.
+    '''
+    signatures, representatives = classSignatures()
+    tasks = [(row, hand, representatives, games, policy, seed)
+             for row, hand in enumerate(representatives)]
+    byClass = np.zeros((len(representatives), len(representatives)), dtype=np.float32)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with context.Pool(workers or os.cpu_count() or 1) as pool:
+        for row, rates in pool.imap_unordered(_simulateRow, tasks):
+            byClass[row] = rates
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    building = path + '.tmp.npy'
+    table = np.lib.format.open_memmap(building, mode='w+', dtype=np.float32,
+                                      shape=(len(HANDS), len(HANDS)))
+    for row in range(len(HANDS)):
+        table[row] = byClass[signatures[row]][signatures]
+    table.flush()
+    del table
+    with open(path + '.json', 'w') as f:
+        json.dump({'games': games, 'policy': policy, 'seed': seed,
+                   'classes': len(representatives),
+                   'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime())}, f, indent=2)
+    os.replace(building, path)
+    return path
+
+
+def _hand(text):
+    return [int(card) for card in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the opening table.')
+    commands = parser.add_subparsers(dest='command')
+    builder = commands.add_parser('build')
+    builder.add_argument('-n', '--games', type=int, default=GAMES,
+                         help='games per distinct opening')
+    builder.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1)
+    builder.add_argument('--policy', choices=['random', 'first'], default='random')
+    builder.add_argument('--seed', type=int, default=0)
+    builder.add_argument('-o', '--output', default=OPENINGS_FILE)
+    lookup = commands.add_parser('lookup')
+    lookup.add_argument('hand_player', type=_hand)
+    lookup.add_argument('hand_ai', type=_hand)
+    lookup.add_argument('-t', '--table', default=OPENINGS_FILE)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.time()
+        build(args.output, args.games, args.policy, args.seed, args.workers)
+        print('Built {} in {:.1f}s'.format(args.output, time.time() - start))
+    elif args.command == 'lookup':
+        print('{:.4f}'.format(OpeningTable(args.table).equity(args.hand_player, args.hand_ai)))
+    else:
+        parser.print_help()
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(not main())
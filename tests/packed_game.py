@@ -0,0 +1,281 @@
+'''The packed layout of the users table, the PACKED_GAME build.
+
+Built with PACKED_GAME defined (build_cache.build(contract,
+defines=['PACKED_GAME'])), the contract stores a packed_game in user_info:
+the decks as uint32 bitmasks, bit card_id - 1 set for each card left, and
+the hands as uint32 with one card id per byte, slot 0 in the low byte. A
+deck only ever loses cards and stays in card id order, so the k-th set bit
+is deck[k] and the draws are the same. The actions unpack it, so their
+interface does not change.
+
+packGame and unpackGame convert between the two json forms, and
+tables.Game unpacks packed rows on read. packedAbi derives the packed ABI
+from the contract's, for the report; checkAbi compares it with the one
+abigen generates for the PACKED_GAME build. --node builds the contract on
+a local node, checks its ABI, plays games and reports the RAM a users row
+takes per player:
+
+    python3 tests/packed_game.py -n 10000   # bytes per user, game vs packed_game
+    python3 tests/packed_game.py --abi build/cardgame.abi
+    python3 tests/packed_game.py --node --build default
+    python3 tests/packed_game.py --node --build packed
+'''
+import argparse
+import copy
+import json
+import random
+import sys
+
+import abi_codec
+from cardgame_engine import HAND_SIZE, ONGOING, CardGame, uint64_to_name
+
+FULL_DECK_MASK = 0x1FFFF
+# Billable bytes of a multi_index row on top of its data
+ROW_OVERHEAD = 112
+
+PACKED_FIELDS = [
+    ('status', 'int8'),
+    ('life_player', 'int8'),
+    ('life_ai', 'int8'),
+    ('deck_player', 'uint32'),
+    ('deck_ai', 'uint32'),
+    ('hand_player', 'uint32'),
+    ('hand_ai', 'uint32'),
+    ('selected_card_player', 'card_id'),
+    ('selected_card_ai', 'card_id'),
+    ('life_lost_player', 'uint8'),
+    ('life_lost_ai', 'uint8')
+]
+
+
+def packDeck(deck):
+    mask = 0
+    for cardId in deck:
+        mask |= 1 << (cardId - 1)
+    return mask
+
+
+def unpackDeck(mask):
+    return [i + 1 for i in range(32) if mask >> i & 1]
+
+
+def packHand(hand):
+    packed = 0
+    for i, cardId in enumerate(hand):
+        packed |= cardId << (8 * i)
+    return packed
+
+
+def unpackHand(packed):
+    return [packed >> (8 * i) & 0xFF for i in range(HAND_SIZE)]
+
+
+def packGame(game_data):
+    '''Returns the packed_game json of a game json.
+    '''
+    packed = dict(game_data)
+    for field in ('deck_player', 'deck_ai'):
+        packed[field] = packDeck(game_data[field])
+    for field in ('hand_player', 'hand_ai'):
+        packed[field] = packHand(game_data[field])
+    return packed
+
+
+def unpackGame(packed):
+    '''Returns the game json of a packed_game json.
+    '''
+    game_data = dict(packed)
+    for field in ('deck_player', 'deck_ai'):
+        game_data[field] = unpackDeck(int(packed[field]))
+    for field in ('hand_player', 'hand_ai'):
+        game_data[field] = unpackHand(int(packed[field]))
+    return game_data
+
+
+def isPacked(game_data):
+    return not hasattr(game_data['deck_player'], '__len__')
+
+
+def packedAbi(abi=None):
+    '''Returns the abi json with packed_game in place of game, derived by
+    hand from the abi json of the contract.
+    '''
+    if abi is None:
+        abi = abi_codec.abi().abi
+    abi = copy.deepcopy(abi)
+    structs = [struct for struct in abi['structs'] if struct['name'] != 'game']
+    structs.insert(0, {'name': 'packed_game', 'base': '', 'fields': [
+        {'name': name, 'type': typeName} for name, typeName in PACKED_FIELDS]})
+    for struct in structs:
+        for field in struct['fields']:
+            if field['type'] == 'game':
+                field['type'] = 'packed_game'
+    abi['structs'] = structs
+    return abi
+
+
+def layout(codec, typeName):
+    '''The serialized layout of typeName in an abi_codec.Abi: a builtin
+    type name, or the (field, layout) pairs of a struct.
+    '''
+    typeName = codec.resolve(typeName)
+    if typeName.endswith('[]') or typeName not in codec.structs:
+        return typeName
+    return [(name, layout(codec, fieldType)) for name, fieldType in codec.fields(typeName)]
+
+
+def checkAbi(generated, expected=None):
+    '''Compares the abi json abigen generated for the PACKED_GAME build
+    with packedAbi. Returns the tables and actions that serialize
+    differently, empty when none does.
+    '''
+    generated, expected = abi_codec.Abi(generated), abi_codec.Abi(expected or packedAbi())
+    differences = []
+    for table, typeName in sorted(expected.tables.items()):
+        if table not in generated.tables:
+            differences.append('table {} missing'.format(table))
+        elif layout(generated, generated.tables[table]) != layout(expected, typeName):
+            differences.append('table {}: {} != {}'.format(
+                table, layout(generated, generated.tables[table]), layout(expected, typeName)))
+    actions = {action['name']: action['type'] for action in generated.abi['actions']}
+    for action in expected.abi['actions']:
+        if action['name'] not in actions:
+            differences.append('action {} missing'.format(action['name']))
+        elif layout(generated, actions[action['name']]) != layout(expected, action['type']):
+            differences.append('action {} differs'.format(action['name']))
+    return differences
+
+
+def nodeReport(packed=True, games=5):
+    '''Builds the contract, with PACKED_GAME when packed, and deploys it on
+    the shared local node. Plays games games, each with a new player, and
+    returns the RAM each player's users row took once the game started.
+    With packed, also the differences of abigen's ABI from packedAbi of the
+    default build's ABI, which build/cardgame.abi must hold beforehand.
+    '''
+    import backend
+    import session
+    from bench_actions import ramUsage
+
+    default = abi_codec.Abi.load().abi
+    if packed and 'game' not in {struct['name'] for struct in default['structs']}:
+        raise ValueError('{} is not the ABI of a default build'.format(abi_codec.ABI_FILE))
+    shared = session.get(['PACKED_GAME'] if packed else [])
+    permission = backend.eosf().Permission.ACTIVE
+    ram = []
+    decks = []
+    for _ in range(games):
+        player = shared.createPlayer('packed')
+        before = ramUsage(player)
+        for action in ('login', 'startgame'):
+            shared.host.push_action(action, {'username': player}, permission=(player, permission))
+        ram.append(ramUsage(player) - before)
+        game_data = shared.users.get(player.name).game_data
+        decks.append(len(game_data.deck_player))
+        while game_data.status == ONGOING:
+            cardIdx = next(i for i, cardId in enumerate(game_data.hand_player) if cardId)
+            shared.host.push_action('playround', {'username': player, 'player_card_idx': cardIdx},
+                                    permission=(player, permission))
+            game_data = shared.users.get(player.name).game_data
+        shared.host.push_action('endgame', {'username': player}, permission=(player, permission))
+    result = {'build': 'packed' if packed else 'default', 'games': games,
+              'ram_bytes_per_user': sum(ram) / len(ram),
+              # Cards left in the player's deck after startgame, read back
+              'deck_player': sorted(set(decks))}
+    if packed:
+        result['abi_differences'] = checkAbi(abi_codec.Abi.load().abi, packedAbi(default))
+    return result
+
+
+def simulateUsers(count, seed=0):
+    '''Plays count users on the engine to where real accounts would be:
+    a few finished games, each reset by endgame or not, and maybe one in
+    progress. Returns the users rows.
+    '''
+    rng = random.Random(seed)
+    now = [1541212952]
+
+    def clock():
+        now[0] += rng.randint(1, 5)
+        return now[0]
+
+    game = CardGame(clock)
+    for i in range(count):
+        name = uint64_to_name((i + 1) << 20)
+        game.login(name)
+        for played in range(rng.randint(0, 3)):
+            game.startgame(name)
+            # The last game is left anywhere from its first round to its end
+            rounds = rng.randint(1, 9) if played == 2 else 17
+            for _ in range(rounds):
+                game_data = game.users[name]['game_data']
+                if game_data['status'] != ONGOING:
+                    break
+                hand = game_data['hand_player']
+                game.playround(name, rng.choice([idx for idx, cardId in enumerate(hand) if cardId]))
+            if game.users[name]['game_data']['status'] != ONGOING and rng.random() < 0.5:
+                game.endgame(name)
+    return list(game.users.values())
+
+
+def _summary(sizes):
+    return {
+        'mean': round(sum(sizes) / len(sizes), 2),
+        'min': min(sizes),
+        'max': max(sizes),
+        'total': sum(sizes),
+        'billed': sum(sizes) + ROW_OVERHEAD * len(sizes)
+    }
+
+
+def report(users):
+    '''Returns the serialized bytes per user_info row of users, as the
+    contract stores them and in the packed layout.
+    '''
+    codec = abi_codec.abi()
+    packed = abi_codec.Abi(packedAbi(codec.abi))
+    before = [len(codec.encode('user_info', user)) for user in users]
+    after = [len(packed.encode('user_info', dict(user, game_data=packGame(user['game_data']))))
+             for user in users]
+    return {
+        'users': len(users),
+        'game': _summary(before),
+        'packed_game': _summary(after),
+        'saved': round(1 - sum(after) / sum(before), 4),
+        'saved_billed': round(1 - (sum(after) + ROW_OVERHEAD * len(users)) /
+                              (sum(before) + ROW_OVERHEAD * len(users)), 4)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--users', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--abi', help='writes the packed ABI to this path')
+    parser.add_argument('--node', action='store_true',
+                        help='build and deploy the contract on a local node and play -g games')
+    parser.add_argument('--build', choices=('packed', 'default'), default='packed')
+    parser.add_argument('-g', '--games', type=int, default=5)
+    parser.add_argument('-o', '--output', help='also writes the --node report to this path')
+    args = parser.parse_args(argv)
+    if args.node:
+        result = nodeReport(args.build == 'packed', args.games)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=2)
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return result
+    if args.abi:
+        abi = packedAbi()
+        with open(args.abi, 'w') as f:
+            json.dump(abi, f, indent=4)
+        return abi
+    result = report(simulateUsers(args.users, args.seed))
+    json.dump(result, sys.stdout, indent=2)
+    print()
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+'''Runs the contract test classes on a pool of worker processes.
+
+Each worker gets its own local node: data and config directories, HTTP and
+P2P ports and wallet, passed to eosfactory through its configuration
+environment variables before anything imports it. The test classes are
+sharded round robin across the workers, each worker runs its shard in one
+session (see session.py), and the results are merged into one report, as
+are the workers' instrumentation reports (see instrumentation.py).
+
+    python3 tests/parallel_runner.py [-j WORKERS] [module ...]
+'''
+import argparse
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import instrumentation
+import run_tests
+
+HTTP_PORT_BASE = 8900
+P2P_PORT_BASE = 9900
+WALLET_PORT_BASE = 8950
+
+
+def nodeEnvironment(worker, rootDir):
+    '''Returns the eosfactory settings giving a worker its own node.
+    '''
+    workerDir = os.path.join(rootDir, 'worker{}'.format(worker))
+    return {
+        'LOCAL_NODE_ADDRESS': '127.0.0.1:{}'.format(HTTP_PORT_BASE + worker),
+        'WALLET_MANAGER_ADDRESS': '127.0.0.1:{}'.format(WALLET_PORT_BASE + worker),
+        'LOCAL_NODE_P2P_ADDRESS': '127.0.0.1:{}'.format(P2P_PORT_BASE + worker),
+        'LOCAL_NODE_DATA_DIR': os.path.join(workerDir, 'data'),
+        'LOCAL_NODE_CONFIG_DIR': os.path.join(workerDir, 'config'),
+        'WALLET_DIR': os.path.join(workerDir, 'wallet')
+    }
+
+
+def writeNodeConfig(environment):
+    '''Writes a config.ini pinning the worker's node to its own ports, so
+    parallel nodes never bind the default 8888/9876.
+    '''
+    configDir = environment['LOCAL_NODE_CONFIG_DIR']
+    for key in ('LOCAL_NODE_DATA_DIR', 'LOCAL_NODE_CONFIG_DIR', 'WALLET_DIR'):
+        os.makedirs(environment[key], exist_ok=True)
+    with open(os.path.join(configDir, 'config.ini'), 'w') as f:
+        f.write('http-server-address = {}\n'.format(
+            environment['LOCAL_NODE_ADDRESS']))
+        f.write('p2p-listen-endpoint = {}\n'.format(
+            environment['LOCAL_NODE_P2P_ADDRESS']))
+
+
+def shard(names, workers):
+    return [names[i::workers] for i in range(workers) if names[i::workers]]
+
+
+def runShard(args):
+    worker, names, rootDir = args
+    environment = nodeEnvironment(worker, rootDir)
+    writeNodeConfig(environment)
+    os.environ.update(environment)
+    # Imported only now, so eosfactory reads this worker's settings
+    import session
+
+    stream = io.StringIO()
+    start = time.time()
+    try:
+        result = unittest.TextTestRunner(stream=stream, verbosity=2).run(
+            unittest.defaultTestLoader.loadTestsFromNames(names))
+    finally:
+        session.close()
+    return {
+        'worker': worker,
+        'names': names,
+        'seconds': time.time() - start,
+        'tests_run': result.testsRun,
+        'failures': [(str(test), trace) for test, trace in result.failures],
+        'errors': [(str(test), trace) for test, trace in result.errors],
+        'skipped': [(str(test), reason) for test, reason in result.skipped],
+        'instrumentation': instrumentation.take()
+    }
+
+
+def run(names, workers):
+    shards = shard(names, workers)
+    rootDir = tempfile.mkdtemp(prefix='cardgame-nodes-')
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Pool(len(shards)) as pool:
+            return pool.map(runShard, [(worker, names, rootDir)
+                                       for worker, names in enumerate(shards)])
+    finally:
+        shutil.rmtree(rootDir, ignore_errors=True)
+
+
+def report(results, elapsed, stream=sys.stderr):
+    testsRun = sum(result['tests_run'] for result in results)
+    failures = [failure for result in results for failure in result['failures']]
+    errors = [error for result in results for error in result['errors']]
+    skipped = sum(len(result['skipped']) for result in results)
+
+    for result in results:
+        stream.write('worker {} ({:.1f}s): {}\n'.format(
+            result['worker'], result['seconds'], ', '.join(result['names'])))
+    for kind, problems in (('FAIL', failures), ('ERROR', errors)):
+        for test, trace in problems:
+            stream.write('=' * 70 + '\n{}: {}\n'.format(kind, test) +
+                         '-' * 70 + '\n{}\n'.format(trace))
+    stream.write('-' * 70 + '\nRan {} tests on {} workers in {:.3f}s\n\n'.format(
+        testsRun, len(results), elapsed))
+    if failures or errors:
+        stream.write('FAILED (failures={}, errors={})\n'.format(
+            len(failures), len(errors)))
+    else:
+        stream.write('OK{}\n'.format(
+            ' (skipped={})'.format(skipped) if skipped else ''))
+    return not failures and not errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the contract tests with one local node per worker.')
+    parser.add_argument('modules', nargs='*', default=run_tests.MODULES)
+    parser.add_argument('-j', '--workers', type=int,
+                        default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    start = time.time()
+    results = run(['{}.Test'.format(module)
+                   for module in args.modules], args.workers)
+    instrumentation.finish(instrumentation.merge(
+        result['instrumentation'] for result in results))
+    return report(results, time.time() - start)
+
+
+if __name__ == '__main__':
+    sys.exit(not main())
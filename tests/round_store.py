@@ -0,0 +1,378 @@
+'''Append-only columnar store of per-round game records.
+
+A round is one playcard: the cards both sides selected, the life they lost,
+their life after the round, the AI strategy and the game status after it.
+The store is a directory holding one raw file per column of ROUND_DTYPE
+and a meta.json with the number of committed rows. Rows are buffered in a
+NumPy structured array and written column by column CHUNK_ROWS at a time;
+meta.json is replaced after the columns are written, so a writer killed
+mid-chunk leaves the store at its last committed row.
+
+Columns are read through np.memmap and queries run chunk by chunk, reading
+only the columns they filter or aggregate on, so they scan stores far
+larger than memory:
+
+    store = RoundStore('build/rounds')
+    store.where(strategy=1, status=ONGOING, round=range(1, 5)).mean('life_lost_ai')
+
+The Simulator records into a store with play(..., store=...), and
+fromActionLog converts a recorded action log.
+
+    python3 tests/round_store.py simulate build/rounds -n 1000000
+    python3 tests/round_store.py query build/rounds --strategy 1 --mean life_lost_ai
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import abi_codec
+from action_log import NO_SEED, readLog, records
+from cardgame_engine import CardGame, EMPTY, FULL_DECK, SEED_PRIME, num_strategies
+
+ROUND_DTYPE = np.dtype([
+    ('game', '<u4'),
+    ('round', 'u1'),
+    ('strategy', 'i1'),
+    ('selected_card_player', 'u1'),
+    ('selected_card_ai', 'u1'),
+    ('life_lost_player', 'i1'),
+    ('life_lost_ai', 'i1'),
+    ('life_player', 'i1'),
+    ('life_ai', 'i1'),
+    ('status', 'i1')
+])
+# Strategy of a round whose AI strategy is not known
+NO_STRATEGY = -1
+CHUNK_ROWS = 1 << 20
+META_FILE = 'meta.json'
+VERSION = 1
+
+
+class RoundStore:
+    '''A round store directory. ``mode`` 'r' opens it read-only, 'a'
+    creates it if needed and appends. Appended rows are visible to
+    queries once flushed.
+    '''
+
+    def __init__(self, path, mode='r', chunkRows=CHUNK_ROWS):
+        if mode not in ('r', 'a'):
+            raise ValueError('Invalid mode: {}'.format(mode))
+        self.path = path
+        self.mode = mode
+        self.chunkRows = chunkRows
+        self.dtype = ROUND_DTYPE
+        self.files = {}
+        metaFile = os.path.join(path, META_FILE)
+        if os.path.exists(metaFile):
+            with open(metaFile) as f:
+                meta = json.load(f)
+            if meta['version'] != VERSION or np.dtype(
+                    [tuple(field) for field in meta['dtype']]) != ROUND_DTYPE:
+                raise ValueError('{} is not a version {} round store'.format(path, VERSION))
+            self.rows = meta['rows']
+            self.games = meta['games']
+        elif mode == 'a':
+            os.makedirs(path, exist_ok=True)
+            self.rows = 0
+            self.games = 0
+            self._commit()
+        else:
+            raise IOError('No round store at {}'.format(path))
+
+        self.buffer = None
+        self.buffered = 0
+        if mode == 'a':
+            self.buffer = np.zeros(chunkRows, dtype=ROUND_DTYPE)
+            for name in ROUND_DTYPE.names:
+                f = open(self._columnFile(name), 'ab')
+                # Drops a chunk written after the last commit
+                f.truncate(self.rows * ROUND_DTYPE[name].itemsize)
+                self.files[name] = f
+
+    def _columnFile(self, name):
+        return os.path.join(self.path, name + '.bin')
+
+    def _commit(self):
+        metaFile = os.path.join(self.path, META_FILE)
+        with open(metaFile + '.tmp', 'w') as f:
+            json.dump({'version': VERSION, 'dtype': ROUND_DTYPE.descr,
+                       'rows': self.rows, 'games': self.games}, f)
+        os.replace(metaFile + '.tmp', metaFile)
+
+    def append(self, rows):
+        '''Appends rows, a structured array or a dict of column arrays.
+        Missing columns are zero, strategy NO_STRATEGY.
+        '''
+        if self.mode != 'a':
+            raise IOError('{} is open read-only'.format(self.path))
+        if isinstance(rows, dict):
+            columns = rows
+            count = len(next(iter(columns.values()))) if columns else 0
+        else:
+            columns = {name: rows[name] for name in rows.dtype.names}
+            count = len(rows)
+        unknown = set(columns) - set(ROUND_DTYPE.names)
+        if unknown:
+            raise ValueError('Unknown columns: {}'.format(', '.join(sorted(unknown))))
+
+        done = 0
+        while done < count:
+            size = min(count - done, self.chunkRows - self.buffered)
+            target = self.buffer[self.buffered:self.buffered + size]
+            for name in ROUND_DTYPE.names:
+                if name in columns:
+                    target[name] = columns[name][done:done + size]
+                else:
+                    target[name] = NO_STRATEGY if name == 'strategy' else 0
+            self.buffered += size
+            done += size
+            if self.buffered == self.chunkRows:
+                self.flush()
+
+    def flush(self):
+        '''Writes the buffered rows and commits them.
+        '''
+        if self.mode != 'a':
+            return
+        if self.buffered:
+            for name, f in self.files.items():
+                f.write(self.buffer[name][:self.buffered].tobytes())
+                f.flush()
+            self.rows += self.buffered
+            self.buffered = 0
+        self._commit()
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        '''The committed rows of a column, memory mapped.
+        '''
+        if name not in ROUND_DTYPE.names:
+            raise ValueError('Unknown column: {}'.format(name))
+        if not self.rows:
+            return np.zeros(0, dtype=ROUND_DTYPE[name])
+        return np.memmap(self._columnFile(name), dtype=ROUND_DTYPE[name], mode='r',
+                         shape=(self.rows,))
+
+    def where(self, **filters):
+        return Query(self, filters)
+
+    def query(self):
+        return Query(self, {})
+
+
+class Query:
+    '''Rows of a store matching filters on its columns. A filter value is
+    a number, a range or a collection of values.
+    '''
+
+    def __init__(self, store, filters):
+        for name in filters:
+            if name not in ROUND_DTYPE.names:
+                raise ValueError('Unknown column: {}'.format(name))
+        self.store = store
+        self.filters = filters
+
+    def where(self, **filters):
+        merged = dict(self.filters)
+        merged.update(filters)
+        return Query(self.store, merged)
+
+    def _mask(self, columns, start, end):
+        mask = np.ones(end - start, dtype=bool)
+        for name, value in self.filters.items():
+            data = columns[name][start:end]
+            if isinstance(value, range) and value.step == 1:
+                mask &= (data >= value.start) & (data < value.stop)
+            elif isinstance(value, (int, np.integer)):
+                mask &= data == value
+            else:
+                mask &= np.isin(data, list(value))
+        return mask
+
+    def chunks(self, *names):
+        '''Yields the matching rows, chunk by chunk, as structured arrays
+        of the named columns, all of them by default.
+        '''
+        names = names or ROUND_DTYPE.names
+        columns = {name: self.store.column(name) for name in set(names) | set(self.filters)}
+        dtype = np.dtype([(name, ROUND_DTYPE[name]) for name in names])
+        step = self.store.chunkRows
+        for start in range(0, len(self.store), step):
+            end = min(start + step, len(self.store))
+            mask = self._mask(columns, start, end)
+            chunk = np.empty(int(mask.sum()), dtype=dtype)
+            for name in names:
+                chunk[name] = columns[name][start:end][mask]
+            yield chunk
+
+    def select(self, *names):
+        '''The matching rows, loaded into memory.
+        '''
+        names = names or ROUND_DTYPE.names
+        chunks = list(self.chunks(*names))
+        if not chunks:
+            return np.zeros(0, dtype=[(name, ROUND_DTYPE[name]) for name in names])
+        return np.concatenate(chunks)
+
+    def count(self):
+        if not self.filters:
+            return len(self.store)
+        columns = {name: self.store.column(name) for name in self.filters}
+        step = self.store.chunkRows
+        return sum(int(self._mask(columns, start, min(start + step, len(self.store))).sum())
+                   for start in range(0, len(self.store), step))
+
+    def sum(self, name):
+        return sum(int(chunk[name].sum(dtype=np.int64)) for chunk in self.chunks(name))
+
+    def mean(self, name):
+        total = 0
+        count = 0
+        for chunk in self.chunks(name):
+            total += int(chunk[name].sum(dtype=np.int64))
+            count += len(chunk)
+        return total / count if count else None
+
+    def counts(self, name):
+        '''Number of matching rows per value of a column.
+        '''
+        totals = {}
+        for chunk in self.chunks(name):
+            values, counts = np.unique(chunk[name], return_counts=True)
+            for value, count in zip(values.tolist(), counts.tolist()):
+                totals[value] = totals.get(value, 0) + count
+        return dict(sorted(totals.items()))
+
+
+def _strategy(seedBefore, blockTime, lifeAi):
+    '''The strategy the AI drew in a playcard, the first random() call.
+    '''
+    seed = 1 if seedBefore == NO_SEED else seedBefore
+    return ((seed + blockTime) & 0xFFFFFFFF) % SEED_PRIME % num_strategies(lifeAi)
+
+
+def fromActionLog(path, store):
+    '''Appends the rounds of the successful playcard and playround records
+    of an action log to store. Returns the number of rounds appended.
+    '''
+    decode = abi_codec.abi().jsonDecoders['user_info']
+    blockTime = [0]
+    # playround draws the next cards in the same row modify, so its round
+    # is the playcard half replayed
+    game = CardGame(clock=lambda: blockTime[0])
+    games = {}
+    columns = {name: [] for name in ROUND_DTYPE.names}
+    count = 0
+    for record in records(readLog(path)):
+        if record.error is not None:
+            continue
+        if record.action == 'startgame':
+            games[record.username] = store.games
+            store.games += 1
+        elif record.action in ('playcard', 'playround'):
+            before = decode(record.user_before, 0)[0]['game_data']
+            if record.action == 'playcard':
+                after = decode(record.user_after, 0)[0]['game_data']
+            else:
+                blockTime[0] = record.block_time
+                game.users = {record.username: decode(record.user_before, 0)[0]}
+                game.seed = {'key': 1, 'value': record.seed_before} \
+                    if record.seed_before != NO_SEED else None
+                game.playcard(record.username, record.player_card_idx)
+                after = game.users[record.username]['game_data']
+            if record.username not in games:
+                games[record.username] = store.games
+                store.games += 1
+            handCards = sum(1 for cardId in before['hand_player'] if cardId != EMPTY)
+            row = {
+                'game': games[record.username],
+                'round': len(FULL_DECK) - len(before['deck_player']) - handCards + 1,
+                'strategy': _strategy(record.seed_before, record.block_time, before['life_ai'])
+            }
+            for name in ROUND_DTYPE.names[3:]:
+                row[name] = after[name]
+            for name, value in row.items():
+                columns[name].append(value)
+            count += 1
+            if len(columns['game']) >= store.chunkRows:
+                store.append(columns)
+                columns = {name: [] for name in ROUND_DTYPE.names}
+    store.append(columns)
+    store.flush()
+    return count
+
+
+def _filter(text):
+    values = [int(value) for value in text.split(',')]
+    return values[0] if len(values) == 1 else values
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query a round store.')
+    commands = parser.add_subparsers(dest='command')
+    simulate = commands.add_parser('simulate', help='append simulated games')
+    simulate.add_argument('store')
+    simulate.add_argument('-n', '--games', type=int, default=1000000)
+    simulate.add_argument('-b', '--batch', type=int, default=250000)
+    simulate.add_argument('--random', choices=['contract', 'uniform'], default='contract')
+    simulate.add_argument('--policy', choices=['random', 'first'], default='random')
+    simulate.add_argument('--seed', type=int, default=None)
+    log = commands.add_parser('log', help='append the rounds of an action log')
+    log.add_argument('store')
+    log.add_argument('log')
+    query = commands.add_parser('query', help='count and aggregate matching rounds')
+    query.add_argument('store')
+    for name in ('strategy', 'status', 'round', 'game'):
+        query.add_argument('--' + name, type=_filter, help='value or value,value')
+    query.add_argument('--mean', action='append', default=[], help='column to average')
+    query.add_argument('--counts', action='append', default=[], help='column to count values of')
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.command == 'simulate':
+        from simulator import Simulator
+        simulator = Simulator(random_mode=args.random, player_policy=args.policy,
+                              rng=np.random.default_rng(args.seed))
+        with RoundStore(args.store, 'a') as store:
+            simulator.run(args.games, args.batch, store=store)
+        print('{} rounds in {:.1f}s'.format(len(store), time.time() - start))
+    elif args.command == 'log':
+        with RoundStore(args.store, 'a') as store:
+            count = fromActionLog(args.log, store)
+        print('{} rounds in {:.1f}s'.format(count, time.time() - start))
+    elif args.command == 'query':
+        filters = {name: getattr(args, name) for name in ('strategy', 'status', 'round', 'game')
+                   if getattr(args, name) is not None}
+        selected = RoundStore(args.store).where(**filters)
+        print('rounds: {}'.format(selected.count()))
+        for name in args.mean:
+            print('mean {}: {}'.format(name, selected.mean(name)))
+        for name in args.counts:
+            print('{}: {}'.format(name, selected.counts(name)))
+        print('in {:.1f}s'.format(time.time() - start))
+    else:
+        parser.print_help()
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(not main())
@@ -0,0 +1,26 @@
+'''Runs the contract test modules in one process, so they share the
+testnet started by session.py instead of each resetting its own.
+
+    python3 tests/run_tests.py [module ...]
+'''
+import sys
+import unittest
+
+MODULES = [
+    'test_login',
+    'test_startgame',
+    'test_playcard',
+    'test_nextround',
+    'test_playround',
+    'test_endgame'
+]
+
+
+def suite(modules=MODULES):
+    return unittest.defaultTestLoader.loadTestsFromNames(modules)
+
+
+if __name__ == '__main__':
+    result = unittest.TextTestRunner(verbosity=2).run(
+        suite(sys.argv[1:] or MODULES))
+    sys.exit(not result.wasSuccessful())
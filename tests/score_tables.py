@@ -0,0 +1,191 @@
+'''Precomputed lookup tables for the contract's card arithmetic.
+
+ATTACK_MATRIX[card1][card2] is calculate_attack_point(card1, card2) for
+every pair of card ids. ScoreTable holds calculate_ai_card_score for every
+(strategy, life_ai bucket, ai card, player hand multiset): the player hand
+is unordered for the score, so the 4 card hands collapse to 5985
+multisets, C(21, 4), of the 18 card ids.
+
+    python3 tests/score_tables.py --verify
+'''
+import argparse
+import itertools
+import time
+from array import array
+
+from cardgame_engine import (CARD_DICT, EMPTY, HAND_SIZE, ai_best_card_win_strategy,
+                             ai_loss_prevention_strategy, ai_min_loss_strategy,
+                             ai_points_tally_strategy, calculate_ai_card_score,
+                             calculate_attack_point)
+
+NUM_STRATEGIES = 4
+LOSS_PREVENTION = 3
+# life_ai only matters to the loss prevention strategy, through
+# life_ai + ai_attack_point - player_attack_point > 0 where the attack
+# difference lies in [-4, 4]. Below -4 and above 5 the result is constant.
+MIN_LIFE = -4
+MAX_LIFE = 5
+
+
+def attack_matrix(card_dict=CARD_DICT):
+    numCards = max(card_dict) + 1
+    return [[calculate_attack_point(card1, card2, card_dict) for card2 in range(numCards)]
+            for card1 in range(numCards)]
+
+
+ATTACK_MATRIX = attack_matrix()
+
+
+def life_bucket(strategy, life_ai):
+    if strategy != LOSS_PREVENTION:
+        return 0
+    return min(max(life_ai, MIN_LIFE), MAX_LIFE) - MIN_LIFE
+
+
+def pair_score(strategy, life_ai, ai_card, player_card, card_dict=CARD_DICT, attack=ATTACK_MATRIX):
+    '''Contribution of a single player card to calculate_ai_card_score.
+    '''
+    if card_dict[player_card][0] == EMPTY:
+        return 0
+    ai_attack_point = attack[ai_card][player_card]
+    player_attack_point = attack[player_card][ai_card]
+    if strategy == 0:
+        return ai_best_card_win_strategy(ai_attack_point, player_attack_point)
+    if strategy == 1:
+        return ai_min_loss_strategy(ai_attack_point, player_attack_point)
+    if strategy == 2:
+        return ai_points_tally_strategy(ai_attack_point, player_attack_point)
+    return ai_loss_prevention_strategy(life_ai, ai_attack_point, player_attack_point)
+
+
+class ScoreTable:
+    '''calculate_ai_card_score for every input, as a flat array of int8.
+
+    Rows are (strategy, life bucket) pairs: one per strategy that ignores
+    life_ai and one per bucket for loss prevention. Within a row the index
+    is ai_card * number of multisets + multiset rank.
+    '''
+
+    def __init__(self, card_dict=CARD_DICT):
+        self.card_dict = card_dict
+        self.num_cards = max(card_dict) + 1
+        self.attack = attack_matrix(card_dict)
+        self.multisets = list(itertools.combinations_with_replacement(
+            range(self.num_cards), HAND_SIZE))
+        self.ranks = {multiset: rank for rank,
+                      multiset in enumerate(self.multisets)}
+        self.row_offsets = {}
+        numRows = 0
+        for strategy in range(NUM_STRATEGIES):
+            buckets = MAX_LIFE - MIN_LIFE + 1 if strategy == LOSS_PREVENTION else 1
+            for bucket in range(buckets):
+                self.row_offsets[(strategy, bucket)] = numRows
+                numRows += 1
+        self.row_size = self.num_cards * len(self.multisets)
+        self.scores = self._build(numRows)
+
+    def _build(self, numRows):
+        scores = array('b', bytes(numRows * self.row_size))
+        for (strategy, bucket), row in self.row_offsets.items():
+            life_ai = bucket + MIN_LIFE
+            for ai_card in range(self.num_cards):
+                pairs = [pair_score(strategy, life_ai, ai_card, player_card, self.card_dict, self.attack)
+                         for player_card in range(self.num_cards)]
+                offset = row * self.row_size + ai_card * len(self.multisets)
+                for rank, multiset in enumerate(self.multisets):
+                    scores[offset + rank] = sum(pairs[card]
+                                                for card in multiset)
+        return scores
+
+    def hand_rank(self, hand_player):
+        return self.ranks[tuple(sorted(hand_player))]
+
+    def score(self, strategy, life_ai, ai_card, hand_player):
+        return self.score_by_rank(strategy, life_ai, ai_card, self.hand_rank(hand_player))
+
+    def score_by_rank(self, strategy, life_ai, ai_card, rank):
+        row = self.row_offsets[(strategy, life_bucket(strategy, life_ai))]
+        return self.scores[row * self.row_size + ai_card * len(self.multisets) + rank]
+
+    def choose_ai_card_idx(self, strategy, game_data):
+        '''Table driven cardgame_engine.choose_ai_card_idx.
+        '''
+        rank = self.hand_rank(game_data['hand_player'])
+        row = self.row_offsets[(strategy, life_bucket(
+            strategy, game_data['life_ai']))]
+        offset = row * self.row_size + rank
+        stride = len(self.multisets)
+        chosen_card_idx = -1
+        chosen_card_score = None
+        for i, ai_card in enumerate(game_data['hand_ai']):
+            if self.card_dict[ai_card][0] == EMPTY:
+                continue
+            card_score = self.scores[offset + ai_card * stride]
+            if chosen_card_score is None or card_score > chosen_card_score:
+                chosen_card_score = card_score
+                chosen_card_idx = i
+        return chosen_card_idx
+
+    def verify(self):
+        '''Checks the table entries against the contract functions and
+        returns the number of entries checked. Raises AssertionError on the
+        first mismatch. The loss prevention scores are checked for life_ai
+        from MIN_LIFE - 1 to MAX_LIFE + 1, one past each end of the
+        buckets, the other strategies, which ignore life_ai, at 5.
+        '''
+        checked = 0
+        for card1 in range(self.num_cards):
+            for card2 in range(self.num_cards):
+                expected = calculate_attack_point(card1, card2, self.card_dict)
+                assert self.attack[card1][card2] == expected, \
+                    'attack({}, {}) is {}, expected {}'.format(
+                        card1, card2, self.attack[card1][card2], expected)
+                checked += 1
+
+        for strategy in range(NUM_STRATEGIES):
+            lives = range(MIN_LIFE - 1, MAX_LIFE + 2) if strategy == LOSS_PREVENTION else [5]
+            for life_ai in lives:
+                for ai_card in range(self.num_cards):
+                    for rank, multiset in enumerate(self.multisets):
+                        expected = calculate_ai_card_score(
+                            strategy, life_ai, ai_card, multiset, self.card_dict)
+                        actual = self.score_by_rank(
+                            strategy, life_ai, ai_card, rank)
+                        assert actual == expected, \
+                            'score({}, {}, {}, {}) is {}, expected {}'.format(
+                                strategy, life_ai, ai_card, multiset, actual, expected)
+                        checked += 1
+        return checked
+
+
+_table = None
+
+
+def score_table():
+    '''Returns the ScoreTable of the contract card_dict, built on first use.
+    '''
+    global _table
+    if _table is None:
+        _table = ScoreTable()
+    return _table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build and verify the cardgame lookup tables.')
+    parser.add_argument('--verify', action='store_true',
+                        help='check every entry against the contract functions')
+    args = parser.parse_args()
+
+    start = time.time()
+    table = score_table()
+    print('Built {} scores in {:.2f}s'.format(
+        len(table.scores), time.time() - start))
+    if args.verify:
+        start = time.time()
+        print('Verified {} entries in {:.2f}s'.format(
+            table.verify(), time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+'''One local testnet shared by every test module of a run.
+
+The first module to call start() resets the node, creates the wallet, the
+master and host accounts, and builds (through build_cache.py) and deploys
+the contract. Every call then creates fresh player accounts with unique
+names, so modules sharing the node never see each other's users. The node
+is stopped when the process exits.
+
+    @classmethod
+    def setUpClass(cls):
+        cls.session = session.start(globals(), 'alice', 'carol', 'bob')
+
+startFixture() starts from a snapshot of a fixture stage instead (see
+snapshots.py), with the players already logged in or playing. If it starts
+the session and the snapshot exists, the node is not reset and the
+contract not deployed: the snapshot already holds them. With
+CARDGAME_INSTRUMENT set, the calls of host are timed (see
+instrumentation.py). The block of every push of host is tracked, and
+sync() waits for the last one (see block_wait.py).
+'''
+import atexit
+import os
+
+import backend
+import block_wait
+import build_cache
+import instrumentation
+import snapshots
+from tables import UsersTable
+
+CONTRACT_WORKSPACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+NAME_CHARS = 'abcdefghijklmnopqrstuvwxyz12345'
+MAX_NAME_LENGTH = 12
+
+_session = None
+
+
+class Session:
+
+    def __init__(self, master, host, defines=()):
+        self.master = master
+        self.host = host
+        self.users = UsersTable(host)
+        self.accounts = 0
+        # The preprocessor names the deployed contract was built with
+        self.defines = sorted(defines)
+
+    @property
+    def host(self):
+        return self._host
+
+    @host.setter
+    def host(self, host):
+        # Restored snapshots rebind host, so each account is instrumented here
+        self._host = block_wait.track(instrumentation.instrument(host))
+
+    def sync(self, irreversible=False):
+        '''Waits until the last transaction of host is in a block.
+        '''
+        block_wait.sync(self.host, irreversible)
+
+    def createPlayer(self, alias):
+        '''Creates an account with a name no other module uses and returns it.
+        '''
+        self.accounts += 1
+        name = self._uniqueName(alias, self.accounts)
+        backend.eosf().create_account(name, self.master, account_name=name)
+        return globals()[name]
+
+    def bind(self, testGlobals, *players):
+        '''Binds master, host and a fresh account per alias in players into
+        the globals of a test module.
+        '''
+        testGlobals['master'] = self.master
+        testGlobals['host'] = self.host
+        for alias in players:
+            testGlobals[alias] = self.createPlayer(alias)
+
+    def bindFixture(self, testGlobals, stage):
+        '''Brings the chain to a snapshots.FIXTURES stage, restoring its
+        snapshot when there is one, and binds master, host and the stage's
+        players into the globals of a test module.
+        '''
+        players, _ = snapshots.fixture(stage, self)
+        self.bind(testGlobals)
+        testGlobals.update(players)
+
+    def _uniqueName(self, alias, number):
+        suffix = ''
+        while number:
+            number, digit = divmod(number, len(NAME_CHARS))
+            suffix = NAME_CHARS[digit] + suffix
+        prefix = ''.join(c for c in alias.lower() if c in NAME_CHARS)
+        return prefix[:MAX_NAME_LENGTH - len(suffix) - 1] + '1' + suffix
+
+
+def boot(contractWorkspace=CONTRACT_WORKSPACE, defines=(), stage=None):
+    '''Resets the node, deploys the contract built with the preprocessor
+    names in defines (see build_cache.py) and returns its Session. Raises
+    RuntimeError if the built ABI lacks an action of the sources.
+
+    With a fixture stage that has a snapshot of the current build, the node
+    is neither reset nor deployed to: the Session has no accounts until
+    bindFixture restores the snapshot.
+    '''
+    eosf = backend.eosf()
+    if stage is not None and not defines and snapshots.restorable(stage):
+        eosf.COMMENT('''
+        Start the shared testnet from the snapshot of fixture {}:
+        '''.format(stage))
+        atexit.register(close, eosf)
+        return Session(None, None)
+
+    eosf.COMMENT('''
+    Start the shared testnet:
+    ''')
+    eosf.reset()
+    eosf.create_wallet()
+    eosf.create_master_account('master')
+
+    eosf.COMMENT('''
+    Build and deploy the contract:
+    ''')
+    eosf.create_account('host', master)
+    contract = eosf.Contract(host, contractWorkspace)
+    if backend.name() == 'node':
+        build_cache.build(contract, contractWorkspace, defines)
+        missing = build_cache.missingActions(contractWorkspace)
+        if missing:
+            raise RuntimeError(
+                'build/cardgame.abi has no {} action: the build does not match src/. '
+                'Remove build/build_cache.json to force a rebuild.'.format(', '.join(missing)))
+    contract.deploy()
+
+    atexit.register(close, eosf)
+    return Session(master, host, defines)
+
+
+def get(defines=(), stage=None):
+    '''Returns the shared Session, starting it on first use with the
+    contract built with defines, from the snapshot of a fixture stage when
+    there is one. Raises ValueError if it was started with other defines.
+    '''
+    global _session
+    if _session is None:
+        _session = boot(defines=defines, stage=stage)
+    elif _session.defines != sorted(defines):
+        raise ValueError('The shared session runs a build with defines {}'.format(
+            _session.defines))
+    return _session
+
+
+def start(testGlobals, *players):
+    '''Returns the shared Session, starting it on first use, after binding
+    master, host and fresh player accounts into testGlobals.
+    '''
+    session = get()
+    backend.eosf().COMMENT('''
+    Create test accounts:
+    ''')
+    session.bind(testGlobals, *players)
+    return session
+
+
+def startFixture(testGlobals, stage):
+    '''Returns the shared Session, starting it on first use, with the chain
+    at a fixture stage and its players bound into testGlobals.
+    '''
+    session = get(stage=stage)
+    backend.eosf().COMMENT('''
+    Restore fixture {}:
+    '''.format(stage))
+    session.bindFixture(testGlobals, stage)
+    return session
+
+
+def close(eosf):
+    '''Stops the shared node, if this process started one, through the
+    eosf module it was started with.
+    '''
+    global _session
+    if _session is not None:
+        _session = None
+        eosf.stop()
@@ -0,0 +1,313 @@
+'''Batched Monte Carlo simulation of complete cardgame games with NumPy.
+
+Every game of a batch is a row in a set of arrays (decks, hands, lives,
+seed values) and each contract step - draw_one_card, ai_choose_card with
+calculate_ai_card_score, resolve_selected_cards and update_game_status -
+is applied to the whole batch at once. A game is startgame followed by
+playcard/nextround pairs until its status leaves ONGOING.
+
+    python3 tests/simulator.py -n 1000000
+'''
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from cardgame_engine import (CARD_DICT, EMPTY, HAND_SIZE, ONGOING, PLAYER_LOST,
+                             PLAYER_WON, SEED_PRIME, VOID)
+from score_tables import (MAX_LIFE, MIN_LIFE, NUM_STRATEGIES, attack_matrix,
+                          pair_score)
+
+LIFE_BUCKETS = range(MIN_LIFE, MAX_LIFE + 1)
+INITIAL_LIFE = 5
+
+
+def card_arrays(card_dict=CARD_DICT):
+    '''Returns (types, attack matrix) for a card_dict, indexed by card_id.
+    '''
+    numCards = max(card_dict) + 1
+    types = np.zeros(numCards, dtype=np.int8)
+    for cardId, (cardType, _) in card_dict.items():
+        types[cardId] = cardType
+    return types, np.array(attack_matrix(card_dict), dtype=np.int8)
+
+
+def pair_scores(card_dict=CARD_DICT):
+    '''Returns the score each strategy gives an AI card against a single
+    player card, shape (strategy, life bucket, ai card, player card).
+    calculate_ai_card_score is the sum of these over the player hand.
+    '''
+    attack = attack_matrix(card_dict)
+    numCards = len(attack)
+    scores = np.zeros((NUM_STRATEGIES, len(LIFE_BUCKETS),
+                       numCards, numCards), dtype=np.int8)
+    for strategy, (bucket, lifeAi), aiCard, playerCard in itertools.product(
+            range(NUM_STRATEGIES), enumerate(LIFE_BUCKETS), range(numCards), range(numCards)):
+        scores[strategy, bucket, aiCard, playerCard] = pair_score(
+            strategy, lifeAi, aiCard, playerCard, card_dict, attack)
+    return scores
+
+
+def life_bucket(lifeAi):
+    '''Maps life_ai to its LIFE_BUCKETS index. Outside [-4, 5] the loss
+    prevention strategy no longer depends on the exact value.
+    '''
+    return np.clip(lifeAi, LIFE_BUCKETS[0], LIFE_BUCKETS[-1]) - LIFE_BUCKETS[0]
+
+
+class SimulationResult:
+    '''Per-game outcome arrays of a simulation.
+    '''
+
+    FIELDS = ('status', 'rounds', 'life_lost_player', 'life_lost_ai', 'strategies',
+              'strategy_won', 'strategy_swing')
+
+    def __init__(self, status, rounds, lifeLostPlayer, lifeLostAi, strategies,
+                 strategyWon=None, strategySwing=None):
+        self.status = status
+        self.rounds = rounds
+        self.life_lost_player = lifeLostPlayer
+        self.life_lost_ai = lifeLostAi
+        # Per game and strategy: rounds picked, rounds the AI took life in,
+        # and life taken by the AI minus life it lost
+        self.strategies = strategies
+        self.strategy_won = strategyWon if strategyWon is not None else np.zeros_like(strategies)
+        self.strategy_swing = strategySwing if strategySwing is not None else np.zeros_like(strategies)
+
+    def __len__(self):
+        return len(self.status)
+
+    @classmethod
+    def concatenate(cls, results):
+        return cls(*[np.concatenate([getattr(result, attr) for result in results])
+                     for attr in cls.FIELDS])
+
+    def win_rate(self):
+        return float(np.mean(self.status == PLAYER_WON))
+
+    def summary(self):
+        return {
+            'games': len(self),
+            'win_rate': self.win_rate(),
+            'loss_rate': float(np.mean(self.status == PLAYER_LOST)),
+            'rounds': np.bincount(self.rounds, minlength=18).tolist(),
+            'mean_rounds': float(np.mean(self.rounds)),
+            'life_lost_player': np.bincount(self.life_lost_player).tolist(),
+            'life_lost_ai': np.bincount(self.life_lost_ai).tolist(),
+            'strategy_picks': self.strategies.sum(axis=0).tolist(),
+            'strategy_won': self.strategy_won.sum(axis=0).tolist(),
+            'strategy_swing': self.strategy_swing.sum(axis=0).tolist()
+        }
+
+
+class Simulator:
+    '''Plays batches of games against the contract AI.
+
+    ``random_mode`` selects where random() numbers come from: 'contract'
+    reproduces the seed row arithmetic, with a per game seed and block
+    clock, 'uniform' draws from a NumPy generator instead. The player picks
+    one of its non empty hand slots according to ``player_policy``: 'random'
+    or 'first'.
+    '''
+
+    def __init__(self, card_dict=CARD_DICT, random_mode='contract', player_policy='random',
+                 action_interval=1, rng=None):
+        self.types, self.attack = card_arrays(card_dict)
+        self.scores = pair_scores(card_dict)
+        self.deck = np.array(sorted(cardId for cardId, (cardType, _) in card_dict.items()
+                                    if cardType != EMPTY), dtype=np.uint8)
+        self.random_mode = random_mode
+        self.player_policy = player_policy
+        self.action_interval = action_interval
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def run(self, numGames, batchSize=250000, store=None):
+        results = []
+        for start in range(0, numGames, batchSize):
+            results.append(self.play(min(batchSize, numGames - start), store=store))
+        return SimulationResult.concatenate(results)
+
+    def play(self, numGames, seeds=None, startTimes=None, hands=None, store=None):
+        '''Plays numGames full games and returns their SimulationResult.
+        ``seeds`` and ``startTimes`` fix the seed row value and the block
+        time of startgame for each game in 'contract' mode. ``hands``, a
+        pair of (numGames, HAND_SIZE) card id arrays, deals the opening
+        hands of the player and the AI instead of startgame's draws.
+        Every round played is appended to ``store``, a RoundStore, with
+        game ids following its last game.
+        '''
+        self.n = numGames
+        self.rows = np.arange(numGames)
+        if self.random_mode == 'contract':
+            self.seed = (np.array(seeds, dtype=np.int64) if seeds is not None
+                         else self.rng.integers(0, SEED_PRIME, numGames))
+            self.now = (np.array(startTimes, dtype=np.int64) if startTimes is not None
+                        else self.rng.integers(1500000000, 1600000000, numGames))
+
+        deckSize = len(self.deck)
+        deckPlayer = np.tile(self.deck, (numGames, 1))
+        deckAi = deckPlayer.copy()
+        deckPlayerSize = np.full(numGames, deckSize, dtype=np.int64)
+        deckAiSize = deckPlayerSize.copy()
+        handPlayer = np.zeros((numGames, HAND_SIZE), dtype=np.uint8)
+        handAi = np.zeros((numGames, HAND_SIZE), dtype=np.uint8)
+        lifePlayer = np.full(numGames, INITIAL_LIFE, dtype=np.int64)
+        lifeAi = np.full(numGames, INITIAL_LIFE, dtype=np.int64)
+        status = np.full(numGames, ONGOING, dtype=np.int8)
+        rounds = np.zeros(numGames, dtype=np.int64)
+        strategies = np.zeros((numGames, NUM_STRATEGIES), dtype=np.int64)
+        strategyWon = np.zeros_like(strategies)
+        strategySwing = np.zeros_like(strategies)
+        everyGame = np.ones(numGames, dtype=bool)
+
+        if hands is not None:
+            for deck, deckSize, hand, dealt in ((deckPlayer, deckPlayerSize, handPlayer, hands[0]),
+                                                (deckAi, deckAiSize, handAi, hands[1])):
+                self._deal(deck, deckSize, hand, np.asarray(dealt, dtype=np.uint8))
+        else:
+            for _ in range(HAND_SIZE):
+                self._draw(deckPlayer, deckPlayerSize, handPlayer, everyGame)
+                self._draw(deckAi, deckAiSize, handAi, everyGame)
+
+        ongoing = everyGame
+        while ongoing.any():
+            self._tick(ongoing)
+            strategy = self._random(
+                np.where(lifeAi < 2, 4, 3), ongoing)
+            picked = (self.rows[ongoing], strategy[ongoing])
+            strategies[picked] += 1
+            aiIdx = self._aiChooseCard(strategy, lifeAi, handAi, handPlayer)
+            playerIdx = self._playerChooseCard(handPlayer)
+
+            selectedAi = handAi[self.rows, aiIdx]
+            selectedPlayer = handPlayer[self.rows, playerIdx]
+            handAi[self.rows[ongoing], aiIdx[ongoing]] = 0
+            handPlayer[self.rows[ongoing], playerIdx[ongoing]] = 0
+            rounds += ongoing
+
+            lostPlayer, lostAi = self._resolve(selectedAi, selectedPlayer)
+            strategyWon[picked] += lostPlayer[ongoing] > 0
+            strategySwing[picked] += lostPlayer[ongoing] - lostAi[ongoing]
+            lifePlayer -= np.where(ongoing, lostPlayer, 0)
+            lifeAi -= np.where(ongoing, lostAi, 0)
+
+            handEmpty = (deckPlayerSize == 0) & (handPlayer.max(axis=1) == EMPTY)
+            newStatus = np.where(lifeAi <= 0, PLAYER_WON,
+                                 np.where(lifePlayer <= 0, PLAYER_LOST,
+                                          np.where(handEmpty,
+                                                   np.where(lifeAi > lifePlayer, PLAYER_LOST, PLAYER_WON),
+                                                   ONGOING)))
+            status = np.where(ongoing, newStatus, status).astype(np.int8)
+            if store is not None:
+                store.append({
+                    'game': store.games + self.rows[ongoing],
+                    'round': rounds[ongoing],
+                    'strategy': strategy[ongoing],
+                    'selected_card_player': selectedPlayer[ongoing],
+                    'selected_card_ai': selectedAi[ongoing],
+                    'life_lost_player': lostPlayer[ongoing],
+                    'life_lost_ai': lostAi[ongoing],
+                    'life_player': lifePlayer[ongoing],
+                    'life_ai': lifeAi[ongoing],
+                    'status': status[ongoing]
+                })
+            ongoing = status == ONGOING
+
+            self._tick(ongoing)
+            self._draw(deckPlayer, deckPlayerSize, handPlayer,
+                       ongoing & (deckPlayerSize > 0))
+            self._draw(deckAi, deckAiSize, handAi, ongoing & (deckAiSize > 0))
+
+        if store is not None:
+            store.games += numGames
+        return SimulationResult(status, rounds, INITIAL_LIFE - lifePlayer,
+                                INITIAL_LIFE - lifeAi, strategies, strategyWon, strategySwing)
+
+    def _tick(self, active):
+        if self.random_mode == 'contract':
+            self.now += np.where(active, self.action_interval, 0)
+
+    def _random(self, rangeSize, active):
+        if self.random_mode == 'contract':
+            newSeed = (self.seed + self.now) % SEED_PRIME
+            self.seed = np.where(active, newSeed, self.seed)
+            return newSeed % rangeSize
+        return (self.rng.random(self.n) * rangeSize).astype(np.int64)
+
+    def _draw(self, deck, deckSize, hand, active):
+        idx = self._random(np.maximum(deckSize, 1), active)
+        rows = self.rows[active]
+        idx = idx[active]
+        emptySlot = np.argmax(hand[rows] == 0, axis=1)
+        hand[rows, emptySlot] = deck[rows, idx]
+
+        columns = np.arange(deck.shape[1])
+        source = np.minimum(
+            columns + (columns >= idx[:, None]), deck.shape[1] - 1)
+        deck[rows] = np.take_along_axis(deck[rows], source, axis=1)
+        deckSize[rows] -= 1
+        deck[rows, deckSize[rows]] = 0
+
+    def _deal(self, deck, deckSize, hand, dealt):
+        '''Moves the dealt cards from the decks to the hands, keeping the
+        order of the rest of the deck.
+        '''
+        hand[:] = dealt
+        inHand = (deck[:, :, None] == dealt[:, None, :]).any(axis=2)
+        deck[:] = np.take_along_axis(deck, np.argsort(inHand, axis=1, kind='stable'), axis=1)
+        deckSize -= inHand.sum(axis=1)
+        deck[np.arange(deck.shape[1]) >= deckSize[:, None]] = 0
+
+    def _aiChooseCard(self, strategy, lifeAi, handAi, handPlayer):
+        bucket = life_bucket(lifeAi)
+        scores = self.scores[strategy[:, None, None], bucket[:, None, None],
+                             handAi[:, :, None], handPlayer[:, None, :]]
+        cardScores = scores.sum(axis=2, dtype=np.int64)
+        cardScores[self.types[handAi] == EMPTY] = np.iinfo(np.int64).min
+        return np.argmax(cardScores, axis=1)
+
+    def _playerChooseCard(self, handPlayer):
+        playable = self.types[handPlayer] != EMPTY
+        if self.player_policy == 'first':
+            return np.argmax(playable, axis=1)
+        return np.argmax(np.where(playable, self.rng.random(playable.shape), -1), axis=1)
+
+    def _resolve(self, selectedAi, selectedPlayer):
+        attackAi = self.attack[selectedAi, selectedPlayer].astype(np.int64)
+        attackPlayer = self.attack[selectedPlayer, selectedAi].astype(np.int64)
+        void = (self.types[selectedAi] == VOID) | (
+            self.types[selectedPlayer] == VOID)
+        aiWins = attackAi > attackPlayer
+        lostPlayer = np.where(~void & aiWins, attackAi - attackPlayer, 0)
+        lostAi = np.where(~void & ~aiWins, attackPlayer - attackAi, 0)
+        return lostPlayer, lostAi
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Simulate full cardgame games against the contract AI.')
+    parser.add_argument('-n', '--games', type=int, default=1000000)
+    parser.add_argument('-b', '--batch', type=int, default=250000)
+    parser.add_argument('--random', choices=['contract', 'uniform'],
+                        default='contract')
+    parser.add_argument('--policy', choices=['random', 'first'],
+                        default='random')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    simulator = Simulator(random_mode=args.random, player_policy=args.policy,
+                          rng=np.random.default_rng(args.seed))
+    start = time.time()
+    result = simulator.run(args.games, args.batch)
+    elapsed = time.time() - start
+
+    summary = result.summary()
+    print('Games: {} in {:.2f}s ({:.0f} games/min)'.format(
+        len(result), elapsed, len(result) / elapsed * 60))
+    for key, value in summary.items():
+        print('{}: {}'.format(key, value))
+
+
+if __name__ == '__main__':
+    main()
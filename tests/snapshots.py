@@ -0,0 +1,225 @@
+'''Snapshots of the chain at named fixture stages.
+
+A fixture stage is the shared session plus the accounts and actions of
+FIXTURES, e.g. "games_started": alice, carol and bob created, alice and bob
+logged in and playing. The first run builds the stage and captures the
+chain: on the local node, its data and wallet directories (the node is
+stopped while they are copied, and keosd restarted after a restore so it
+opens the restored wallet); on the engine, the users rows of the stage's
+players and the seed row, so a restore leaves the rows of other test
+modules sharing the engine alone. Later runs restore the capture instead
+of pushing the actions again, and a node session started for a stage
+with a snapshot skips its reset and deploy (see restorable()).
+
+A snapshot is keyed by the sha256 of build/cardgame.wasm and of
+tests/cardgame_engine.py, the backend and the stage's actions, so it is
+rebuilt when the contract or the engine changes. Snapshots
+live in build/snapshots/<stage>-<key>/; stale ones are removed when their
+stage is captured again.
+'''
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import backend
+import build_cache
+import engine_eosf
+from batch import ActionBatch
+
+SNAPSHOT_DIR = os.path.join(build_cache.WORKSPACE, 'build', 'snapshots')
+WASM_FILE = os.path.join(build_cache.WORKSPACE, 'build', 'cardgame.wasm')
+ENGINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cardgame_engine.py')
+PLAYERS = ('alice', 'carol', 'bob')
+
+# Each stage is the one before it plus its own (action, player) pushes
+FIXTURES = [
+    ('deployed', []),
+    ('logged_in', [('login', 'alice'), ('login', 'bob')]),
+    ('games_started', [('startgame', 'alice'), ('startgame', 'bob')])
+]
+STAGES = [stage for stage, _ in FIXTURES]
+
+
+def stageActions(stage):
+    actions = []
+    for name, pushes in FIXTURES:
+        actions.extend(pushes)
+        if name == stage:
+            return actions
+    raise ValueError('Unknown fixture stage {}'.format(stage))
+
+
+def snapshotKey(stage, wasmFile=WASM_FILE, engineFile=ENGINE_FILE):
+    digest = hashlib.sha256()
+    for path in (wasmFile, engineFile):
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    digest.update(backend.name().encode())
+    digest.update(json.dumps([stage, PLAYERS, stageActions(stage)]).encode())
+    return digest.hexdigest()
+
+
+def _restoreAccount(objectName, accountName):
+    if backend.name() == 'node':
+        backend.eosf().create_account(objectName, None, account_name=accountName, restore=True)
+    else:
+        backend.eosf().create_account(objectName, None, account_name=accountName)
+    return globals()[objectName]
+
+
+class EngineState:
+    '''Captures the players' rows and the seed row of the in-process
+    engine.
+    '''
+
+    FILE = 'state.pickle'
+
+    def capture(self, path, players):
+        game = engine_eosf.engine()
+        names = [account.name for account in players.values()]
+        with open(os.path.join(path, self.FILE), 'wb') as f:
+            pickle.dump({'users': [game.users[name] for name in names if name in game.users],
+                         'seed': game.seed}, f, pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, path):
+        with open(os.path.join(path, self.FILE), 'rb') as f:
+            state = pickle.load(f)
+        engine_eosf.engine().load_rows(state['users'], state['seed'])
+
+
+class NodeState:
+    '''Captures the local node's chain data and the wallet holding the
+    keys of its accounts.
+    '''
+
+    def directories(self):
+        from eosfactory.core import config
+        return {'data': config.data_dir(), 'wallet': config.keosd_wallet_dir()}
+
+    def capture(self, path, players):
+        eosf = backend.eosf()
+        eosf.stop()
+        try:
+            for name, directory in self.directories().items():
+                shutil.copytree(directory, os.path.join(path, name))
+        finally:
+            eosf.resume()
+
+    def restore(self, path):
+        from eosfactory.core import cleos
+        eosf = backend.eosf()
+        eosf.stop()
+        try:
+            # keosd keeps the wallets it opened in memory, so it is stopped
+            # before their files are replaced
+            cleos.WalletStop(is_verbose=False)
+            for name, directory in self.directories().items():
+                shutil.rmtree(directory, ignore_errors=True)
+                shutil.copytree(os.path.join(path, name), directory)
+        finally:
+            eosf.resume()
+        # Starts keosd again and opens and unlocks the restored wallet
+        eosf.create_wallet()
+
+
+class SnapshotStore:
+
+    def __init__(self, directory=None):
+        self.directory = directory or SNAPSHOT_DIR
+        self.state = NodeState() if backend.name() == 'node' else EngineState()
+
+    def path(self, stage, key):
+        return os.path.join(self.directory, '{}-{}'.format(stage, key[:16]))
+
+    def load(self, stage, key):
+        '''Returns the metadata of the snapshot of stage, or None.
+        '''
+        metaFile = os.path.join(self.path(stage, key), 'meta.json')
+        if not os.path.exists(metaFile):
+            return None
+        with open(metaFile) as f:
+            meta = json.load(f)
+        return meta if meta['key'] == key else None
+
+    def capture(self, stage, key, session, players):
+        path = self.path(stage, key)
+        for entry in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            if entry.startswith(stage + '-') and entry != os.path.basename(path):
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+        # Built aside and renamed, so parallel workers never see half a snapshot
+        building = '{}.{}'.format(path, os.getpid())
+        os.makedirs(building)
+        self.state.capture(building, players)
+        meta = {
+            'stage': stage,
+            'key': key,
+            'backend': backend.name(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+            'master': session.master.name,
+            'host': session.host.name,
+            'accounts': session.accounts,
+            'players': {alias: account.name for alias, account in players.items()}
+        }
+        with open(os.path.join(building, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        try:
+            os.rename(building, path)
+        except OSError:
+            # Another worker captured it first
+            shutil.rmtree(building, ignore_errors=True)
+        return meta
+
+    def restore(self, stage, key, session):
+        '''Restores the chain of a snapshot and points session at its
+        accounts. Returns the players by alias.
+        '''
+        meta = self.load(stage, key)
+        self.state.restore(self.path(stage, key))
+        if backend.name() == 'node':
+            backend.eosf().create_master_account('master')
+            session.master = globals()['master']
+        session.host = _restoreAccount('host', meta['host'])
+        session.users.host = session.users.scope = session.host
+        # Later players must not reuse a name the snapshot holds
+        session.accounts = max(session.accounts, meta['accounts'])
+        return {alias: _restoreAccount(alias, name)
+                for alias, name in meta['players'].items()}
+
+
+def restorable(stage, store=None, workspace=build_cache.WORKSPACE):
+    '''Whether a node can start from the snapshot of stage instead of a
+    reset and deploy: there is one, and build/ holds the build of the
+    current sources, whose wasm its key was taken from.
+    '''
+    if backend.name() != 'node' or not build_cache.BuildCache(workspace).isCurrent():
+        return False
+    store = store or SnapshotStore()
+    return store.load(stage, snapshotKey(stage)) is not None
+
+
+def build(stage, session):
+    '''Creates the players of a fixture stage and pushes its actions, in
+    one transaction.
+    '''
+    players = {alias: session.createPlayer(alias) for alias in PLAYERS}
+    with ActionBatch(session.host) as actions:
+        for action, alias in stageActions(stage):
+            actions.add(action, players[alias])
+    return players
+
+
+def fixture(stage, session, store=None):
+    '''Brings the chain of session to stage, from its snapshot when there
+    is one. Returns the players by alias and whether a snapshot was used.
+    '''
+    store = store or SnapshotStore()
+    key = snapshotKey(stage)
+    if store.load(stage, key) is not None:
+        return store.restore(stage, key, session), True
+    players = build(stage, session)
+    store.capture(stage, key, session, players)
+    return players, False
@@ -0,0 +1,403 @@
+'''Exact expectimax for the player's best playcard against the contract AI.
+
+A decision node is the player's choice of card. It is followed by the AI's
+strategy pick, uniform over num_strategies(life_ai), which decides its card
+through ai_choose_card. If the game goes on, nextround draws one card for
+each side, uniform over its deck. random() is modeled as uniform, as in
+the Simulator's 'uniform' mode. The value of a state is the probability
+that the player wins.
+
+Cards with the same type and attack point play the same, so states are
+keyed on card classes. The player hand and the decks are multisets. The AI
+hand keeps its slot order, because ai_choose_card breaks ties by index and
+its draw fills the slot it played: two orders of the same cards can play
+differently later, so no order is merged with another. A state is packed
+into one int, and a transposition table keeps the exact value of every
+state searched, so the decisions after the first of a game are lookups.
+
+Every line is searched to the end of the game, with no depth limit or
+estimate. Scope: the search cannot solve a game from startgame, in a
+minute or at all. The tree grows about fifteenfold with every card left
+in the decks. At full lives, a position with 5 cards left solves in about
+3 seconds and 100k states (30 MB). With 6 cards left it takes about 25
+seconds and 1M states (150 MB). With 7 left it takes about 7 minutes and
+16M states (2 GB). Startgame has 13 cards left. decide() raises
+SearchLimit once the table passes max_states instead of answering
+inexactly. compare() therefore measures the AI's exploitability from
+positions cards_left cards before the end, not over whole games.
+
+    python3 tests/solver.py -n 20 --cards-left 5
+'''
+import argparse
+import random
+import time
+
+from cardgame_engine import (CARD_DICT, EMPTY, HAND_SIZE, ONGOING, PLAYER_WON, VOID, CardGame,
+                             calculate_ai_card_score, calculate_attack_point, new_game,
+                             num_strategies)
+
+MAX_STATES = 1000000
+CARDS_LEFT = 5
+
+
+class SearchLimit(Exception):
+    pass
+
+
+def card_classes(card_dict=CARD_DICT):
+    '''Groups the cards of a card_dict that play the same. Returns the class
+    of every card id, class 0 being the empty slot, and a representative
+    card id of every class.
+    '''
+    class_of = {}
+    cards = [0]
+    for cardId in sorted(card_dict):
+        cardType, attack = card_dict[cardId]
+        if cardType == EMPTY:
+            class_of[cardId] = 0
+            continue
+        for cls, representative in enumerate(cards):
+            if cls and card_dict[representative] == (cardType, attack):
+                break
+        else:
+            cls = len(cards)
+            cards.append(cardId)
+        class_of[cardId] = cls
+    return class_of, cards
+
+
+class Decision:
+
+    def __init__(self, card_idx, value, values, states, seconds):
+        self.card_idx = card_idx
+        self.value = value
+        self.values = values
+        self.states = states
+        self.seconds = seconds
+
+    def __repr__(self):
+        return 'Decision(card_idx={}, value={:.4f}, states={})'.format(
+            self.card_idx, self.value, self.states)
+
+
+class Solver:
+    '''Searches states of a card_dict, keeping its transposition table
+    across decisions.
+
+    A state is packed into one int, so a child's key is a few additions
+    away from its parent's and the table holds int keys. Its bit fields,
+    low to high: life_ai, life_player, the class in each hand_ai slot, then
+    the count of each class in hand_player, deck_player and deck_ai.
+    '''
+
+    def __init__(self, card_dict=CARD_DICT, max_states=MAX_STATES):
+        self.card_dict = card_dict
+        self.max_states = max_states
+        self.class_of, self.cards = card_classes(card_dict)
+        self.damage = [[self._damage(ai, player) for player in self.cards] for ai in self.cards]
+        self._layout()
+        self.clear()
+
+    def _layout(self):
+        copies = [0] * len(self.cards)
+        for cardId in self.card_dict:
+            copies[self.class_of[cardId]] += 1
+        self.lifeBits = max(new_game()['life_player'], new_game()['life_ai']).bit_length()
+        self.lifeMask = (1 << self.lifeBits) - 1
+        self.slotBits = (len(self.cards) - 1).bit_length()
+        self.slotMask = (1 << self.slotBits) - 1
+        self.countBits = max(copies[1:]).bit_length()
+        # Field of class cls in a multiset at bit cls * countBits, class 0 unused
+        multisetBits = len(self.cards) * self.countBits
+        self.multisetMask = (1 << multisetBits) - 1
+        self.slotShift = [2 * self.lifeBits + i * self.slotBits for i in range(HAND_SIZE)]
+        self.handShift = 2 * self.lifeBits + HAND_SIZE * self.slotBits
+        self.deckPlayerShift = self.handShift + multisetBits
+        self.deckAiShift = self.deckPlayerShift + multisetBits
+        # The AI's choice depends on life_ai, hand_ai and hand_player
+        self.aiMask = (self.lifeMask | (((1 << HAND_SIZE * self.slotBits) - 1) << self.slotShift[0]) |
+                       (self.multisetMask << self.handShift))
+
+    def clear(self):
+        self.table = {}
+        self._ai = {}
+        self._hands = {}
+        self._playerDraws = {}
+        self._aiDraws = {}
+
+    def _damage(self, aiCard, playerCard):
+        '''(life lost by the player, life lost by the AI), as in
+        resolve_selected_cards.
+        '''
+        if VOID in (self.card_dict[aiCard][0], self.card_dict[playerCard][0]):
+            return 0, 0
+        attackAi = calculate_attack_point(aiCard, playerCard, self.card_dict)
+        attackPlayer = calculate_attack_point(playerCard, aiCard, self.card_dict)
+        if attackAi > attackPlayer:
+            return attackAi - attackPlayer, 0
+        return 0, attackPlayer - attackAi
+
+    def state(self, game_data):
+        '''The packed state of a game.
+        '''
+        state = game_data['life_ai'] | game_data['life_player'] << self.lifeBits
+        for shift, cardId in zip(self.slotShift, game_data['hand_ai']):
+            state |= self.class_of[cardId] << shift
+        for shift, cards in ((self.handShift, game_data['hand_player']),
+                             (self.deckPlayerShift, game_data['deck_player']),
+                             (self.deckAiShift, game_data['deck_ai'])):
+            for cardId in cards:
+                if self.class_of[cardId]:
+                    state += 1 << (shift + self.class_of[cardId] * self.countBits)
+        return state
+
+    def _classes(self, multiset):
+        '''Returns the (class, count) of a packed multiset.
+        '''
+        countMask = (1 << self.countBits) - 1
+        return [(cls, multiset >> cls * self.countBits & countMask)
+                for cls in range(1, len(self.cards))
+                if multiset >> cls * self.countBits & countMask]
+
+    def _hand(self, hand):
+        '''The classes in a packed hand_player, each with the state delta
+        of playing it and whether that empties the hand.
+        '''
+        classes = self._hands.get(hand)
+        if classes is None:
+            classes = self._hands[hand] = tuple(
+                (cls, -(1 << (self.handShift + cls * self.countBits)),
+                 hand == 1 << cls * self.countBits)
+                for cls, _ in self._classes(hand))
+        return classes
+
+    def _aiChoices(self, state):
+        '''The hand_ai slots the AI plays, as (number of strategies picking
+        it, class, state delta of playing it, shift of the slot its draw
+        fills).
+        '''
+        choices = self._ai.get(state & self.aiMask)
+        if choices is None:
+            lifeAi = state & self.lifeMask
+            handAi = [state >> shift & self.slotMask for shift in self.slotShift]
+            playerCards = [self.cards[cls] for cls, count in
+                           self._classes(state >> self.handShift & self.multisetMask)
+                           for _ in range(count)]
+            counts = {}
+            for strategy in range(num_strategies(lifeAi)):
+                chosen = -1
+                chosenScore = None
+                for i, cls in enumerate(handAi):
+                    if not cls:
+                        continue
+                    score = calculate_ai_card_score(strategy, lifeAi, self.cards[cls], playerCards,
+                                                    self.card_dict)
+                    if chosenScore is None or score > chosenScore:
+                        chosen, chosenScore = i, score
+                counts[chosen] = counts.get(chosen, 0) + 1
+            choices = []
+            for i, count in counts.items():
+                played = list(handAi)
+                played[i] = 0
+                # nextround fills the first empty slot
+                choices.append((count, handAi[i], -(handAi[i] << self.slotShift[i]),
+                                self.slotShift[played.index(0)]))
+            choices = self._ai[state & self.aiMask] = tuple(choices)
+        return choices
+
+    def _playerDrawsOf(self, deck):
+        '''Returns ((count, state delta of drawing it), ...) for a packed
+        deck_player, and its size.
+        '''
+        draws = self._playerDraws.get(deck)
+        if draws is None:
+            classes = self._classes(deck)
+            draws = self._playerDraws[deck] = (
+                tuple((count, (1 << (self.handShift + cls * self.countBits)) -
+                       (1 << (self.deckPlayerShift + cls * self.countBits)))
+                      for cls, count in classes),
+                sum(count for _, count in classes))
+        return draws
+
+    def _aiDrawsOf(self, deck, slotShift):
+        '''Returns ((count, state delta of drawing it into the slot), ...)
+        for a packed deck_ai, and its size.
+        '''
+        key = (deck, slotShift)
+        draws = self._aiDraws.get(key)
+        if draws is None:
+            classes = self._classes(deck)
+            draws = self._aiDraws[key] = (
+                tuple((count, (cls << slotShift) -
+                       (1 << (self.deckAiShift + cls * self.countBits)))
+                      for cls, count in classes),
+                sum(count for _, count in classes))
+        return draws
+
+    def value(self, state):
+        '''Returns the exact value of a packed state with the player to
+        play.
+        '''
+        value = self.table.get(state)
+        if value is None:
+            value = max(self.play(state, cls, delta, empties)
+                        for cls, delta, empties in
+                        self._hand(state >> self.handShift & self.multisetMask))
+            if len(self.table) >= self.max_states:
+                raise SearchLimit('more than {} states'.format(self.max_states))
+            self.table[state] = value
+        return value
+
+    def play(self, state, cls, delta, empties):
+        '''Returns the value of the player playing a card of class cls,
+        delta being the state delta of playing it and empties whether it
+        is the last card of the hand.
+        '''
+        lifeAi = state & self.lifeMask
+        lifePlayer = state >> self.lifeBits & self.lifeMask
+        choices = self._aiChoices(state)
+        playerDraws, playerCards = self._playerDrawsOf(
+            state >> self.deckPlayerShift & self.multisetMask)
+        deckAi = state >> self.deckAiShift
+        lives = lifeAi | lifePlayer << self.lifeBits
+
+        total = 0.0
+        strategies = 0
+        for count, aiCls, aiDelta, slotShift in choices:
+            strategies += count
+            lostPlayer, lostAi = self.damage[aiCls][cls]
+            lp = lifePlayer - lostPlayer
+            la = lifeAi - lostAi
+            if la <= 0:
+                value = 1.0
+            elif lp <= 0:
+                value = 0.0
+            elif not playerCards and empties:
+                value = 0.0 if la > lp else 1.0
+            else:
+                base = state - lives + (la | lp << self.lifeBits) + delta + aiDelta
+                aiDraws, aiCards = self._aiDrawsOf(deckAi, slotShift)
+                value = 0.0
+                # nextround draws for each side whose deck is not empty
+                for aiCount, aiDraw in aiDraws or ((1, 0),):
+                    for playerCount, playerDraw in playerDraws or ((1, 0),):
+                        value += aiCount * playerCount * self.value(base + aiDraw + playerDraw)
+                value /= (aiCards or 1) * (playerCards or 1)
+            total += count * value
+        return total / strategies
+
+    def decide(self, game_data):
+        '''Returns the Decision for the hand_player index to play, with the
+        exact value of every card. Raises SearchLimit if the search needs
+        more than max_states states.
+        '''
+        state = self.state(game_data)
+        start = time.time()
+        values = {cls: self.play(state, cls, delta, empties)
+                  for cls, delta, empties in
+                  self._hand(state >> self.handShift & self.multisetMask)}
+        best = max(sorted(values), key=lambda cls: values[cls])
+        cardIdx = next(i for i, cardId in enumerate(game_data['hand_player'])
+                       if cardId and self.class_of[cardId] == best)
+        byIdx = {i: values[self.class_of[cardId]]
+                 for i, cardId in enumerate(game_data['hand_player']) if self.class_of[cardId]}
+        return Decision(cardIdx, values[best], byIdx, len(self.table), time.time() - start)
+
+
+def play_game(game, username, choose):
+    '''Plays a started game of username on a CardGame, choose(game_data)
+    giving each playcard index. Returns the final game_data.
+    '''
+    while True:
+        game_data = game.users[username]['game_data']
+        game.playcard(username, choose(game_data))
+        game_data = game.users[username]['game_data']
+        if game_data['status'] != ONGOING:
+            return game_data
+        game.nextround(username)
+
+
+def compare(games, cards_left=CARDS_LEFT, seed=None, openings=None, max_states=MAX_STATES):
+    '''Plays the same games with the solver and with a random player. Both
+    play the same random cards until the decks hold cards_left cards, and
+    from that position on their own: the exact solver cannot play from
+    startgame (see the module docstring). Returns the win rate of each, the
+    number of games that reached the position and the solver's value of it.
+    With an openings.OpeningTable, also the random player's expected win
+    rate over the openings of the same games.
+    '''
+    rng = random.Random(seed)
+    solver = Solver(max_states=max_states)
+    wins = {'solver': 0, 'random': 0}
+    estimates = []
+    equities = []
+    for _ in range(games):
+        start = rng.randrange(1500000000, 1600000000)
+        seedValue = rng.randrange(65537)
+        prefixSeed = rng.random()
+        for player in wins:
+            now = [start]
+
+            def clock():
+                now[0] += 1
+                return now[0]
+
+            game = CardGame(clock=clock)
+            game.seed = {'key': 1, 'value': seedValue}
+            game.login('player')
+            game.startgame('player')
+            if openings is not None and player == 'random':
+                equities.append(openings.game_equity(game.users['player']['game_data']))
+            prefix = random.Random(prefixSeed)
+            solver.clear()
+            reached = False
+
+            def choose(game_data):
+                nonlocal reached
+                hand = [i for i in range(HAND_SIZE) if game_data['hand_player'][i]]
+                if len(game_data['deck_player']) > cards_left:
+                    return prefix.choice(hand)
+                if player == 'random':
+                    return rng.choice(hand)
+                decision = solver.decide(game_data)
+                if not reached:
+                    estimates.append(decision.value)
+                    reached = True
+                return decision.card_idx
+            if play_game(game, 'player', choose)['status'] == PLAYER_WON:
+                wins[player] += 1
+    return {
+        'games': games,
+        'cards_left': cards_left,
+        'positions': len(estimates),
+        'solver_win_rate': wins['solver'] / float(games),
+        'random_win_rate': wins['random'] / float(games),
+        'solver_estimate': sum(estimates) / len(estimates) if estimates else None,
+        'opening_equity': sum(equities) / len(equities) if equities else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Play games against the contract AI with the expectimax solver.')
+    parser.add_argument('-n', '--games', type=int, default=20)
+    parser.add_argument('-c', '--cards-left', type=int, default=CARDS_LEFT,
+                        help='cards left in the decks when the solver takes over')
+    parser.add_argument('--max-states', type=int, default=MAX_STATES)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--openings', help='opening table built by openings.py')
+    args = parser.parse_args()
+
+    openings = None
+    if args.openings:
+        from openings import OpeningTable
+        openings = OpeningTable(args.openings)
+    start = time.time()
+    result = compare(args.games, args.cards_left, args.seed, openings, args.max_states)
+    print('Games: {} in {:.1f}s'.format(args.games, time.time() - start))
+    for key, value in result.items():
+        print('{}: {}'.format(key, value))
+
+
+if __name__ == '__main__':
+    main()
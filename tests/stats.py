@@ -0,0 +1,27 @@
+'''Small summary statistics shared by the benchmark and load tools.
+'''
+import math
+
+
+def percentile(values, p):
+    '''Nearest-rank percentile of values, p in [0, 100].
+    '''
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(p / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'min': min(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values)
+    }
@@ -0,0 +1,212 @@
+'''Typed access to the contract tables.
+
+UsersTable.get reads a single user_info row by primary key, with a
+lower bound on the encoded account name and limit=1, instead of pulling
+the whole users table and scanning it. The cost of a read does not grow
+with the number of users.
+
+iterRows walks a whole table page by page, following the node's "more"
+flag (and "next_key" where the node returns one), so a full dump holds one
+page in memory at a time. With prefetch the next page is requested on a
+background thread while the current one is consumed. With binary the
+node returns the raw rows (json=false), decoded by abi_codec.
+'''
+import json
+import queue
+import struct
+import threading
+
+import abi_codec
+from cardgame_engine import name_to_uint64
+from packed_game import isPacked, unpackGame
+
+USERS = 'users'
+SEED = 'seed'
+PAGE_SIZE = 500
+
+PRIMARY_KEYS = {
+    USERS: lambda row: name_to_uint64(row['name']),
+    SEED: lambda row: int(row['key'])
+}
+
+
+def binaryPrimaryKey(row):
+    '''Both tables serialize their uint64 primary key first.
+    '''
+    return struct.unpack_from('<Q', bytes.fromhex(row[:16]))[0]
+
+
+class Game:
+    '''A cardgame::game struct. Fields are also readable by key, like the
+    json dict the node returns, so the BaseTest validators accept both.
+    A packed_game (see packed_game.py) is unpacked into the same form.
+    '''
+
+    __slots__ = ('status', 'life_player', 'life_ai', 'deck_player', 'deck_ai',
+                 'hand_player', 'hand_ai', 'selected_card_player', 'selected_card_ai',
+                 'life_lost_player', 'life_lost_ai')
+
+    def __init__(self, **fields):
+        for field in self.__slots__:
+            setattr(self, field, fields[field])
+
+    @classmethod
+    def fromJson(cls, json):
+        if isPacked(json):
+            json = unpackGame(json)
+        return cls(**json)
+
+    def toJson(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __eq__(self, other):
+        return isinstance(other, Game) and self.toJson() == other.toJson()
+
+    def __repr__(self):
+        return 'Game({})'.format(self.toJson())
+
+
+class UserInfo:
+    '''A user_info row of the users table.
+    '''
+
+    __slots__ = ('name', 'win_count', 'loss_count', 'game_data')
+
+    def __init__(self, name, win_count, loss_count, game_data):
+        self.name = name
+        self.win_count = win_count
+        self.loss_count = loss_count
+        self.game_data = game_data
+
+    @classmethod
+    def fromJson(cls, json):
+        return cls(json['name'], int(json['win_count']), int(json['loss_count']),
+                   Game.fromJson(json['game_data']))
+
+    def toJson(self):
+        return {
+            'name': self.name,
+            'win_count': self.win_count,
+            'loss_count': self.loss_count,
+            'game_data': self.game_data.toJson()
+        }
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __eq__(self, other):
+        return isinstance(other, UserInfo) and self.toJson() == other.toJson()
+
+    def __repr__(self):
+        return 'UserInfo({})'.format(self.toJson())
+
+
+class UsersTable:
+
+    def __init__(self, host, scope=None):
+        self.host = host
+        self.scope = scope if scope is not None else host
+
+    def get(self, name):
+        '''Returns the UserInfo of account name, or None if it has no row.
+        '''
+        key = name_to_uint64(str(name))
+        rows = self.host.table(USERS, self.scope, lower=str(key),
+                               upper=str(key + 1), limit=1).json['rows']
+        if rows and rows[0]['name'] == str(name):
+            return UserInfo.fromJson(rows[0])
+        return None
+
+    def rows(self, pageSize=PAGE_SIZE, prefetch=False, binary=False):
+        '''Yields every user as a UserInfo, in primary key order. With
+        binary, as the lazily decoded abi_codec user_info rows instead.
+        '''
+        pages = _iterPages(self.host, USERS, self.scope, pageSize, prefetch, binary)
+        if binary:
+            codec = abi_codec.abi()
+            for page in pages:
+                yield from codec.decodeTable(USERS, page)
+        else:
+            for page in pages:
+                for row in page:
+                    yield UserInfo.fromJson(row)
+
+
+def _pages(host, table, scope, pageSize, binary=False):
+    primaryKey = binaryPrimaryKey if binary else PRIMARY_KEYS[table]
+    lower = ''
+    while True:
+        result = host.table(table, scope, binary=binary, lower=lower,
+                            limit=pageSize).json
+        rows = result['rows']
+        yield rows
+        if not result.get('more') or not rows:
+            return
+        nextKey = result.get('next_key')
+        lower = str(nextKey) if nextKey else str(primaryKey(rows[-1]) + 1)
+
+
+def _prefetchedPages(pages):
+    '''Runs the page generator on a thread, at most one page ahead of
+    the consumer.
+    '''
+    pending = queue.Queue(maxsize=1)
+    done = object()
+    stop = threading.Event()
+
+    def fetch():
+        try:
+            for page in pages:
+                if stop.is_set():
+                    return
+                pending.put(page)
+            pending.put(done)
+        except Exception as e:
+            pending.put(e)
+
+    thread = threading.Thread(target=fetch, daemon=True)
+    thread.start()
+    try:
+        while True:
+            page = pending.get()
+            if page is done:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        stop.set()
+        while thread.is_alive():
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
+
+
+def _iterPages(host, table, scope, pageSize, prefetch, binary):
+    pages = _pages(host, table, scope if scope is not None else host, pageSize, binary)
+    if prefetch:
+        pages = _prefetchedPages(pages)
+    return pages
+
+
+def iterRows(host, table, scope=None, pageSize=PAGE_SIZE, prefetch=False, binary=False):
+    '''Lazily yields every row of a table, one page of pageSize rows per
+    request. With binary the rows are the hex strings of json=false.
+    '''
+    for page in _iterPages(host, table, scope, pageSize, prefetch, binary):
+        yield from page
+
+
+def export(rows, stream):
+    '''Writes rows as json lines, one row at a time, and returns the count.
+    '''
+    count = 0
+    for row in rows:
+        stream.write(json.dumps(row.toJson() if hasattr(row, 'toJson') else row))
+        stream.write('\n')
+        count += 1
+    return count
@@ -0,0 +1,100 @@
+import json
+import tracemalloc
+import unittest
+from array import array
+import abi_codec
+import engine_eosf
+from cardgame_engine import CardGame, uint64_to_name
+from tables import UsersTable, iterRows
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.abi = abi_codec.abi()
+
+    def setUp(self):
+        self.game = CardGame(clock=lambda: 1541212952)
+        for i in range(300):
+            name = 'user' + 'abcdefghijklmnopqrstuvwxyz'[i % 26] + 'abcdefghijklm'[i // 26]
+            self.game.login(name)
+            if i % 2:
+                self.game.startgame(name)
+                self.game.playcard(name, 0)
+
+    def testGeneratedClasses(self):
+        self.assertEqual(('name', 'win_count', 'loss_count', 'game_data'),
+                         self.abi.classes['user_info'].__slots__)
+        self.assertEqual(('key', 'value'), self.abi.classes['seed'].__slots__)
+        self.assertEqual('user_info', self.abi.tables['users'])
+        user = self.abi.decode('user_info', self.abi.encodeRow('users', self.game.rows('users')[0]))
+        self.assertFalse(hasattr(user, '__dict__'))
+
+    def testRoundTrip(self):
+        for table in ('users', 'seed'):
+            rows = self.game.rows(table)
+            decoded = self.abi.decodeTable(table, [self.abi.encodeRow(table, row) for row in rows])
+            self.assertEqual(rows, [row.toJson() for row in decoded])
+        for row in self.game.rows('users'):
+            user = self.abi.decode('user_info', self.abi.encodeRow('users', row))
+            self.assertEqual(row, user.toJson())
+
+    def testLazyRows(self):
+        row = self.game.rows('users')[1]
+        user, = self.abi.decodeRows('user_info', [self.abi.encodeRow('users', row)])
+        self.assertIsNotNone(user._buf)
+        game = user.game_data
+        self.assertIsNone(user._buf)
+        self.assertIsInstance(game.hand_player, array)
+        self.assertEqual(row['game_data']['hand_player'], game['hand_player'].tolist())
+        self.assertEqual(row['name'], user.name)
+        self.assertEqual(row['game_data']['life_ai'], game.life_ai)
+        with self.assertRaises(AttributeError):
+            user.missing
+
+    def testDecodeName(self):
+        for value in (0, 1, 2 ** 64 - 1, 0x5530ea0000000000, 3773036822876127232):
+            self.assertEqual(uint64_to_name(value), abi_codec.decodeName(value))
+
+    def testVaruint32(self):
+        for value in (0, 1, 127, 128, 300, 2 ** 32 - 1):
+            data = abi_codec.writeVaruint32(value) + b'\x01'
+            self.assertEqual((value, len(data) - 1), abi_codec.readVaruint32(data, 0))
+
+    def testBinaryTableReads(self):
+        self.addCleanup(engine_eosf.isolate())
+        engine_eosf.engine().load_rows(self.game.rows('users'), self.game.seed)
+        host = engine_eosf.Account('host')
+        users = UsersTable(host)
+        expected = self.game.rows('users')
+        for pageSize in (1, 7, 1000):
+            self.assertEqual(expected, [user.toJson() for user in users.rows(pageSize, binary=True)])
+            self.assertEqual(expected, [self.abi.decode('user_info', row).toJson()
+                                        for row in iterRows(host, 'users', pageSize=pageSize,
+                                                            prefetch=True, binary=True)])
+
+    def testSmallerThanJson(self):
+        rows = self.game.rows('users') * 20
+        text = json.dumps({'rows': rows, 'more': False})
+        raw = [self.abi.encodeRow('users', row) for row in rows]
+
+        tracemalloc.start()
+        fromJson = json.loads(text)
+        jsonMemory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        tracemalloc.start()
+        decoded = self.abi.decodeRows('user_info', raw)
+        lazyMemory = tracemalloc.get_traced_memory()[0]
+        for user in decoded:
+            user.game_data
+        binaryMemory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.assertTrue(all(user._buf is None for user in decoded))
+        self.assertLess(lazyMemory * 3, jsonMemory)
+        # Measured about 2x once every row is decoded
+        self.assertLess(binaryMemory * 1.5, jsonMemory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import unittest
+import action_log
+import engine_eosf
+from engine_eosf import Account, Error, Permission
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        self.addCleanup(engine_eosf.isolate())
+        self.now = 1541212952
+        engine_eosf.engine().clock = lambda: self.now
+        self.path = os.path.join(self.dir, self.id().split('.')[-1] + '.log')
+
+    def _push(self, recorder, action, player, **data):
+        data['username'] = player
+        self.now += 1
+        return recorder.push_action(action, data, permission=(player, Permission.ACTIVE))
+
+    def _record(self, path, players=('alice', 'bob', 'carol'), playround=False):
+        with action_log.ActionLog(path) as log:
+            recorder = action_log.Recorder(Account('host'), log)
+            for player in players:
+                self._push(recorder, 'login', player)
+                self._push(recorder, 'startgame', player)
+                while True:
+                    hand = engine_eosf.engine().users[player]['game_data']['hand_player']
+                    self._push(recorder, 'playround' if playround else 'playcard', player,
+                               player_card_idx=next(i for i, cardId in enumerate(hand) if cardId))
+                    if engine_eosf.engine().users[player]['game_data']['status']:
+                        break
+                    if not playround:
+                        self._push(recorder, 'nextround', player)
+                with self.assertRaises(Error):
+                    self._push(recorder, 'nextround', player)
+                self._push(recorder, 'endgame', player)
+            with self.assertRaises(Error):
+                recorder.push_action('login', {'username': 'dave'}, permission=('alice', Permission.ACTIVE))
+        return log.count
+
+    def testRecordAndReplay(self):
+        count = self._record(self.path)
+        records = list(action_log.records(action_log.readLog(self.path)))
+        self.assertEqual(count, len(records))
+        self.assertEqual(['login', 'startgame', 'playcard'], [r.action for r in records[:3]])
+        self.assertEqual(self.now - count + 3, records[1].block_time)
+        self.assertIsNone(records[0].error)
+        self.assertEqual(b'', records[0].user_before)
+        self.assertEqual(action_log.NO_SEED, records[1].seed_before)
+        self.assertNotEqual(action_log.NO_SEED, records[1].seed_after)
+        self.assertIn('Game status should be ongoing', records[-3].error)
+        self.assertIn('missing authority of dave', records[-1].error)
+        self.assertEqual(records[-3].user_before, records[-3].user_after)
+        for useScoreTable in (True, False):
+            self.assertEqual((count, None), action_log.replayLog(self.path, 1, useScoreTable))
+
+    def testReplayPlayround(self):
+        count = self._record(self.path, playround=True)
+        records = list(action_log.records(action_log.readLog(self.path)))
+        self.assertEqual('playround', records[2].action)
+        self.assertNotIn('nextround', [r.action for r in records if r.error is None])
+        self.assertEqual((count, None), action_log.replayLog(self.path))
+
+    def testPackRoundTrip(self):
+        record = action_log.Record('playcard', 'alice', 'alice', 3, 1541212952, 7, 8,
+                                   b'\x01\x02', b'\x03', 'assertion failure')
+        self.assertEqual([record], list(action_log.records(record.pack())))
+        self.assertEqual(record.pack(), b''.join(r.pack() for r in action_log.records(record.pack())))
+
+    def testLongErrorCut(self):
+        error = 'assertion failure ' + '\u00e9' * 40000
+        record = action_log.Record('login', 'alice', 'alice', error=error)
+        after = action_log.Record('endgame', 'bob', 'bob')
+        loaded = list(action_log.records(record.pack() + after.pack()))
+        self.assertEqual(2, len(loaded))
+        self.assertEqual(after, loaded[1])
+        self.assertTrue(error.startswith(loaded[0].error))
+        self.assertEqual(action_log.MAX_ERROR_BYTES - 1, len(loaded[0].error.encode()))
+
+    def _tampered(self, index, players=('alice', 'bob', 'carol'), **changes):
+        self._record(self.path, players)
+        records = list(action_log.records(action_log.readLog(self.path)))
+        for field, value in changes.items():
+            setattr(records[index], field, value)
+        path = self.path + '.tampered.gz'
+        with action_log.ActionLog(path) as log:
+            for record in records:
+                log.write(record)
+        return path
+
+    def testClockDivergence(self):
+        path = self._tampered(1, block_time=self.now + 1000)
+        count, divergence = action_log.replayLog(path)
+        self.assertEqual(2, count)
+        self.assertEqual(1, divergence.index)
+        self.assertEqual('startgame', divergence.record.action)
+
+    def testRowDivergence(self):
+        path = self._tampered(3, seed_before=12345)
+        count, divergence = action_log.replayLog(path, 1, False)
+        self.assertEqual(3, divergence.index)
+        self.assertEqual('nextround', divergence.record.action)
+        self.assertIn('Record 3', str(divergence))
+
+    def testOutcomeDivergence(self):
+        path = self._tampered(0, error='assertion failure with message: User does not exist')
+        count, divergence = action_log.replayLog(path)
+        self.assertEqual(0, divergence.index)
+        self.assertEqual('different outcome', divergence.reason)
+        self.assertIsNone(divergence.actual)
+
+    def testParallelReplay(self):
+        players = ['play' + c for c in 'abcdefghij']
+        count = self._record(self.path, players)
+        self.assertEqual((count, None), action_log.replayLog(self.path, 3))
+        self.addCleanup(engine_eosf.isolate())
+        engine_eosf.engine().clock = lambda: self.now
+        path = self._tampered(count - 10, players, seed_after=1)
+        self.assertEqual(count - 10, action_log.replayLog(path, 3)[1].index)
+
+    def testNotALog(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'users')
+        with self.assertRaises(ValueError):
+            action_log.readLog(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+from cardgame_engine import CARD_DICT, FIRE, NEUTRAL, VOID
+
+try:
+    import numpy as np
+    import balance_sweep
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testCardDicts(self):
+        self.assertEqual(CARD_DICT, balance_sweep.card_dict_for({}))
+        card_dict = balance_sweep.card_dict_for(
+            {'attack:5': 4, 'type:6': 'FIRE', 'neutral': 2, 'void': 0, 'neutral_attack': 2})
+        self.assertEqual(18, len(card_dict))
+        self.assertEqual((FIRE, 4), card_dict[5])
+        self.assertEqual((FIRE, 1), card_dict[6])
+        self.assertEqual([(NEUTRAL, 2)] * 2, [card_dict[16], card_dict[17]])
+        self.assertNotIn(VOID, [cardType for cardType, _ in card_dict.values()])
+        for variant in ({'attack:16': 1}, {'speed': 1}, {'neutral': 0, 'void': 0, 'type:1': 'VOID',
+                                                          **{'attack:{}'.format(i): 1 for i in range(2)}}):
+            with self.assertRaises((ValueError, KeyError)):
+                balance_sweep.card_dict_for(variant)
+
+    def testGrid(self):
+        self.assertEqual([{'neutral': 0, 'void': 1}, {'neutral': 0, 'void': 2},
+                          {'neutral': 1, 'void': 1}, {'neutral': 1, 'void': 2}],
+                         balance_sweep.grid({'void': [1, 2], 'neutral': [0, 1]}))
+        self.assertEqual(('type:5', ['VOID', 3]), balance_sweep.parseAxis('type:5=VOID,3'))
+
+    def testSweepCachesVariants(self):
+        variants = [{'void': 1}, {'void': 3}, {}]
+        sweep = balance_sweep.Sweep(games=3000, workers=2, batchSize=1000, cacheDir=self.dir)
+        results = sweep.run(variants)
+        # {} and void=1 are the same card_dict
+        self.assertEqual(2, sweep.simulated)
+        self.assertEqual(2, len(os.listdir(self.dir)))
+        self.assertEqual(results[0][2], results[2][2])
+        base, moreVoid = results[0][2], results[1][2]
+        self.assertEqual(3000, base['games'])
+        self.assertAlmostEqual(1, base['win_rate'] + base['loss_rate'])
+        self.assertGreater(moreVoid['mean_rounds'], base['mean_rounds'])
+        for strategy in base['strategies'].values():
+            self.assertTrue(0 <= strategy['round_win_rate'] <= 1)
+
+        again = balance_sweep.Sweep(games=3000, workers=2, batchSize=1000, cacheDir=self.dir)
+        self.assertEqual(results + results[1:2], again.run(variants + [{'void': 3}]))
+        self.assertEqual(0, again.simulated)
+        fresh = balance_sweep.Sweep(games=3000, workers=1, batchSize=1000, cacheDir=self.dir + '/fresh')
+        self.assertEqual(results[1][2], fresh.run([{'void': 3}])[0][2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import backend
+import batch
+import engine_eosf
+from engine_eosf import Account, Error
+from load_generator import playerNames
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(backend.select('engine'))
+        self.addCleanup(engine_eosf.isolate())
+        self.host = Account('host')
+
+    def _blockNum(self):
+        return self.host.push_action('login', {'username': 'blocks'}).json['processed']['block_num']
+
+    def testSplitByActions(self):
+        actions = batch.ActionBatch(self.host, maxActions=3)
+        for name in playerNames(7):
+            actions.add('login', Account(name))
+        transactions = actions.transactions()
+        self.assertEqual([3, 3, 1], [len(t) for t in transactions])
+        self.assertEqual(playerNames(7), [a['data']['username'] for t in transactions for a in t])
+        self.assertEqual('active', transactions[0][0]['authorization'][0]['permission'])
+
+    def testSplitBySize(self):
+        actions = batch.ActionBatch(self.host)
+        login = {'name': 'login', 'data': {'username': 'alice'}}
+        playcard = {'name': 'playcard', 'data': {'username': 'alice', 'player_card_idx': 1}}
+        self.assertEqual(batch.ACTION_OVERHEAD + 8, actions.actionSize(login))
+        self.assertEqual(batch.ACTION_OVERHEAD + 9, actions.actionSize(playcard))
+
+        perPlayer = 2 * (batch.ACTION_OVERHEAD + 8) + batch.SIGNATURE_BYTES
+        actions.maxBytes = batch.TRANSACTION_OVERHEAD + 3 * perPlayer
+        for name in playerNames(10):
+            actions.add('login', name)
+            actions.add('startgame', name)
+        self.assertEqual([6, 6, 6, 2], [len(t) for t in actions.transactions()])
+
+    def testSetupPlayers(self):
+        players = playerNames(1000)
+        first = self._blockNum()
+        batch.setupPlayers(self.host, [Account(name) for name in players], startGames=True)
+        # 2000 actions in 20 transactions, then one more login
+        self.assertEqual(first + 21, self._blockNum())
+        users = engine_eosf.engine().users
+        self.assertTrue(all(len(users[name]['game_data']['deck_player']) == 13 for name in players))
+
+    def testNonce(self):
+        actions = [{'account': 'host', 'name': 'login',
+                    'authorization': [{'actor': 'alice', 'permission': 'active'}],
+                    'data': {'username': 'alice'}}]
+        first, second = batch.transactionJson(actions), batch.transactionJson(actions)
+        self.assertEqual(first['actions'], second['actions'])
+        self.assertEqual('0000000000855c34', first['actions'][0]['data'])
+        nonce = first['context_free_actions'][0]
+        self.assertEqual(('eosio.null', 'nonce', []),
+                         (nonce['account'], nonce['name'], nonce['authorization']))
+        self.assertEqual(batch.NONCE_ACTION_BYTES - 18, len(bytes.fromhex(nonce['data'])))
+        # Identical batches are different transactions
+        self.assertNotEqual(nonce, second['context_free_actions'][0])
+
+    def testFailedTransactionIsAtomic(self):
+        actions = batch.ActionBatch(self.host, maxActions=2)
+        actions.add('login', 'alice')
+        actions.add('startgame', 'alice')
+        actions.add('login', 'bob')
+        actions.add('startgame', 'carol')
+        with self.assertRaises(Error):
+            actions.submit()
+        users = engine_eosf.engine().users
+        self.assertEqual(['alice'], [name for name in users if name != 'blocks'])
+        self.assertEqual(0, len(actions))
+        seed = dict(engine_eosf.engine().seed)
+
+        actions.maxActions = 3
+        actions.add('login', 'bob')
+        actions.add('startgame', 'bob')
+        actions.add('playcard', 'carol', player_card_idx=0)
+        with self.assertRaises(Error):
+            actions.submit()
+        self.assertEqual(seed, engine_eosf.engine().seed)
+        self.assertNotIn('bob', engine_eosf.engine().users)
+
+    def testAuthorization(self):
+        with self.assertRaises(Error):
+            batch.pushTransaction(self.host, [{
+                'account': 'host', 'name': 'login',
+                'authorization': [{'actor': 'bob', 'permission': 'active'}],
+                'data': {'username': 'alice'}}])
+        self.assertNotIn('alice', engine_eosf.engine().users)
+
+    def testContextManager(self):
+        with batch.ActionBatch(self.host) as actions:
+            actions.add('login', 'alice')
+        self.assertIn('alice', engine_eosf.engine().users)
+        with self.assertRaises(RuntimeError):
+            with batch.ActionBatch(self.host) as actions:
+                actions.add('login', 'bob')
+                raise RuntimeError()
+        self.assertNotIn('bob', engine_eosf.engine().users)
+
+
+if __name__ == '__main__':
+    unittest.main()
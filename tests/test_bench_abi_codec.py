@@ -0,0 +1,17 @@
+import unittest
+from bench_abi_codec import run
+
+
+class Test(unittest.TestCase):
+
+    def testRun(self):
+        # Timings are reported, not asserted: they depend on the machine
+        result = run(count=200, repeat=1)
+        self.assertEqual(200, result['users'])
+        self.assertEqual({'json', 'decode', 'read', 'lazy'}, set(result['seconds']))
+        self.assertEqual({'decode', 'read', 'lazy'}, set(result['speedup']))
+        self.assertTrue(all(speedup > 0 for speedup in result['speedup'].values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import backend
+import engine_eosf
+import session
+from bench_actions import ACTIONS, ActionProfiler, compare, compareRounds
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(backend.select('engine'))
+
+    def testProfilesEveryAction(self):
+        self.addCleanup(engine_eosf.isolate())
+        profiler = ActionProfiler(engine_eosf.Account('host'), measureRam=False)
+        for name in ('alice', 'bob', 'carol'):
+            profiler.playGame(engine_eosf.Account(name))
+
+        report = profiler.report()
+        self.assertEqual(set(ACTIONS) | {'game'}, set(report))
+        for action in ('login', 'startgame', 'endgame'):
+            self.assertEqual(3, report[action]['cpu_usage_us']['count'])
+        self.assertEqual(report['playcard']['wall_ms']['count'],
+                         report['nextround']['wall_ms']['count'] + 3)
+        self.assertEqual(0, report['login']['ram_bytes']['count'])
+        self.assertIn('p99', report['playcard']['net_usage_words'])
+        self.assertEqual(3, report['game']['transactions']['count'])
+        self.assertEqual(0, report['playround']['wall_ms']['count'])
+
+    def testPlayround(self):
+        self.addCleanup(engine_eosf.isolate())
+        profiler = ActionProfiler(engine_eosf.Account('host'), measureRam=False)
+        profiler.playGame(engine_eosf.Account('alice'))
+        profiler.playGame(engine_eosf.Account('bob'), playround=True)
+        report = profiler.report()
+        # One transaction and one read per round instead of two of each
+        playcards = report['playcard']['wall_ms']['count']
+        self.assertEqual([2 * playcards + 2, report['playround']['wall_ms']['count'] + 3],
+                         profiler.games['transactions'])
+        self.assertEqual([2 * playcards, report['playround']['wall_ms']['count'] + 1],
+                         profiler.games['reads'])
+
+    def testSingleSeedWrite(self):
+        profilers = []
+        for singleSeedWrite in (False, True):
+            # The same block times, so both modes play the same games
+            now = [1541212952]
+
+            def clock():
+                now[0] += 3
+                return now[0]
+
+            self.addCleanup(engine_eosf.isolate(clock=clock, single_seed_write=singleSeedWrite))
+            profiler = ActionProfiler(engine_eosf.Account('host'), measureRam=False)
+            for name in ('alice', 'bob', 'carol'):
+                profiler.playGame(engine_eosf.Account(name), playround=True)
+            profilers.append(profiler)
+        default, single = profilers
+        self.assertEqual(default.games['transactions'], single.games['transactions'])
+        self.assertEqual([8, 8], default.samples['startgame']['seed_writes'][1:])
+        self.assertEqual({1, 3}, set(default.samples['playround']['seed_writes']))
+        for action in ('startgame', 'playround'):
+            self.assertEqual({1}, set(single.samples[action]['seed_writes']))
+        self.assertEqual({0}, set(single.samples['login']['seed_writes']))
+        # One write for startgame and each playround, none for login and endgame
+        self.assertEqual([transactions - 2 for transactions in single.games['transactions']],
+                         single.games['seed_writes'])
+        for defaultWrites, singleWrites in zip(default.games['seed_writes'],
+                                               single.games['seed_writes']):
+            self.assertGreater(defaultWrites, 2 * singleWrites)
+
+    def testCompareRounds(self):
+        self.addCleanup(engine_eosf.isolate())
+        stream = io.StringIO()
+        with mock.patch.object(session, '_session', None):
+            results = compareRounds(5, measureRam=False, stream=stream)
+        self.assertFalse(results['rounds']['playround'])
+        self.assertTrue(results['playround']['playround'])
+        changes = {tuple(line.split()[:3]): line for line in stream.getvalue().splitlines()}
+        # Only what both runs push is compared, the games included
+        self.assertNotIn(('playcard', 'cpu_usage_us', 'p50:'), changes)
+        self.assertIn(('startgame', 'wall_ms', 'p50:'), changes)
+        for metric in ('transactions', 'reads'):
+            self.assertIn('(-', changes['game', metric, 'p50:'])
+
+    @unittest.skipUnless(backend.nodeAvailable(), 'needs eosfactory and a local node')
+    def testSingleSeedWriteOnNode(self):
+        # Each build runs in its own process, which boots its own node
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        env = dict(os.environ, **{backend.VARIABLE: 'node'})
+        cpu = []
+        for flags in ([], ['--single-seed-write']):
+            output = os.path.join(directory, 'bench.json')
+            subprocess.check_call([sys.executable, 'bench_actions.py', '-g', '10', '--no-ram',
+                                   '-o', output] + flags,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+            with open(output) as f:
+                cpu.append(json.load(f)['actions']['startgame']['cpu_usage_us']['p50'])
+        # Eight seed row writes in a startgame become one
+        self.assertLess(cpu[1], cpu[0])
+
+    def testCompare(self):
+        previous = {'actions': {'playcard': {'cpu_usage_us': {'p50': 100, 'p95': 200}}}}
+        current = {'actions': {'playcard': {'cpu_usage_us': {'p50': 150, 'p95': 200}}}}
+        stream = io.StringIO()
+        compare(previous, current, stream)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertIn('+50.0%', lines[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import threading
+import time
+import unittest
+import backend
+import block_wait
+import engine_eosf
+from batch import ActionBatch
+from block_wait import BlockTimeout, httpInfo, sync, track, waitFor, waitForBlock
+from chain_server import ChainServer
+from engine_eosf import Account, Permission
+
+
+def login(name):
+    return Account('host').push_action('login', {'username': name},
+                                       permission=(Account(name), Permission.ACTIVE))
+
+
+class CountingInfo:
+
+    def __init__(self, getInfo):
+        self.getInfo = getInfo
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.getInfo()
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(backend.select('engine'))
+        self.addCleanup(engine_eosf.isolate())
+
+    def testEngineNotifies(self):
+        timer = threading.Timer(0.05, login, ('alice',))
+        timer.start()
+        start = time.monotonic()
+        info = waitForBlock(1)
+        timer.join()
+        self.assertEqual(1, info['head_block_num'])
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(2, waitFor(login('bob'), irreversible=True)['head_block_num'])
+        with self.assertRaises(BlockTimeout):
+            waitForBlock(3, timeout=0.05)
+
+    def testPollsWithBackoff(self):
+        with ChainServer() as server:
+            getInfo = CountingInfo(httpInfo(server.url))
+
+            def pushes():
+                for name in ('alice', 'bob', 'carol'):
+                    time.sleep(0.04)
+                    login(name)
+
+            thread = threading.Thread(target=pushes)
+            thread.start()
+            info = waitForBlock(3, getInfo=getInfo)
+            thread.join()
+            self.assertEqual(3, info['head_block_num'])
+            # Polls back off from FIRST_DELAY instead of spinning
+            self.assertLess(getInfo.calls, 12)
+
+            getInfo.calls = 0
+            start = time.monotonic()
+            with self.assertRaises(BlockTimeout):
+                waitForBlock(4, irreversible=True, getInfo=getInfo, timeout=0.3)
+            self.assertLess(time.monotonic() - start, 0.5)
+            self.assertLessEqual(getInfo.calls, 8)
+            getInfo.getInfo.close()
+
+    def testTrackAndSync(self):
+        host = track(Account('host'))
+        self.assertIs(host, track(host))
+        host.push_action('login', {'username': 'alice'}, permission=(Account('alice'), Permission.ACTIVE))
+        self.assertEqual(1, host._lastBlock)
+        with ActionBatch(host) as batch:
+            batch.add('login', Account('bob'))
+            batch.add('login', Account('carol'))
+        self.assertEqual(2, host._lastBlock)
+
+        getInfo = CountingInfo(engine_eosf.get_info)
+        sync(host, getInfo=getInfo)
+        sync(host, getInfo=getInfo)
+        self.assertEqual(1, getInfo.calls)
+        sync(host, irreversible=True, getInfo=getInfo)
+        self.assertEqual(2, getInfo.calls)
+        # Untracked accounts have nothing to wait for
+        sync(Account('alice'), getInfo=getInfo)
+        self.assertEqual(2, getInfo.calls)
+        # Pushes made around the account's methods
+        result = login('dave')
+        self.assertIs(result, block_wait.record(host, result))
+        self.assertEqual(3, host._lastBlock)
+        sync(host, getInfo=getInfo)
+        self.assertEqual(3, getInfo.calls)
+
+    def testSyncAfterReset(self):
+        host = track(Account('host'))
+        for name in ('alice', 'bob', 'carol'):
+            host.push_action('login', {'username': name}, permission=(Account(name), Permission.ACTIVE))
+        sync(host)
+        # A new chain starts over at block 1: the last push is waited
+        # for, not the highest block ever seen
+        self.addCleanup(engine_eosf.isolate())
+        host.push_action('login', {'username': 'dave'}, permission=(Account('dave'), Permission.ACTIVE))
+        self.assertEqual(1, host._lastBlock)
+        sync(host, timeout=0.5)
+        self.assertEqual({block_wait.HEAD: 1}, host._syncedBlocks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+import build_cache
+
+
+class FakeContract:
+
+    def __init__(self, buildDir):
+        self.buildDir = buildDir
+        self.builds = 0
+        self.defines = []
+
+    def build(self, force=True):
+        self.builds += 1
+        with open(os.path.join(os.path.dirname(self.buildDir), build_cache.DEFINES_FILE)) as f:
+            self.defines.append(f.read())
+        os.makedirs(self.buildDir, exist_ok=True)
+        for artifact in build_cache.ARTIFACTS:
+            with open(os.path.join(self.buildDir, artifact), 'w') as f:
+                f.write('{} {}'.format(artifact, self.builds))
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.workspace, 'src'))
+        self._write('src/cardgame.cpp', '#include "cardgame.hpp"\n')
+        self._write('src/cardgame.hpp', '#pragma once\n')
+        self._write('src/logger.hpp', '#pragma once\n')
+        self._write(build_cache.DEFINES_FILE, '#pragma once\n')
+        self.contract = FakeContract(os.path.join(self.workspace, 'build'))
+
+    def tearDown(self):
+        shutil.rmtree(self.workspace)
+
+    def _write(self, path, content):
+        with open(os.path.join(self.workspace, path), 'w') as f:
+            f.write(content)
+
+    def _build(self):
+        return build_cache.build(self.contract, self.workspace)
+
+    def testHitAfterBuild(self):
+        self.assertFalse(self._build())
+        self.assertTrue(self._build())
+        self.assertEqual(1, self.contract.builds)
+
+        history = build_cache.BuildCache(self.workspace).load()['history']
+        self.assertEqual([False, True], [entry['hit'] for entry in history])
+
+    def testMissOnSourceChange(self):
+        self._build()
+        self._write('src/cardgame.cpp', '#include "cardgame.hpp"\n#define INFO\n')
+        self.assertFalse(self._build())
+        self._write('src/logger.hpp', '#pragma once\n#define DEBUG\n')
+        self.assertFalse(self._build())
+        self.assertEqual(3, self.contract.builds)
+
+    def testMissOnMissingOrChangedArtifact(self):
+        self._build()
+        os.remove(os.path.join(self.workspace, 'build', 'cardgame.wasm'))
+        self.assertFalse(self._build())
+        self._write('build/cardgame.abi', '{}')
+        self.assertFalse(self._build())
+        self.assertTrue(self._build())
+
+    def testDefines(self):
+        self._build()
+        self.assertFalse(build_cache.build(self.contract, self.workspace, ['SINGLE_SEED_WRITE']))
+        self.assertTrue(build_cache.build(self.contract, self.workspace, ['SINGLE_SEED_WRITE']))
+        self.assertFalse(self._build())
+        self.assertEqual(['#pragma once\n', '#pragma once\n#define SINGLE_SEED_WRITE\n',
+                          '#pragma once\n'], self.contract.defines)
+        # The file is put back after the build
+        with open(os.path.join(self.workspace, build_cache.DEFINES_FILE)) as f:
+            self.assertEqual('#pragma once\n', f.read())
+        history = build_cache.BuildCache(self.workspace).load()['history']
+        self.assertEqual([[], ['SINGLE_SEED_WRITE'], ['SINGLE_SEED_WRITE'], []],
+                         [entry['defines'] for entry in history])
+        with self.assertRaises(ValueError):
+            build_cache.build(self.contract, self.workspace, ['-DSINGLE_SEED_WRITE'])
+
+    def testIsCurrent(self):
+        cache = build_cache.BuildCache(self.workspace)
+        self.assertFalse(cache.isCurrent())
+        self._build()
+        self.assertTrue(cache.isCurrent())
+        build_cache.build(self.contract, self.workspace, ['SINGLE_SEED_WRITE'])
+        self.assertFalse(cache.isCurrent())
+        self._build()
+        self._write('src/cardgame.cpp', '#include "cardgame.hpp"\n#define INFO\n')
+        self.assertFalse(cache.isCurrent())
+
+    def testMissingActions(self):
+        self._write('src/cardgame.cpp', 'EOSIO_ABI(cardgame, (login)(playcard) (playround))\n')
+        self.assertEqual(['login', 'playcard', 'playround'], build_cache.sourceActions(self.workspace))
+        self.assertEqual(['login', 'playcard', 'playround'], build_cache.missingActions(self.workspace))
+        os.makedirs(os.path.join(self.workspace, 'build'))
+        self._write('build/cardgame.abi', '{"actions": [{"name": "login"}, {"name": "playcard"}]}')
+        self.assertEqual(['playround'], build_cache.missingActions(self.workspace))
+
+    def testDebugDefined(self):
+        self.assertFalse(build_cache.debugDefined(build_cache.sources(self.workspace)))
+        self._write('src/logger.hpp', '#pragma once\n#define DEBUG\n')
+        self.assertTrue(build_cache.debugDefined(build_cache.sources(self.workspace)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+import http.client
+import json
+import time
+import types
+import unittest
+import abi_codec
+import backend
+import engine_eosf
+import tables
+from chain_server import ChainServer, packTransaction, unpackTransaction
+from engine_eosf import Account, Permission
+
+
+def action(name, actor, **data):
+    data['username'] = actor
+    return {'account': 'host', 'name': name, 'data': data,
+            'authorization': [{'actor': actor, 'permission': 'active'}]}
+
+
+class HttpHost:
+    '''The table reads of an eosfactory account, over the chain API.
+    '''
+
+    def __init__(self, call):
+        self.call = call
+
+    def table(self, table_name, scope, binary=False, limit=10, lower=''):
+        _, response = self.call('get_table_rows', {
+            'code': 'host', 'scope': scope, 'table': table_name, 'json': not binary,
+            'lower_bound': lower, 'limit': limit})
+        return types.SimpleNamespace(json=response)
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ChainServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.addCleanup(backend.select('engine'))
+        self.addCleanup(engine_eosf.isolate())
+        self.now = 1541212952
+        engine_eosf.engine().clock = lambda: self.now
+        self.connection = http.client.HTTPConnection('127.0.0.1', self.server.port)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def _call(self, endpoint, body=None):
+        self.connection.request('POST', '/v1/chain/' + endpoint,
+                                json.dumps(body) if body is not None else '')
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read().decode())
+
+    def _push(self, *actions):
+        return self._call('push_transaction', {'signatures': [], 'compression': 'none',
+                                               'transaction': {'actions': list(actions)}})
+
+    def testPushTransaction(self):
+        status, response = self._push(action('login', 'alice'), action('startgame', 'alice'))
+        self.assertEqual(200, status)
+        processed = response['processed']
+        self.assertEqual(1, processed['block_num'])
+        self.assertEqual('2018-11-03T02:42:32.000', processed['block_time'])
+        self.assertEqual(['login', 'startgame'], [trace['act']['name']
+                                                   for trace in processed['action_traces']])
+        self.assertEqual(4, sum(1 for card in engine_eosf.engine().users['alice']
+                                ['game_data']['hand_player'] if card))
+
+        # json arguments go through the ABI
+        status, _ = self._push(action('playcard', 'alice', player_card_idx='1'))
+        self.assertEqual(200, status)
+        self.assertNotEqual(0, engine_eosf.engine().users['alice']['game_data']['selected_card_player'])
+
+        status, response = self._push(action('playcard', 'alice', player_card_idx=2))
+        self.assertEqual(500, status)
+        self.assertEqual('eosio_assert_message_exception', response['error']['name'])
+        self.assertIn('You have already selected a card', response['error']['details'][0]['message'])
+
+        missing = action('nextround', 'alice')
+        missing['authorization'][0]['actor'] = 'bob'
+        status, response = self._push(action('login', 'bob'), missing)
+        self.assertEqual(500, status)
+        self.assertEqual(3090004, response['error']['code'])
+        self.assertNotIn('bob', engine_eosf.engine().users)
+
+        status, response = self._push(dict(action('login', 'carol'), account='eosio'))
+        self.assertEqual('action_validate_exception', response['error']['name'])
+        status, response = self._call('push_transaction', {'transaction': {}})
+        self.assertEqual(400, status)
+
+    def testPackedTransaction(self):
+        actions = [action('login', 'alice'), action('startgame', 'alice'),
+                   action('playcard', 'alice', player_card_idx=3)]
+        packed = packTransaction(actions, expiration=1541213000, refBlockNum=7)
+        unpacked = unpackTransaction(packed)
+        self.assertEqual([a['name'] for a in actions], [a['name'] for a in unpacked])
+        self.assertEqual(actions[2]['authorization'], unpacked[2]['authorization'])
+        self.assertEqual(actions[2]['data'], abi_codec.abi().decodeJson('playcard', unpacked[2]['data']))
+
+        status, response = self._call('push_transaction', {
+            'signatures': ['SIG_K1_unchecked'], 'compression': 'none',
+            'packed_context_free_data': '', 'packed_trx': packed.hex()})
+        self.assertEqual(200, status)
+        self.assertEqual(3, len(response['processed']['action_traces']))
+        self.assertEqual(0, engine_eosf.engine().users['alice']['game_data']['hand_player'][3])
+
+    def testGetTableRows(self):
+        players = ['player{}'.format(i) for i in range(1, 6)]
+        for player in players:
+            self.assertEqual(200, self._push(action('login', player), action('startgame', player))[0])
+        query = {'code': 'host', 'scope': 'host', 'table': 'users', 'json': True, 'limit': 2}
+        status, response = self._call('get_table_rows', query)
+        self.assertEqual(200, status)
+        self.assertEqual(['player1', 'player2'], [row['name'] for row in response['rows']])
+        self.assertTrue(response['more'])
+        status, response = self._call('get_table_rows', dict(query, lower_bound=response['next_key']))
+        self.assertEqual(['player3', 'player4'], [row['name'] for row in response['rows']])
+
+        status, response = self._call('get_table_rows', dict(
+            query, lower_bound='player2', upper_bound='player4', limit=10))
+        self.assertEqual(['player2', 'player3'], [row['name'] for row in response['rows']])
+        self.assertFalse(response['more'])
+        self.assertEqual('', response['next_key'])
+
+        # nodeos defaults to json=false
+        status, response = self._call('get_table_rows', {'code': 'host', 'scope': 'host',
+                                                         'table': 'seed'})
+        self.assertEqual(engine_eosf.engine().seed['value'],
+                         abi_codec.abi().decodeJson('seed', response['rows'][0])['value'])
+        binary = Account('host').table('users', 'host', binary=True, limit=10).json['rows']
+        status, response = self._call('get_table_rows', dict(query, json=False, limit=10))
+        self.assertEqual(binary, response['rows'])
+
+        status, response = self._call('get_table_rows', dict(query, table='games'))
+        self.assertEqual('contract_table_query_exception', response['error']['name'])
+        status, response = self._call('get_table_rows', dict(query, scope='other'))
+        self.assertEqual([], response['rows'])
+
+    def testTablesPaging(self):
+        names = ['user' + c for c in '12345ab']
+        for name in names:
+            Account('host').push_action('login', {'username': name})
+
+        rows = list(tables.iterRows(HttpHost(self._call), 'users', scope='host', pageSize=3))
+        self.assertEqual(names, [row['name'] for row in rows])
+
+    def testInfoAndAccounts(self):
+        status, info = self._call('get_info')
+        self.assertEqual(200, status)
+        self.assertEqual(0, info['head_block_num'])
+        self._push(action('login', 'alice'))
+        self.connection.request('GET', '/v1/chain/get_info')
+        info = json.loads(self.connection.getresponse().read().decode())
+        self.assertEqual(1, info['head_block_num'])
+        self.assertEqual('2018-11-03T02:42:32.000', info['head_block_time'])
+
+        for name in ('host', 'eosio', 'alice'):
+            status, account = self._call('get_account', {'account_name': name})
+            self.assertEqual(200, status)
+            self.assertEqual(name, account['account_name'])
+            self.assertEqual(['active', 'owner'], [p['perm_name'] for p in account['permissions']])
+        status, account = self._call('get_account', {'account_name': 'nobody'})
+        self.assertEqual(500, status)
+        self.assertEqual('account_query_exception', account['error']['name'])
+
+        status, response = self._call('get_block', {'block_num_or_id': 1})
+        self.assertEqual(404, status)
+
+    def testEngineBackendSharesState(self):
+        Account('host').push_action('login', {'username': 'alice'},
+                                    permission=(Account('alice'), Permission.ACTIVE))
+        status, response = self._call('get_table_rows', {
+            'code': 'host', 'scope': 'host', 'table': 'users', 'json': True})
+        self.assertEqual(['alice'], [row['name'] for row in response['rows']])
+
+    def testPipelinedRequests(self):
+        body = json.dumps({'transaction': {'actions': [action('login', 'alice')]}}).encode()
+        request = ('POST /v1/chain/push_transaction HTTP/1.1\r\nHost: x\r\nContent-Length: {}'
+                   '\r\n\r\n'.format(len(body))).encode() + body
+        self.connection.connect()
+        self.connection.sock.sendall(request * 50)
+        start = time.time()
+        received = b''
+        while received.count(b'HTTP/1.1 200') < 50 and time.time() - start < 10:
+            received += self.connection.sock.recv(65536)
+        self.assertEqual(50, received.count(b'HTTP/1.1 200'))
+        self.assertEqual(50, engine_eosf._blockNum)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,11 @@
 import unittest
 import sys
-from eosfactory.eosf import *
+from backend import *
 from base_test import BaseTest
+import session
 
 verbosity([Verbosity.INFO, Verbosity.OUT])
 
-CONTRACT_WORKSPACE = sys.path[0] + "/../"
-
 
 class Test(BaseTest):
 
@@ -18,36 +17,7 @@ class Test(BaseTest):
         SCENARIO('''
         Test endgame action
         ''')
-        reset()
-        create_wallet()
-        create_master_account("master")
-
-        COMMENT('''
-        Build and deploy the contract:
-        ''')
-        create_account("host", master)
-        contract = Contract(host, CONTRACT_WORKSPACE)
-        contract.build(force=True)
-        contract.deploy()
-
-        COMMENT('''
-        Create test accounts:
-        ''')
-        create_account("alice", master)
-        create_account("carol", master)
-        create_account("bob", master)
-
-        host.push_action(
-            "login", {"username": alice}, permission=(alice, Permission.ACTIVE), forceUnique=1)
-
-        host.push_action(
-            "login", {"username": bob}, permission=(bob, Permission.ACTIVE), forceUnique=1)
-
-        host.push_action(
-            "startgame", {"username": alice}, permission=(alice, Permission.ACTIVE), forceUnique=1)
-
-        host.push_action(
-            "startgame", {"username": bob}, permission=(bob, Permission.ACTIVE), forceUnique=1)
+        cls.session = session.startFixture(globals(), 'games_started')
 
     def setUp(self):
         pass
@@ -60,8 +30,7 @@ class Test(BaseTest):
         host.push_action(
             "endgame", {"username": alice}, permission=(alice, Permission.ACTIVE), forceUnique=1)
 
-        table = host.table('users', host)
-        user = self._validateUserExists(table.json['rows'], alice.name)
+        user = self._validateUserExists(alice.name)
         self._validateUser(user, alice.name)
         self._validateGameData(self._baseGameData(), user['game_data'])
 
@@ -88,7 +57,7 @@ class Test(BaseTest):
 
     @classmethod
     def tearDownClass(cls):
-        stop()
+        pass
 
 
 if __name__ == "__main__":
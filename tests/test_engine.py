@@ -0,0 +1,208 @@
+import random
+import unittest
+from cardgame_engine import *
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000
+        self.game = CardGame(clock=lambda: self.now)
+
+    def testRandomAdvancesSeedRow(self):
+        self.assertEqual(1001 % 17, self.game.random(17))
+        self.assertEqual({'key': 1, 'value': 1001}, self.game.seed)
+        self.assertEqual(2001 % 3, self.game.random(3))
+        self.assertEqual(2001, self.game.seed['value'])
+
+    def testRandomWrapsAtPrime(self):
+        self.game.seed = {'key': 1, 'value': 65000}
+        self.now = 600
+        self.assertEqual((65600 % SEED_PRIME) % 10, self.game.random(10))
+
+    def testDrawOneCard(self):
+        deck = FULL_DECK.copy()
+        hand = [3, 0, 0, 0]
+        self.game.draw_one_card(deck, hand)
+        self.assertEqual([3, 1001 % 17 + 1, 0, 0], hand)
+        self.assertEqual(16, len(deck))
+        self.assertNotIn(hand[1], deck)
+
+    def testDrawOneCardFullHand(self):
+        with self.assertRaises(Error):
+            self.game.draw_one_card(FULL_DECK.copy(), [1, 2, 3, 4])
+
+    def testCalculateAttackPoint(self):
+        self.assertEqual(2, calculate_attack_point(1, 6))
+        self.assertEqual(1, calculate_attack_point(6, 1))
+        self.assertEqual(3, calculate_attack_point(8, 11))
+        self.assertEqual(4, calculate_attack_point(15, 5))
+        self.assertEqual(3, calculate_attack_point(16, 5))
+        self.assertEqual(0, calculate_attack_point(17, 5))
+
+    def testCalculateAiCardScore(self):
+        hand = [6, 11, 0, 16]
+        self.assertEqual(3 - 2 - 2, calculate_ai_card_score(0, 5, 1, hand))
+        self.assertEqual(1 - 4 - 4, calculate_ai_card_score(1, 5, 1, hand))
+        self.assertEqual(1 - 1 - 2, calculate_ai_card_score(2, 5, 1, hand))
+        self.assertEqual(1 + 0 + 0, calculate_ai_card_score(3, 1, 1, hand))
+
+    def testAiChoosesFirstBestCard(self):
+        gameData = new_game()
+        gameData['hand_ai'] = [0, 1, 2, 6]
+        gameData['hand_player'] = [6, 0, 0, 0]
+        self.assertEqual(1, choose_ai_card_idx(0, gameData))
+
+    def testResolveSelectedCards(self):
+        gameData = new_game()
+        gameData['selected_card_ai'] = 15
+        gameData['selected_card_player'] = 5
+        resolve_selected_cards(gameData)
+        self.assertEqual(1, gameData['life_lost_player'])
+        self.assertEqual(4, gameData['life_player'])
+        self.assertEqual(5, gameData['life_ai'])
+
+        gameData = new_game()
+        gameData['selected_card_ai'] = 1
+        gameData['selected_card_player'] = 2
+        resolve_selected_cards(gameData)
+        self.assertEqual(0, gameData['life_lost_ai'])
+        self.assertEqual(5, gameData['life_ai'])
+
+        gameData = new_game()
+        gameData['selected_card_ai'] = 17
+        gameData['selected_card_player'] = 5
+        resolve_selected_cards(gameData)
+        self.assertEqual(new_game(), dict(gameData, selected_card_ai=0, selected_card_player=0))
+
+    def testUpdateGameStatus(self):
+        user = new_user('alice')
+        user['game_data']['life_ai'] = 0
+        update_game_status(user)
+        self.assertEqual(PLAYER_WON, user['game_data']['status'])
+        self.assertEqual(1, user['win_count'])
+
+        user = new_user('alice')
+        user['game_data']['deck_player'] = []
+        user['game_data']['life_ai'] = 3
+        user['game_data']['life_player'] = 2
+        update_game_status(user)
+        self.assertEqual(PLAYER_LOST, user['game_data']['status'])
+        self.assertEqual(1, user['loss_count'])
+
+    def testFullGame(self):
+        self.game.login('alice')
+        self.game.startgame('alice')
+        rounds = 0
+        while self.game.users['alice']['game_data']['status'] == ONGOING:
+            self.now += 1
+            hand = self.game.users['alice']['game_data']['hand_player']
+            self.game.playcard('alice', next(
+                i for i, cardId in enumerate(hand) if cardId))
+            if self.game.users['alice']['game_data']['status'] != ONGOING:
+                break
+            self.now += 1
+            self.game.nextround('alice')
+            rounds += 1
+        user = self.game.users['alice']
+        self.assertLessEqual(rounds, 17)
+        self.assertEqual(1, user['win_count'] + user['loss_count'])
+
+    def testPlayroundMatchesTwoStep(self):
+        rng = random.Random(1)
+        twoStep = CardGame(clock=lambda: self.now)
+        for game in (self.game, twoStep):
+            game.login('alice')
+        for _ in range(30):
+            self.now += rng.randrange(1, 100)
+            for game in (self.game, twoStep):
+                game.startgame('alice')
+            while twoStep.users['alice']['game_data']['status'] == ONGOING:
+                self.now += rng.randrange(1, 5)
+                hand = twoStep.users['alice']['game_data']['hand_player']
+                cardIdx = rng.choice([i for i, cardId in enumerate(hand) if cardId])
+                # Both halves in the same block
+                twoStep.playcard('alice', cardIdx)
+                if twoStep.users['alice']['game_data']['status'] == ONGOING:
+                    twoStep.nextround('alice')
+                self.game.playround('alice', cardIdx)
+                self.assertEqual(twoStep.users, self.game.users)
+                self.assertEqual(twoStep.seed, self.game.seed)
+            # The last round leaves its cards selected, as playcard does
+            self.assertNotEqual(0, self.game.users['alice']['game_data']['selected_card_player'])
+        user = self.game.users['alice']
+        self.assertEqual(30, user['win_count'] + user['loss_count'])
+
+        self.game.startgame('alice')
+        self.game.playcard('alice', 0)
+        with self.assertRaises(Error):
+            self.game.playround('alice', 1)
+        self.game.nextround('alice')
+        with self.assertRaises(Error):
+            self.game.playround('alice', HAND_SIZE)
+        with self.assertRaises(MissingRequiredAuthorityError):
+            self.game.playround('alice', 0, authorizer='bob')
+
+    def testSingleSeedWrite(self):
+        rng = random.Random(2)
+        single = CardGame(clock=lambda: self.now, single_seed_write=True)
+        games = (self.game, single)
+        draws = ({}, {})
+        writes = ({}, {})
+
+        def apply(action, *args):
+            for game, gameWrites in zip(games, writes):
+                before = game.seed_writes
+                getattr(game, action)('alice', *args)
+                gameWrites.setdefault(action, set()).add(game.seed_writes - before)
+            self.assertEqual(self.game.users, single.users)
+            self.assertEqual(self.game.seed, single.seed)
+
+        apply('login')
+        for _ in range(200):
+            self.now += rng.randrange(1, 100)
+            apply('startgame')
+            for game, counts in zip(games, draws):
+                for cardId in game.users['alice']['game_data']['hand_player']:
+                    counts[cardId] = counts.get(cardId, 0) + 1
+            while self.game.users['alice']['game_data']['status'] == ONGOING:
+                self.now += rng.randrange(1, 5)
+                hand = self.game.users['alice']['game_data']['hand_player']
+                apply('playround', rng.choice([i for i, cardId in enumerate(hand) if cardId]))
+            apply('endgame')
+
+        # The same draws, from one seed write per action instead of one per draw
+        self.assertEqual(draws[0], draws[1])
+        self.assertEqual(set(FULL_DECK), set(draws[0]))
+        self.assertEqual({'login': {0}, 'startgame': {8, 9}, 'playround': {1, 3},
+                          'endgame': {0}}, writes[0])
+        self.assertEqual({'login': {0}, 'startgame': {1}, 'playround': {1},
+                          'endgame': {0}}, writes[1])
+
+        single.startgame('alice')
+        single.playcard('alice', 0)
+        seed = dict(single.seed)
+        with self.assertRaises(Error):
+            single.playround('alice', 1)
+        self.assertEqual(seed, single.seed)
+        self.assertIsNone(single._seedValue)
+
+    def testFailedActionLeavesStateUntouched(self):
+        self.game.login('alice')
+        self.game.startgame('alice')
+        before = self.game.rows('users'), self.game.rows('seed')
+        with self.assertRaises(Error):
+            self.game.nextround('alice')
+        with self.assertRaises(MissingRequiredAuthorityError):
+            self.game.playcard('alice', 0, authorizer='bob')
+        self.assertEqual(before, (self.game.rows('users'), self.game.rows('seed')))
+
+    def testNameEncoding(self):
+        self.assertEqual(3773036822876127232, name_to_uint64('alice'))
+        self.assertEqual('alice', uint64_to_name(3773036822876127232))
+        self.assertEqual('eosio.token', uint64_to_name(
+            name_to_uint64('eosio.token')))
+
+
+if __name__ == "__main__":
+    unittest.main()
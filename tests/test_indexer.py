@@ -0,0 +1,161 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+import abi_codec
+import action_log
+import engine_eosf
+from cardgame_engine import ONGOING, PLAYER_WON, new_user
+from chain_server import ChainServer
+from engine_eosf import Account, Permission
+from indexer import HttpHost, Indexer
+from load_generator import playerNames
+
+
+def playGame(game, name, rng):
+    game.startgame(name)
+    while game.users[name]['game_data']['status'] == ONGOING:
+        hand = game.users[name]['game_data']['hand_player']
+        game.playround(name, rng.choice([i for i, cardId in enumerate(hand) if cardId]))
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.indexer = Indexer(os.path.join(self.dir, 'users.sqlite'))
+        self.addCleanup(engine_eosf.isolate())
+        self.now = [1541212952]
+        self.game = engine_eosf.engine()
+        self.game.clock = lambda: self.now[0]
+        self.rng = random.Random(1)
+        self.names = playerNames(40)
+        for name in self.names:
+            self.game.login(name)
+            for _ in range(self.rng.randint(0, 3)):
+                self.now[0] += 7
+                playGame(self.game, name, self.rng)
+
+    def tearDown(self):
+        self.indexer.close()
+        shutil.rmtree(self.dir)
+
+    def _expectedLeaderboard(self, limit):
+        users = sorted(self.game.users.values(), key=lambda user: (-user['win_count'], user['name']))
+        return [(user['name'], user['win_count'], user['loss_count']) for user in users[:limit]]
+
+    def testPoll(self):
+        host = Account('host')
+        self.assertEqual(40, self.indexer.poll(host, pageSize=7))
+        self.assertEqual(self._expectedLeaderboard(10), self.indexer.leaderboard(10))
+        self.assertEqual(sum(1 for user in self.game.users.values()
+                             if user['game_data']['status'] == PLAYER_WON),
+                         self.indexer.count(PLAYER_WON))
+        self.assertEqual(('', 1), self.indexer.checkpoint('table:host/host'))
+
+        # Only the rows that changed are written
+        self.assertEqual(0, self.indexer.poll(host, pageSize=7))
+        self.now[0] += 7
+        playGame(self.game, self.names[5], self.rng)
+        self.game.login('newplayer')
+        self.assertEqual(2, self.indexer.poll(host, pageSize=7))
+        self.assertEqual(41, self.indexer.count())
+        user = self.game.users[self.names[5]]
+        self.assertEqual({'name': user['name'], 'win_count': user['win_count'],
+                          'loss_count': user['loss_count'], 'status': user['game_data']['status'],
+                          'life_player': user['game_data']['life_player'],
+                          'life_ai': user['game_data']['life_ai']},
+                         self.indexer.player(self.names[5]))
+        self.assertIsNone(self.indexer.player('nobody'))
+        by = self.indexer.leaderboard(3, by='loss_count')
+        self.assertEqual(sorted(by, key=lambda row: (-row[2], row[0])), by)
+        with self.assertRaises(ValueError):
+            self.indexer.leaderboard(by='name')
+
+    def testPollResumes(self):
+        host = Account('host')
+        self.assertEqual(12, self.indexer.poll(host, pageSize=4, pages=3))
+        lower, passes = self.indexer.checkpoint('table:host/host')
+        self.assertEqual(0, passes)
+        self.assertEqual(self.game.range('users', limit=12)[0][-1]['name'],
+                         max(row[0] for row in self.indexer.db.execute('SELECT name FROM users')))
+        # A new indexer on the same database picks the pass up at lower
+        self.indexer.close()
+        self.indexer = Indexer(os.path.join(self.dir, 'users.sqlite'))
+        self.assertEqual(28, self.indexer.poll(host, pageSize=4))
+        self.assertEqual(('', 1), self.indexer.checkpoint('table:host/host'))
+        self.assertNotEqual('', lower)
+
+    def testHttpHost(self):
+        with ChainServer() as server:
+            host = HttpHost(server.url)
+            self.assertEqual(40, self.indexer.poll(host, pageSize=9))
+            host.close()
+        self.assertEqual(self._expectedLeaderboard(40), self.indexer.leaderboard(40))
+
+    def testFollow(self):
+        path = os.path.join(self.dir, 'actions.log')
+        log = action_log.ActionLog(path)
+        recorder = action_log.Recorder(Account('host'), log)
+
+        def push(action, name, **data):
+            data['username'] = name
+            self.now[0] += 3
+            try:
+                recorder.push_action(action, data, permission=(name, Permission.ACTIVE))
+            except engine_eosf.Error:
+                pass
+
+        for name in ('alice', 'bob'):
+            push('login', name)
+            push('startgame', name)
+            push('nextround', name)
+        log.file.flush()
+        self.assertEqual(2, self.indexer.follow(path))
+        self.assertEqual(0, self.indexer.follow(path))
+
+        # A record half written is left for the next call
+        record = action_log.Record('login', 'carol', 'carol',
+                                   user_after=bytes.fromhex(abi_codec.abi().encodeRow(
+                                       'users', new_user('carol')))).pack()
+        log.file.write(record[:20])
+        log.file.flush()
+        self.assertEqual(0, self.indexer.follow(path))
+        log.file.write(record[20:])
+        push('playround', 'alice', player_card_idx=0)
+        log.close()
+        self.assertEqual(2, self.indexer.follow(path))
+        self.assertEqual(['alice', 'bob', 'carol'],
+                         sorted(row[0] for row in self.indexer.leaderboard(10)))
+        alice = self.game.users['alice']['game_data']
+        self.assertEqual(alice['life_ai'], self.indexer.player('alice')['life_ai'])
+
+    def testLeaderboardUsesIndex(self):
+        codec = abi_codec.abi()
+        rows = []
+        for i, name in enumerate(playerNames(20000)):
+            user = new_user(name)
+            user['win_count'] = i * 7919 % 1000
+            user['loss_count'] = i % 313
+            rows.append(bytes.fromhex(codec.encodeRow('users', user)))
+        with self.indexer.db:
+            for start in range(0, len(rows), 500):
+                self.indexer._upsert(rows[start:start + 500])
+        for by in ('win_count', 'loss_count'):
+            plan = ' '.join(str(row) for row in self.indexer.db.execute(
+                'EXPLAIN QUERY PLAN SELECT name, win_count, loss_count FROM users '
+                'ORDER BY {} DESC, name LIMIT 10'.format(by)))
+            self.assertIn('users_' + by, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+            start = time.perf_counter()
+            top = self.indexer.leaderboard(10, by)
+            self.assertLess(time.perf_counter() - start, 0.05)
+            self.assertEqual(999 if by == 'win_count' else 312, top[0][1 if by == 'win_count' else 2])
+        self.assertIn('users_status', ' '.join(str(row) for row in self.indexer.db.execute(
+            'EXPLAIN QUERY PLAN SELECT COUNT(*) FROM users WHERE status = 1')))
+
+
+if __name__ == '__main__':
+    unittest.main()
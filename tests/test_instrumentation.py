@@ -0,0 +1,121 @@
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import backend
+import engine_eosf
+import instrumentation
+import stats
+from engine_eosf import Account, Error, Permission
+from instrumentation import Collector, Histogram
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(backend.select('engine'))
+        self.addCleanup(engine_eosf.isolate())
+        self.dir = tempfile.mkdtemp()
+        self.env = os.environ.get(instrumentation.ENV)
+        os.environ[instrumentation.ENV] = os.path.join(self.dir, 'report.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        if self.env is None:
+            del os.environ[instrumentation.ENV]
+        else:
+            os.environ[instrumentation.ENV] = self.env
+
+    def testHistogramPercentiles(self):
+        rng = random.Random(7)
+        values = [int(rng.lognormvariate(8, 1.5)) for _ in range(20000)]
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value)
+        self.assertEqual(len(values), histogram.count)
+        self.assertEqual(sum(values), histogram.total)
+        self.assertEqual(max(values), histogram.percentile(100))
+        for p in (1, 50, 90, 99, 99.9):
+            exact = stats.percentile(values, p)
+            self.assertLessEqual(abs(histogram.percentile(p) - exact), exact / 64.0)
+        self.assertLess(len(histogram.counts), 1000)
+
+        small = Histogram()
+        for value in (3, 1, 2):
+            small.record(value)
+        self.assertEqual(2, small.percentile(50))
+        self.assertIsNone(Histogram().percentile(50))
+
+    def testHistogramMergeAndJson(self):
+        values = list(range(0, 100000, 7))
+        whole, first, second = Histogram(), Histogram(), Histogram()
+        for i, value in enumerate(values):
+            whole.record(value)
+            (first if i % 2 else second).record(value)
+        merged = Histogram.fromJson(json.loads(json.dumps(first.toJson()))).merge(second)
+        self.assertEqual(whole.toJson(), merged.toJson())
+
+    def testInstrumentAccount(self):
+        collector = Collector()
+        host = instrumentation.instrument(Account('host'), collector)
+        self.assertIs(host, instrumentation.instrument(host, collector))
+        with collector.test('login and read'):
+            host.push_action('login', {'username': Account('alice')},
+                             permission=(Account('alice'), Permission.ACTIVE))
+            rows = host.table('users', host, limit=5).json['rows']
+            host.push_transaction([{'name': 'startgame', 'data': {'username': 'alice'},
+                                    'authorization': [{'actor': 'alice', 'permission': 'active'}]}])
+        with self.assertRaises(Error):
+            host.push_action('login', {'username': 'bob'}, permission=('alice', Permission.ACTIVE))
+
+        self.assertEqual(1, len(rows))
+        login = collector.histograms['push_action']['login']
+        self.assertEqual(2, login['wall_us'].count)
+        self.assertEqual(1, login['execute_us'].count)
+        self.assertEqual(len('{"username": "alice"}'), login['payload_bytes'].max)
+        self.assertIn(login['execute_us'].total + login['client_us'].total,
+                      (login['wall_us'].min, login['wall_us'].max))
+        users = collector.histograms['table']['users']
+        self.assertEqual(1, users['rows'].max)
+        self.assertIn('startgame', collector.histograms['push_transaction'])
+        self.assertEqual({'push_action/login': 1}, collector.failures)
+        test = collector.tests[0]
+        self.assertEqual(('login and read', 1, 1, 1), (
+            test['test'], test['push_actions'], test['tables'], test['push_transactions']))
+        self.assertGreaterEqual(test['wall_us'], test['push_action_us'] + test['table_us'])
+
+    def testDisabled(self):
+        os.environ[instrumentation.ENV] = '0'
+        host = Account('host')
+        self.assertIs(host, instrumentation.instrument(host))
+        self.assertNotIn('push_action', vars(host))
+        with instrumentation.test('noop'):
+            pass
+
+    def testReport(self):
+        reports = []
+        for player in ('alice', 'bob'):
+            collector = Collector()
+            host = instrumentation.instrument(Account('host'), collector)
+            host.push_action('login', {'username': player}, permission=(player, Permission.ACTIVE))
+            host.table('users', host)
+            reports.append(json.loads(json.dumps(collector.toJson())))
+        report = instrumentation.merge(reports + [None])
+        self.assertEqual('engine', report['backend'])
+        self.assertEqual(2, report['histograms']['push_action']['login']['wall_us']['count'])
+
+        stream = io.StringIO()
+        path = instrumentation.finish(report, stream=stream)
+        self.assertEqual(os.path.join(self.dir, 'report.json'), path)
+        with open(path) as f:
+            self.assertEqual(report, json.load(f))
+        self.assertIn('push_action login', stream.getvalue())
+        self.assertIn('table users', stream.getvalue())
+        self.assertIsNone(instrumentation.finish(Collector().toJson(), stream=stream))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+import backend
+import engine_eosf
+import load_generator
+from cardgame_engine import name_to_uint64, uint64_to_name
+from chain_server import ChainServer
+
+
+class CountingTarget(load_generator.EngineTarget):
+
+    def __init__(self):
+        super().__init__()
+        self.inFlight = 0
+        self.peak = 0
+
+    async def push(self, action, data, actor):
+        self.inFlight += 1
+        self.peak = max(self.peak, self.inFlight)
+        try:
+            await asyncio.sleep(0)
+            await super().push(action, data, actor)
+        finally:
+            self.inFlight -= 1
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(backend.select('engine'))
+
+    def _validateReport(self, report, players, games, playround=False):
+        self.assertEqual(players * games, report['games'])
+        self.assertEqual({}, report['failures'])
+        latency = report['latency_ms']
+        for action in ('login', 'startgame', 'endgame'):
+            self.assertEqual(players * games, latency[action]['count'])
+        if playround:
+            self.assertEqual(0, latency['playcard']['count'] + latency['nextround']['count'])
+            self.assertEqual(latency['playround']['count'], report['reads'] - players * games)
+        else:
+            self.assertEqual(latency['playcard']['count'],
+                             latency['nextround']['count'] + players * games)
+        self.assertEqual(report['actions'], sum(summary['count'] for summary in latency.values()))
+
+    def testEngineTarget(self):
+        target = CountingTarget()
+        report = load_generator.run(target, 30, 4, games=2)
+        self._validateReport(report, 30, 2)
+        self.assertEqual(4, target.peak)
+        self.assertEqual(4, report['peak_in_flight'])
+        self.assertEqual(30, len(target.game.users))
+        self.assertTrue(all(user['win_count'] + user['loss_count'] == 2
+                            for user in target.game.users.values()))
+
+    def testPlayround(self):
+        twoStep = load_generator.run(load_generator.EngineTarget(), 20, 4, games=2)
+        target = load_generator.EngineTarget()
+        report = load_generator.run(target, 20, 4, games=2, playround=True)
+        self._validateReport(report, 20, 2, playround=True)
+        self.assertTrue(all(user['win_count'] + user['loss_count'] == 2
+                            for user in target.game.users.values()))
+        self.assertLess(report['round_trips_per_game'], 0.7 * twoStep['round_trips_per_game'])
+
+    def testHttpTarget(self):
+        self.addCleanup(engine_eosf.isolate())
+        with ChainServer() as server:
+            report = load_generator.run(load_generator.HttpTarget(server.url), 10, 3, games=2,
+                                        loginBatch=4)
+        self._validateReport(report, 10, 2)
+        self.assertEqual('http', report['target'])
+        self.assertEqual(10, len(engine_eosf.engine().users))
+
+    def testNodeTarget(self):
+        self.addCleanup(engine_eosf.isolate())
+        report = load_generator.run(load_generator.NodeTarget(3), 5, 3, games=1, loginBatch=2)
+        self._validateReport(report, 5, 1)
+
+    def testFailureReasons(self):
+        generator = load_generator.LoadGenerator(load_generator.EngineTarget(), 1, 1)
+
+        async def race():
+            generator.slots = asyncio.Semaphore(1)
+            generator.start = 0
+            await generator._push('login', 'alice')
+            await generator._push('startgame', 'alice')
+            await generator._push('playcard', 'alice', player_card_idx=0)
+            with self.assertRaises(load_generator.TransactionError):
+                await generator._push('playcard', 'alice', player_card_idx=1)
+            with self.assertRaises(load_generator.TransactionError):
+                await generator._push('nextround', 'bob')
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(race())
+        loop.close()
+        report = generator.report(1)
+        self.assertEqual({'playcard': {'You have already selected a card': 1},
+                          'nextround': {'User does not exist': 1}}, report['failures'])
+        self.assertEqual(3, report['actions'])
+
+    def testPlayerNames(self):
+        names = load_generator.playerNames(100)
+        self.assertEqual(100, len(set(names)))
+        for name in names:
+            self.assertEqual(name, uint64_to_name(name_to_uint64(name)))
+            self.assertLessEqual(len(name), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
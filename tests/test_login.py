@@ -1,12 +1,11 @@
 import unittest
 import sys
-from eosfactory.eosf import *
+from backend import *
 from base_test import BaseTest
+import session
 
 verbosity([Verbosity.INFO, Verbosity.OUT])
 
-CONTRACT_WORKSPACE = sys.path[0] + "/../"
-
 
 class Test(BaseTest):
 
@@ -18,32 +17,15 @@ class Test(BaseTest):
         SCENARIO('''
         Test login action
         ''')
-        reset()
-        create_wallet()
-        create_master_account("master")
-
-        COMMENT('''
-        Build and deploy the contract:
-        ''')
-        create_account("host", master)
-        contract = Contract(host, CONTRACT_WORKSPACE)
-        contract.build(force=True)
-        contract.deploy()
-
-        COMMENT('''
-        Create test accounts:
-        ''')
-        create_account("alice", master)
-        create_account("carol", master)
-        create_account("bob", master)
+        cls.session = session.start(globals(), 'alice', 'carol', 'bob')
 
     def setUp(self):
         pass
 
     def testMultipleLogins(self):
 
-        table = host.table('users', host)
-        initial_num_users = len(table.json['rows'])
+        rows = self._usersRows()
+        initial_num_users = len(rows)
 
         COMMENT('''
         Login first time with Alice
@@ -51,10 +33,10 @@ class Test(BaseTest):
         host.push_action(
             "login", {"username": alice}, permission=(alice, Permission.ACTIVE), forceUnique=1)
 
-        table = host.table('users', host)
+        rows = self._usersRows()
         self.assertEqual(initial_num_users + 1,
-                         len(table.json['rows']), 'Wrong amount of users')
-        user = self._validateUserExists(table.json['rows'], alice.name)
+                         len(rows), 'Wrong amount of users')
+        user = self._validateUserExists(alice.name)
         self._validateUser(user, alice.name)
         self._validateGameData(self._baseGameData(), user['game_data'])
 
@@ -64,10 +46,10 @@ class Test(BaseTest):
         host.push_action(
             "login", {"username": alice}, permission=(alice, Permission.ACTIVE), forceUnique=1)
 
-        table = host.table('users', host)
+        rows = self._usersRows()
         self.assertEqual(initial_num_users + 1,
-                         len(table.json['rows']), 'Wrong amount of users')
-        user = self._validateUserExists(table.json['rows'], alice.name)
+                         len(rows), 'Wrong amount of users')
+        user = self._validateUserExists(alice.name)
         self._validateUser(user, alice.name)
         self._validateGameData(self._baseGameData(), user['game_data'])
 
@@ -77,10 +59,10 @@ class Test(BaseTest):
         host.push_action(
             "login", {"username": carol}, permission=(carol, Permission.ACTIVE), forceUnique=1)
 
-        table = host.table('users', host)
+        rows = self._usersRows()
         self.assertEqual(initial_num_users + 2,
-                         len(table.json['rows']), 'Wrong amount of users')
-        user = self._validateUserExists(table.json['rows'], carol.name)
+                         len(rows), 'Wrong amount of users')
+        user = self._validateUserExists(carol.name)
         self._validateUser(user, carol.name)
         self._validateGameData(self._baseGameData(), user['game_data'])
 
@@ -90,10 +72,10 @@ class Test(BaseTest):
         host.push_action(
             "login", {"username": carol}, permission=(carol, Permission.ACTIVE), forceUnique=1)
 
-        table = host.table('users', host)
+        rows = self._usersRows()
         self.assertEqual(initial_num_users + 2,
-                         len(table.json['rows']), 'Wrong amount of users')
-        user = self._validateUserExists(table.json['rows'], carol.name)
+                         len(rows), 'Wrong amount of users')
+        user = self._validateUserExists(carol.name)
         self._validateUser(user, carol.name)
         self._validateGameData(self._baseGameData(), user['game_data'])
 
@@ -117,7 +99,7 @@ class Test(BaseTest):
 
     @classmethod
     def tearDownClass(cls):
-        stop()
+        pass
 
 
 if __name__ == "__main__":
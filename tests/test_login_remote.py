@@ -1,6 +1,7 @@
-import unittest, argparse, sys, time
+import unittest, argparse, sys
 from eosfactory.eosf import *
 from base_test import BaseTest
+import session
 
 verbosity([Verbosity.INFO, Verbosity.OUT, Verbosity.TRACE])
 
@@ -66,6 +67,8 @@ class Test(BaseTest):
         except errors.ContractRunningError:
             pass
 
+        cls.session = session.Session(master, host)
+
 
     def setUp(self):
         pass
@@ -73,6 +76,7 @@ class Test(BaseTest):
 
     def testMultipleLogins(self):
 
+        self.session.sync()
         table = host.table('users', host)
         initial_num_users = len(table.json['rows'])
 
@@ -82,10 +86,11 @@ class Test(BaseTest):
         host.push_action(
             "login", {"username": alice}, permission=(alice, Permission.ACTIVE), forceUnique=1)
 
+        self.session.sync()
         table = host.table('users', host)
         self.assertEqual(initial_num_users + 1,
                          len(table.json['rows']), 'Wrong amount of users')
-        user = self._validateUserExists(table.json['rows'], alice.name)
+        user = self._validateUserExists(alice.name)
         self._validateUser(user, alice.name)
         self._validateGameData(self._baseGameData(), user['game_data'])
 
@@ -95,10 +100,11 @@ class Test(BaseTest):
         host.push_action(
             "login", {"username": alice}, permission=(alice, Permission.ACTIVE), forceUnique=1)
 
+        self.session.sync()
         table = host.table('users', host)
         self.assertEqual(initial_num_users + 1,
                          len(table.json['rows']), 'Wrong amount of users')
-        user = self._validateUserExists(table.json['rows'], alice.name)
+        user = self._validateUserExists(alice.name)
         self._validateUser(user, alice.name)
         self._validateGameData(self._baseGameData(), user['game_data'])
 
@@ -108,10 +114,11 @@ class Test(BaseTest):
         host.push_action(
             "login", {"username": carol}, permission=(carol, Permission.ACTIVE), forceUnique=1)
 
+        self.session.sync()
         table = host.table('users', host)
         self.assertEqual(initial_num_users + 2,
                          len(table.json['rows']), 'Wrong amount of users')
-        user = self._validateUserExists(table.json['rows'], carol.name)
+        user = self._validateUserExists(carol.name)
         self._validateUser(user, carol.name)
         self._validateGameData(self._baseGameData(), user['game_data'])
 
@@ -121,10 +128,11 @@ class Test(BaseTest):
         host.push_action(
             "login", {"username": carol}, permission=(carol, Permission.ACTIVE), forceUnique=1)
 
+        self.session.sync()
         table = host.table('users', host)
         self.assertEqual(initial_num_users + 2,
                          len(table.json['rows']), 'Wrong amount of users')
-        user = self._validateUserExists(table.json['rows'], carol.name)
+        user = self._validateUserExists(carol.name)
         self._validateUser(user, carol.name)
         self._validateGameData(self._baseGameData(), user['game_data'])
 
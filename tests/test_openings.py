@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+from cardgame_engine import FULL_DECK
+
+try:
+    import numpy as np
+    import openings
+    from simulator import Simulator
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+        cls.path = openings.build(os.path.join(cls.dir, 'openings.npy'), games=1, workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def testRank(self):
+        self.assertEqual(2380, len(openings.HANDS))
+        for i, hand in enumerate(openings.HANDS):
+            self.assertEqual(i, openings.rank(hand))
+        self.assertEqual(openings.rank([1, 5, 9, 16]), openings.rank([16, 9, 1, 5]))
+        self.assertEqual(2379, openings.rank(FULL_DECK[-4:]))
+        for hand in ([1, 2, 3], [1, 1, 2, 3], [0, 1, 2, 3], [1, 2, 3, 18]):
+            with self.assertRaises(ValueError):
+                openings.rank(hand)
+
+    def testTable(self):
+        table = openings.OpeningTable(self.path)
+        self.assertIsInstance(table.table, np.memmap)
+        self.assertEqual(np.float32, table.table.dtype)
+        self.assertEqual(1, table.meta['games'])
+        self.assertEqual(615, table.meta['classes'])
+        # 1 and 2 are both FIRE 1, 6 and 7 both WOOD 1
+        self.assertEqual(table.equity([1, 5, 9, 16], [6, 11, 15, 17]),
+                         table.equity([2, 5, 9, 16], [7, 11, 15, 17]))
+        self.assertEqual(table.equity([3, 5, 9, 16], [6, 11, 15, 17]),
+                         table.game_equity({'hand_player': [16, 9, 5, 3], 'hand_ai': [17, 15, 11, 6]}))
+        self.assertTrue(((table.table >= 0) & (table.table <= 1)).all())
+
+        # startgame deals every opening with equal chance
+        simulator = Simulator(random_mode='uniform', rng=np.random.default_rng(2))
+        self.assertAlmostEqual(simulator.run(40000).win_rate(), float(table.table.mean()), delta=0.02)
+
+    def testSolverBaseline(self):
+        from solver import compare
+        result = compare(2, cards_left=3, seed=4, openings=openings.OpeningTable(self.path))
+        self.assertTrue(0 <= result['opening_equity'] <= 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import copy
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import abi_codec
+import backend
+from cardgame_engine import FULL_DECK, HAND_SIZE, new_game, new_user
+from packed_game import (FULL_DECK_MASK, ROW_OVERHEAD, checkAbi, isPacked, packGame, packedAbi,
+                         report, simulateUsers, unpackDeck, unpackGame)
+from tables import Game, UserInfo
+
+
+class Test(unittest.TestCase):
+
+    def testRoundTrip(self):
+        packed = packGame(new_game())
+        self.assertEqual(FULL_DECK_MASK, packed['deck_player'])
+        self.assertEqual(0, packed['hand_ai'])
+        self.assertTrue(isPacked(packed))
+        self.assertFalse(isPacked(new_game()))
+        for user in simulateUsers(200, seed=1):
+            game_data = user['game_data']
+            self.assertEqual(game_data, unpackGame(packGame(game_data)))
+
+    def testDeckOrder(self):
+        # Drawing index k of the deck takes its k-th set bit
+        rng = random.Random(2)
+        deck = list(FULL_DECK)
+        while deck:
+            packed = packGame(dict(new_game(), deck_player=deck))
+            self.assertEqual(deck, unpackDeck(packed['deck_player']))
+            deck.pop(rng.randrange(len(deck)))
+
+    def testPackedRows(self):
+        codec = abi_codec.Abi(packedAbi())
+        self.assertNotIn('game', codec.structs)
+        for user in simulateUsers(50, seed=3) + [new_user('alice')]:
+            row = dict(user, game_data=packGame(user['game_data']))
+            data = codec.encodeRow('users', row)
+            self.assertEqual(24 + 23, len(data) // 2)
+            decoded = codec.decodeJson('user_info', bytes.fromhex(data))
+            self.assertEqual(row['game_data'], decoded['game_data'])
+            self.assertEqual(user, UserInfo.fromJson(decoded).toJson())
+            self.assertIsInstance(UserInfo.fromJson(decoded).game_data, Game)
+
+    def testCheckAbi(self):
+        self.assertEqual([], checkAbi(packedAbi()))
+        default = abi_codec.abi().abi
+        differences = checkAbi(default)
+        self.assertEqual(1, len(differences))
+        self.assertTrue(differences[0].startswith('table users:'))
+
+        # abigen keeps the stored_game typedef of the PACKED_GAME build
+        generated = copy.deepcopy(packedAbi())
+        generated['types'].append({'new_type_name': 'stored_game', 'type': 'packed_game'})
+        for struct in generated['structs']:
+            for field in struct['fields']:
+                if field['type'] == 'packed_game':
+                    field['type'] = 'stored_game'
+        self.assertEqual([], checkAbi(generated))
+        generated['actions'] = [action for action in generated['actions']
+                                if action['name'] != 'endgame']
+        self.assertEqual(['action endgame missing'], checkAbi(generated))
+
+    @unittest.skipUnless(backend.nodeAvailable(), 'needs eosfactory and a local node')
+    def testNodeBuild(self):
+        # Each build boots its own node, the default one first for its ABI
+        results = {}
+        env = dict(os.environ, **{backend.VARIABLE: 'node'})
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for build in ('default', 'packed'):
+            output = os.path.join(directory, build + '.json')
+            subprocess.check_call(
+                [sys.executable, 'packed_game.py', '--node', '--build', build, '-g', '3',
+                 '-o', output], cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+            with open(output) as f:
+                results[build] = json.load(f)
+        self.assertEqual([], results['packed']['abi_differences'])
+        for result in results.values():
+            self.assertEqual([len(FULL_DECK) - HAND_SIZE], result['deck_player'])
+        self.assertLess(results['packed']['ram_bytes_per_user'],
+                        results['default']['ram_bytes_per_user'])
+
+    def testReport(self):
+        result = report(simulateUsers(300, seed=4))
+        self.assertEqual(300, result['users'])
+        self.assertEqual(47, result['packed_game']['max'])
+        # A fresh game row holds both full decks
+        self.assertEqual(24 + 53, result['game']['max'])
+        self.assertLess(result['packed_game']['total'], result['game']['total'])
+        self.assertEqual(result['game']['total'] + ROW_OVERHEAD * 300, result['game']['billed'])
+        self.assertGreater(result['saved'], result['saved_billed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import unittest
+import parallel_runner
+
+
+class Test(unittest.TestCase):
+
+    def testShard(self):
+        names = ['a', 'b', 'c', 'd', 'e']
+        self.assertEqual([['a', 'd'], ['b', 'e'], ['c']],
+                         parallel_runner.shard(names, 3))
+        self.assertEqual([['a'], ['b'], ['c'], ['d'], ['e']],
+                         parallel_runner.shard(names, 8))
+
+    def testWorkersGetDistinctNodes(self):
+        environments = [parallel_runner.nodeEnvironment(
+            worker, '/tmp/nodes') for worker in range(4)]
+        for key in environments[0]:
+            self.assertEqual(4, len(set(environment[key]
+                                        for environment in environments)))
+        ports = [environment[key].split(':')[1] for environment in environments
+                 for key in ('LOCAL_NODE_ADDRESS', 'WALLET_MANAGER_ADDRESS', 'LOCAL_NODE_P2P_ADDRESS')]
+        self.assertEqual(len(ports), len(set(ports)))
+
+    def testReportMergesResults(self):
+        results = [
+            {'worker': 0, 'names': ['a.Test'], 'seconds': 1.0, 'tests_run': 3,
+             'failures': [], 'errors': [], 'skipped': []},
+            {'worker': 1, 'names': ['b.Test'], 'seconds': 1.0, 'tests_run': 2,
+             'failures': [('testX (b.Test)', 'Traceback')], 'errors': [], 'skipped': []}
+        ]
+        with open(os.devnull, 'w') as stream:
+            self.assertFalse(parallel_runner.report(results, 1.5, stream))
+            self.assertTrue(parallel_runner.report(results[:1], 1.5, stream))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,11 @@
 import unittest
 import sys
-from eosfactory.eosf import *
+from backend import *
 from base_test import BaseTest
+import session
 
 verbosity([Verbosity.INFO, Verbosity.OUT])
 
-CONTRACT_WORKSPACE = sys.path[0] + "/../"
-
 
 class Test(BaseTest):
 
@@ -18,44 +17,14 @@ class Test(BaseTest):
         SCENARIO('''
         Test playcard action
         ''')
-        reset()
-        create_wallet()
-        create_master_account("master")
-
-        COMMENT('''
-        Build and deploy the contract:
-        ''')
-        create_account("host", master)
-        contract = Contract(host, CONTRACT_WORKSPACE)
-        contract.build(force=True)
-        contract.deploy()
-
-        COMMENT('''
-        Create test accounts:
-        ''')
-        create_account("alice", master)
-        create_account("carol", master)
-        create_account("bob", master)
-
-        host.push_action(
-            "login", {"username": alice}, permission=(alice, Permission.ACTIVE), forceUnique=1)
-
-        host.push_action(
-            "login", {"username": bob}, permission=(bob, Permission.ACTIVE), forceUnique=1)
-
-        host.push_action(
-            "startgame", {"username": alice}, permission=(alice, Permission.ACTIVE), forceUnique=1)
-
-        host.push_action(
-            "startgame", {"username": bob}, permission=(bob, Permission.ACTIVE), forceUnique=1)
+        cls.session = session.startFixture(globals(), 'games_started')
 
     def setUp(self):
         pass
 
     def testGameDataAfterPlaycard(self):
 
-        table = host.table('users', host)
-        user = self._validateUserExists(table.json['rows'], alice.name)
+        user = self._validateUserExists(alice.name)
         prevGameData = user['game_data']
         prevHandPlayer = prevGameData['hand_player']
         COMMENT('''
@@ -64,8 +33,7 @@ class Test(BaseTest):
         host.push_action(
             "playcard", {"username": alice, "player_card_idx": 1}, permission=(alice, Permission.ACTIVE), forceUnique=1)
 
-        table = host.table('users', host)
-        user = self._validateUserExists(table.json['rows'], alice.name)
+        user = self._validateUserExists(alice.name)
         self._validateUser(user, alice.name)
         gameData = self._initialGameData()
         gameData['selected_card_player'] = prevHandPlayer[1]
@@ -128,7 +96,7 @@ class Test(BaseTest):
 
     @classmethod
     def tearDownClass(cls):
-        stop()
+        pass
 
 
 if __name__ == "__main__":
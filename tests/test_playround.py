@@ -0,0 +1,99 @@
+import unittest
+import sys
+from backend import *
+from base_test import BaseTest
+import session
+
+verbosity([Verbosity.INFO, Verbosity.OUT])
+
+
+class Test(BaseTest):
+
+    def run(self, result=None):
+        super().run(result)
+
+    @classmethod
+    def setUpClass(cls):
+        SCENARIO('''
+        Test playround action
+        ''')
+        cls.session = session.startFixture(globals(), 'games_started')
+
+    def setUp(self):
+        pass
+
+    def testGameDataAfterPlayround(self):
+
+        user = self._validateUserExists(alice.name)
+        prevGameData = user['game_data']
+        COMMENT('''
+        Playround with Alice
+        ''')
+        host.push_action(
+            "playround", {"username": alice, "player_card_idx": 1}, permission=(alice, Permission.ACTIVE), forceUnique=1)
+
+        user = self._validateUserExists(alice.name)
+        self._validateUser(user, alice.name)
+        gameData = self._baseGameData(
+            deckPlayerSize=12, deckAiSize=12, handAi=False, handPlayer=False)
+        gameData['life_player'] = None
+        gameData['life_ai'] = None
+        self._validateGameData(gameData, user['game_data'])
+        self.assertLessEqual(user['game_data']['life_player'] + user['game_data']['life_ai'],
+                             prevGameData['life_player'] + prevGameData['life_ai'],
+                             'A round never adds life')
+        self.assertNotIn(prevGameData['hand_player'][1], user['game_data']['hand_player'],
+                         'The played card must leave the hand')
+
+    def testPlayroundAfterPlaycard(self):
+
+        COMMENT('''
+            Play card with bob on unplayed hand
+        ''')
+        host.push_action(
+            "playcard", {"username": bob, "player_card_idx": 0}, permission=(bob, Permission.ACTIVE), forceUnique=1)
+
+        COMMENT('''
+        FAIL: Try to playround when a card is already selected
+        ''')
+        with self.assertRaises(Error):
+            host.push_action(
+                "playround", {"username": bob, "player_card_idx": 1}, permission=(bob, Permission.ACTIVE), forceUnique=1)
+
+    def testCardIdxRange(self):
+
+        COMMENT('''
+        FAIL: Try to playround with invalid idx: 4
+        ''')
+        with self.assertRaises(Error):
+            host.push_action(
+                "playround", {"username": alice, "player_card_idx": 4}, permission=(alice, Permission.ACTIVE), forceUnique=1)
+
+    def testExistance(self):
+
+        COMMENT('''
+        FAIL: Try to playround as carol that hasn't logged in:
+        ''')
+        with self.assertRaises(Error):
+            host.push_action(
+                "playround", {"username": carol, "player_card_idx": 0}, permission=(carol, Permission.ACTIVE), forceUnique=1)
+
+    def testAuthority(self):
+
+        COMMENT('''
+        FAIL: Try to playround as Bob using Alice permission:
+        ''')
+        with self.assertRaises(MissingRequiredAuthorityError):
+            host.push_action(
+                "playround", {"username": bob, "player_card_idx": 0}, permission=(alice, Permission.ACTIVE), forceUnique=1)
+
+    def tearDown(self):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+import unittest
+import action_log
+import engine_eosf
+from cardgame_engine import ONGOING, choose_ai_card_idx, copy_user
+from engine_eosf import Account, Permission
+
+try:
+    import numpy as np
+    from round_store import NO_STRATEGY, ROUND_DTYPE, RoundStore, fromActionLog
+    from simulator import Simulator
+except ImportError:
+    np = None
+
+
+def randomRows(rng, count):
+    rows = np.zeros(count, dtype=ROUND_DTYPE)
+    rows['game'] = np.arange(count) // 9
+    rows['round'] = np.arange(count) % 9 + 1
+    rows['strategy'] = rng.integers(0, 4, count)
+    rows['life_lost_ai'] = rng.integers(0, 6, count)
+    rows['status'] = rng.integers(-1, 2, count)
+    return rows
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'rounds')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testAppendAndQuery(self):
+        rows = randomRows(np.random.default_rng(1), 10000)
+        with RoundStore(self.path, 'a', chunkRows=777) as store:
+            for start in range(0, len(rows), 1234):
+                store.append(rows[start:start + 1234])
+            self.assertEqual(len(rows) // 777 * 777, len(store))
+
+        store = RoundStore(self.path, chunkRows=500)
+        self.assertEqual(len(rows), len(store))
+        self.assertIsInstance(store.column('strategy'), np.memmap)
+        self.assertTrue((store.query().select() == rows).all())
+
+        mask = (rows['strategy'] == 1) & (rows['status'] == ONGOING) & \
+            (rows['round'] >= 2) & (rows['round'] < 5)
+        query = store.where(strategy=1, status=ONGOING, round=range(2, 5))
+        self.assertEqual(int(mask.sum()), query.count())
+        self.assertEqual(int(rows['life_lost_ai'][mask].sum()), query.sum('life_lost_ai'))
+        self.assertAlmostEqual(float(rows['life_lost_ai'][mask].mean()), query.mean('life_lost_ai'))
+        self.assertTrue((rows[mask][['game', 'round']] == query.select('game', 'round')).all())
+        self.assertEqual(int(np.isin(rows['strategy'], [0, 3]).sum()),
+                         store.where(strategy={0, 3}).count())
+        values, counts = np.unique(rows['status'], return_counts=True)
+        self.assertEqual(dict(zip(values.tolist(), counts.tolist())), store.query().counts('status'))
+        self.assertIsNone(store.where(round=100).mean('life_lost_ai'))
+        with self.assertRaises(ValueError):
+            store.where(card=1)
+        with self.assertRaises(IOError):
+            store.append(rows)
+
+    def testUncommittedTail(self):
+        rows = randomRows(np.random.default_rng(2), 100)
+        with RoundStore(self.path, 'a') as store:
+            store.append({'game': rows['game'], 'round': rows['round']})
+        # A writer killed after writing a column, before committing it
+        with open(os.path.join(self.path, 'game.bin'), 'ab') as f:
+            f.write(b'\xff' * 40)
+        with RoundStore(self.path, 'a') as store:
+            self.assertEqual(100, len(store))
+            store.append(rows[:10])
+        store = RoundStore(self.path)
+        self.assertEqual(110, len(store))
+        self.assertTrue((store.column('game')[100:] == rows['game'][:10]).all())
+        self.assertTrue((store.column('strategy')[:100] == NO_STRATEGY).all())
+
+    def testSimulator(self):
+        with RoundStore(self.path, 'a', chunkRows=1000) as store:
+            result = Simulator(random_mode='uniform', rng=np.random.default_rng(3)).run(
+                3000, batchSize=1100, store=store)
+        store = RoundStore(self.path)
+        self.assertEqual(3000, store.games)
+        self.assertEqual(int(result.rounds.sum()), len(store))
+        self.assertEqual(np.bincount(store.column('game'), minlength=3000).tolist(),
+                         result.rounds.tolist())
+        # A batch is written round by round
+        last = np.sort(store.where(status=[-1, 1]).select('game', 'round', 'status'), order='game')
+        self.assertEqual(list(range(3000)), last['game'].tolist())
+        self.assertEqual(result.rounds.tolist(), last['round'].tolist())
+        self.assertEqual(result.status.tolist(), last['status'].tolist())
+        self.assertEqual(result.strategies.sum(axis=0).tolist(),
+                         [store.where(strategy=i).count() for i in range(4)])
+        self.assertEqual(int(result.life_lost_ai.sum()), store.query().sum('life_lost_ai'))
+
+    def testActionLog(self):
+        self.addCleanup(engine_eosf.isolate())
+        now = [1541212952]
+        game = engine_eosf.engine()
+        game.clock = lambda: now[0]
+        logPath = os.path.join(self.dir, 'actions.log')
+        befores = []
+        with action_log.ActionLog(logPath) as log:
+            recorder = action_log.Recorder(Account('host'), log)
+
+            def push(action, player, **data):
+                data['username'] = player
+                now[0] += 3
+                recorder.push_action(action, data, permission=(player, Permission.ACTIVE))
+
+            for player in ('alice', 'bob'):
+                push('login', player)
+                for _ in range(2):
+                    push('startgame', player)
+                    while True:
+                        befores.append(copy_user(game.users[player])['game_data'])
+                        hand = befores[-1]['hand_player']
+                        # bob plays each round with a single playround
+                        push('playround' if player == 'bob' else 'playcard', player,
+                             player_card_idx=max(i for i, cardId in enumerate(hand) if cardId))
+                        if game.users[player]['game_data']['status'] != ONGOING:
+                            break
+                        if player != 'bob':
+                            push('nextround', player)
+
+        with RoundStore(self.path, 'a') as store:
+            self.assertEqual(len(befores), fromActionLog(logPath, store))
+        rounds = RoundStore(self.path).query().select()
+        self.assertEqual(4, len(np.unique(rounds['game'])))
+        self.assertEqual(4, int((rounds['status'] != ONGOING).sum()))
+        self.assertEqual(1, rounds['round'][0])
+        for row, before in zip(rounds, befores):
+            self.assertEqual(row['round'] == 1, before['selected_card_ai'] == 0 and
+                             len(before['deck_ai']) == 13)
+            idx = choose_ai_card_idx(int(row['strategy']), before)
+            self.assertEqual(before['hand_ai'][idx], row['selected_card_ai'])
+            self.assertEqual(before['life_player'] - row['life_lost_player'], row['life_player'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from cardgame_engine import *
+from score_tables import ATTACK_MATRIX, score_table
+
+
+class Test(unittest.TestCase):
+
+    def testAttackMatrix(self):
+        self.assertEqual(18, len(ATTACK_MATRIX))
+        for card1 in CARD_DICT:
+            for card2 in CARD_DICT:
+                self.assertEqual(calculate_attack_point(card1, card2),
+                                 ATTACK_MATRIX[card1][card2])
+
+    def testTableMatchesContractFunctions(self):
+        table = score_table()
+        self.assertEqual(5985, len(table.multisets))
+        self.assertEqual(18 * 18 + 5985 * 18 * (3 + 10 + 2), table.verify())
+
+    def testHandOrderIsIgnored(self):
+        table = score_table()
+        self.assertEqual(table.score(0, 5, 1, [6, 11, 0, 16]),
+                         table.score(0, 5, 1, [16, 0, 6, 11]))
+        self.assertEqual(calculate_ai_card_score(3, -9, 16, [1, 17, 0, 0]),
+                         table.score(3, -9, 16, [1, 17, 0, 0]))
+
+    def testEngineWithScoreTable(self):
+        clock = [1541000000]
+        plain = CardGame(clock=lambda: clock[0])
+        fast = CardGame(clock=lambda: clock[0], score_table=score_table())
+        for game in (plain, fast):
+            game.login('alice')
+        for _ in range(50):
+            for game in (plain, fast):
+                game.startgame('alice')
+            while plain.users['alice']['game_data']['status'] == ONGOING:
+                clock[0] += 3
+                hand = plain.users['alice']['game_data']['hand_player']
+                idx = next(i for i, cardId in enumerate(hand) if cardId)
+                for game in (plain, fast):
+                    game.playcard('alice', idx)
+                if plain.users['alice']['game_data']['status'] == ONGOING:
+                    for game in (plain, fast):
+                        game.nextround('alice')
+                self.assertEqual(plain.rows('users'), fast.rows('users'))
+            clock[0] += 1
+
+
+if __name__ == "__main__":
+    unittest.main()
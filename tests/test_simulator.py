@@ -0,0 +1,81 @@
+import unittest
+from cardgame_engine import *
+
+try:
+    import numpy as np
+    from simulator import Simulator
+except ImportError:
+    np = None
+
+
+def playEngineGame(startTime, actionInterval=1, hands=None, seed=1):
+    clock = [startTime]
+    game = CardGame(clock=lambda: clock[0])
+    game.login('alice')
+    game.startgame('alice')
+    if hands is not None:
+        gameData = game.users['alice']['game_data'] = new_game()
+        for side, hand in zip(('player', 'ai'), hands):
+            gameData['hand_' + side] = list(hand)
+            gameData['deck_' + side] = [c for c in FULL_DECK if c not in hand]
+        game.seed = {'key': 1, 'value': seed}
+    rounds = 0
+    while game.users['alice']['game_data']['status'] == ONGOING:
+        clock[0] += actionInterval
+        hand = game.users['alice']['game_data']['hand_player']
+        game.playcard('alice', next(i for i, cardId in enumerate(hand) if cardId))
+        rounds += 1
+        clock[0] += actionInterval
+        if game.users['alice']['game_data']['status'] == ONGOING:
+            game.nextround('alice')
+    return game.users['alice']['game_data'], rounds
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class Test(unittest.TestCase):
+
+    def testMatchesEngine(self):
+        startTimes = np.arange(1541000000, 1541000000 + 300 * 7, 7)
+        simulator = Simulator(player_policy='first')
+        result = simulator.play(
+            len(startTimes), seeds=np.ones(len(startTimes)), startTimes=startTimes)
+
+        for i, startTime in enumerate(startTimes):
+            gameData, rounds = playEngineGame(int(startTime))
+            self.assertEqual(gameData['status'], result.status[i])
+            self.assertEqual(rounds, result.rounds[i])
+            self.assertEqual(5 - gameData['life_player'],
+                             result.life_lost_player[i])
+            self.assertEqual(5 - gameData['life_ai'], result.life_lost_ai[i])
+
+    def testDealtHands(self):
+        rng = np.random.default_rng(5)
+        hands = (np.array([rng.permutation(FULL_DECK)[:4] for _ in range(100)]),
+                 np.array([rng.permutation(FULL_DECK)[:4] for _ in range(100)]))
+        startTimes = np.arange(1541000000, 1541000000 + 100 * 3, 3)
+        result = Simulator(player_policy='first').play(
+            100, seeds=np.full(100, 7), startTimes=startTimes, hands=hands)
+        for i, startTime in enumerate(startTimes):
+            gameData, rounds = playEngineGame(
+                int(startTime), hands=(hands[0][i].tolist(), hands[1][i].tolist()), seed=7)
+            self.assertEqual(gameData['status'], result.status[i])
+            self.assertEqual(rounds, result.rounds[i])
+
+    def testSummary(self):
+        simulator = Simulator(random_mode='uniform',
+                              rng=np.random.default_rng(1))
+        result = simulator.run(2000, batchSize=700)
+        summary = result.summary()
+        self.assertEqual(2000, summary['games'])
+        self.assertFalse((result.status == ONGOING).any())
+        self.assertAlmostEqual(
+            1, summary['win_rate'] + summary['loss_rate'])
+        self.assertTrue(((result.rounds >= 1) & (result.rounds <= 17)).all())
+        self.assertEqual(result.rounds.sum(), sum(summary['strategy_picks']))
+        self.assertTrue((result.strategy_won <= result.strategies).all())
+        self.assertEqual(int((result.life_lost_player - result.life_lost_ai).sum()),
+                         sum(summary['strategy_swing']))
+
+
+if __name__ == "__main__":
+    unittest.main()
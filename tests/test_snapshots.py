@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import backend
+import build_cache
+import engine_eosf
+import session
+import snapshots
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(backend.select('engine'))
+        self.dir = tempfile.mkdtemp()
+        self.store = snapshots.SnapshotStore(os.path.join(self.dir, 'snapshots'))
+        self.addCleanup(engine_eosf.isolate())
+        self.session = session.Session(engine_eosf.Account('eosio'), engine_eosf.Account('host'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testStageActions(self):
+        self.assertEqual([], snapshots.stageActions('deployed'))
+        self.assertEqual(4, len(snapshots.stageActions('games_started')))
+        with self.assertRaises(ValueError):
+            snapshots.stageActions('unknown')
+
+    def testCaptureAndRestore(self):
+        players, restored = snapshots.fixture('games_started', self.session, self.store)
+        self.assertFalse(restored)
+        self.assertEqual(set(snapshots.PLAYERS), set(players))
+        game = engine_eosf.engine()
+        captured = game.rows('users')
+        self.assertEqual(2, len(captured))
+        self.assertEqual(['alice', 'bob'], sorted(
+            alias for alias, account in players.items() if account.name in game.users))
+
+        alice = players['alice'].name
+        game.playcard(alice, 0)
+        game.login(self.session.createPlayer('dave').name)
+        self.addCleanup(engine_eosf.isolate())
+        # Rows of other modules sharing the engine survive a restore
+        engine_eosf.engine().login('other')
+
+        fresh = session.Session(engine_eosf.Account('eosio'), engine_eosf.Account('host'))
+        restoredPlayers, restored = snapshots.fixture('games_started', fresh, self.store)
+        self.assertTrue(restored)
+        self.assertEqual({alias: account.name for alias, account in players.items()},
+                         {alias: account.name for alias, account in restoredPlayers.items()})
+        rows = engine_eosf.engine().rows('users')
+        self.assertEqual(captured, [row for row in rows if row['name'] != 'other'])
+        self.assertEqual(3, len(rows))
+        self.assertEqual(captured[0], fresh.users.get(captured[0]['name']).toJson())
+        self.assertEqual(self.session.accounts - 1, fresh.accounts)
+        self.assertNotIn(fresh.createPlayer('alice').name,
+                         [account.name for account in players.values()])
+
+    def testWasmChangeInvalidates(self):
+        wasm = os.path.join(self.dir, 'cardgame.wasm')
+        with open(wasm, 'wb') as f:
+            f.write(b'\0asm1')
+        first = snapshots.snapshotKey('logged_in', wasm)
+        self.assertNotEqual(first, snapshots.snapshotKey('games_started', wasm))
+        with open(wasm, 'wb') as f:
+            f.write(b'\0asm2')
+        second = snapshots.snapshotKey('logged_in', wasm)
+        self.assertNotEqual(first, second)
+        # So does a change of the engine
+        engine = os.path.join(self.dir, 'cardgame_engine.py')
+        with open(engine, 'w') as f:
+            f.write('# changed\n')
+        self.assertNotEqual(second, snapshots.snapshotKey('logged_in', wasm, engine))
+
+        players = snapshots.build('logged_in', self.session)
+        self.store.capture('logged_in', first, self.session, players)
+        self.assertIsNotNone(self.store.load('logged_in', first))
+        self.assertIsNone(self.store.load('logged_in', second))
+        self.store.capture('logged_in', second, self.session, players)
+        self.assertEqual([os.path.basename(self.store.path('logged_in', second))],
+                         os.listdir(self.store.directory))
+
+    def testSessionStartFixture(self):
+        testGlobals = {}
+        snapshotDir = snapshots.SNAPSHOT_DIR
+        snapshots.SNAPSHOT_DIR = self.store.directory
+        try:
+            self.session.bindFixture(testGlobals, 'logged_in')
+        finally:
+            snapshots.SNAPSHOT_DIR = snapshotDir
+        self.assertEqual(['logged_in-'], [entry[:10] for entry in os.listdir(self.store.directory)])
+        self.assertEqual({'master', 'host', 'alice', 'carol', 'bob'}, set(testGlobals))
+        self.assertIsNotNone(self.session.users.get(testGlobals['bob'].name))
+        self.assertIsNone(self.session.users.get(testGlobals['carol'].name))
+
+    def testRestorable(self):
+        workspace = os.path.join(self.dir, 'workspace')
+        os.makedirs(os.path.join(workspace, 'src'))
+        os.makedirs(os.path.join(workspace, 'build'))
+        for path in ['src/cardgame.cpp'] + ['build/' + artifact for artifact in build_cache.ARTIFACTS]:
+            with open(os.path.join(workspace, path), 'w') as f:
+                f.write(path)
+        cache = build_cache.BuildCache(workspace)
+        cache.save({'key': build_cache.cacheKey(workspace),
+                    'artifacts': cache.artifactHashes(), 'history': []})
+
+        players = snapshots.build('logged_in', self.session)
+        self.store.capture('logged_in', snapshots.snapshotKey('logged_in'), self.session, players)
+        # Only a node session skips its reset
+        self.assertFalse(snapshots.restorable('logged_in', self.store, workspace))
+        self.addCleanup(backend.select('node'))
+        self.assertFalse(snapshots.restorable('logged_in', self.store, workspace))
+        key = snapshots.snapshotKey('logged_in')
+        os.makedirs(self.store.path('logged_in', key))
+        with open(os.path.join(self.store.path('logged_in', key), 'meta.json'), 'w') as f:
+            json.dump({'stage': 'logged_in', 'key': key}, f)
+        self.assertTrue(snapshots.restorable('logged_in', self.store, workspace))
+        self.assertFalse(snapshots.restorable('games_started', self.store, workspace))
+        # Nor when the sources changed since the build the snapshot ran
+        with open(os.path.join(workspace, 'src', 'cardgame.cpp'), 'w') as f:
+            f.write('changed')
+        self.assertFalse(snapshots.restorable('logged_in', self.store, workspace))
+
+    @unittest.skipUnless(backend.nodeAvailable(), 'needs eosfactory and a local node')
+    def testStartFromSnapshotOnNode(self):
+        # The first process captures the stage, the second starts from it
+        # without a reset and pushes with the keys of the restored wallet
+        output = os.path.join(self.dir, 'alice.json')
+        script = (
+            'import json, session\n'
+            'from eosfactory.eosf import Permission\n'
+            'testGlobals = {}\n'
+            'session.startFixture(testGlobals, "games_started")\n'
+            'alice = testGlobals["alice"]\n'
+            'testGlobals["host"].push_action("playcard", {"username": alice, "player_card_idx": 0},\n'
+            '                                permission=(alice, Permission.ACTIVE), forceUnique=1)\n'
+            'with open({!r}, "w") as f:\n'
+            '    json.dump(session.get().users.get(alice.name).toJson(), f)\n'
+        ).format(output)
+        env = dict(os.environ, **{backend.VARIABLE: 'node'})
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        cache = build_cache.BuildCache()
+        rows = []
+        for _ in range(2):
+            history = cache.load()['history']
+            subprocess.check_call([sys.executable, '-c', script], cwd=cwd, env=env)
+            with open(output) as f:
+                rows.append(json.load(f))
+        # The second boot neither reset the node nor looked up a build
+        self.assertEqual(history, cache.load()['history'])
+        self.assertEqual(rows[0], rows[1])
+        self.assertNotEqual(0, rows[1]['game_data']['selected_card_player'])
+
+
+if __name__ == '__main__':
+    unittest.main()
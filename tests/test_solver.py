@@ -0,0 +1,149 @@
+import random
+import unittest
+from cardgame_engine import (ONGOING, PLAYER_WON, CardGame, choose_ai_card_idx, copy_user,
+                             num_strategies, resolve_selected_cards, update_game_status)
+from solver import SearchLimit, Solver, compare, play_game
+
+
+def bruteForce(user):
+    '''Win probability of optimal play, enumerating the engine's own game
+    steps on the real card ids.
+    '''
+    hand = user['game_data']['hand_player']
+    return max(_playcard(user, idx) for idx, cardId in enumerate(hand) if cardId)
+
+
+def _playcard(user, idx):
+    strategies = num_strategies(user['game_data']['life_ai'])
+    total = 0.0
+    for strategy in range(strategies):
+        played = copy_user(user)
+        game_data = played['game_data']
+        aiIdx = choose_ai_card_idx(strategy, game_data)
+        game_data['selected_card_ai'] = game_data['hand_ai'][aiIdx]
+        game_data['hand_ai'][aiIdx] = 0
+        game_data['selected_card_player'] = game_data['hand_player'][idx]
+        game_data['hand_player'][idx] = 0
+        resolve_selected_cards(game_data)
+        update_game_status(played)
+        if game_data['status'] != ONGOING:
+            total += game_data['status'] == PLAYER_WON
+            continue
+        game_data['selected_card_ai'] = game_data['selected_card_player'] = 0
+        game_data['life_lost_ai'] = game_data['life_lost_player'] = 0
+        draws = [(p, a) for p in range(len(game_data['deck_player']) or 1)
+                 for a in range(len(game_data['deck_ai']) or 1)]
+        value = 0.0
+        for p, a in draws:
+            drawn = copy_user(played)
+            for deck, hand, pick in (('deck_player', 'hand_player', p), ('deck_ai', 'hand_ai', a)):
+                cards = drawn['game_data'][deck]
+                if cards:
+                    slots = drawn['game_data'][hand]
+                    slots[slots.index(0)] = cards.pop(pick)
+            value += bruteForce(drawn)
+        total += value / len(draws)
+    return total / strategies
+
+
+def lateGame(seed, deckSize):
+    '''A game played at random until deckSize cards are left per deck.
+    '''
+    rng = random.Random(seed)
+    now = [rng.randrange(1500000000, 1600000000)]
+
+    def clock():
+        now[0] += rng.randrange(1, 5)
+        return now[0]
+
+    game = CardGame(clock=clock)
+    game.login('player')
+    game.startgame('player')
+    while True:
+        game_data = game.users['player']['game_data']
+        if len(game_data['deck_player']) <= deckSize:
+            return game
+        game.playcard('player', rng.choice([i for i, c in enumerate(game_data['hand_player']) if c]))
+        if game.users['player']['game_data']['status'] != ONGOING:
+            game.startgame('player')
+        else:
+            game.nextround('player')
+
+
+class Test(unittest.TestCase):
+
+    def testExactLateGame(self):
+        solver = Solver()
+        for seed in range(6):
+            for lives in (None, (1, 4)):
+                game = lateGame(seed, 1)
+                user = game.users['player']
+                if lives:
+                    user['game_data']['life_player'], user['game_data']['life_ai'] = lives
+                decision = solver.decide(user['game_data'])
+                hand = user['game_data']['hand_player']
+                self.assertEqual(sorted(i for i, c in enumerate(hand) if c), sorted(decision.values))
+                for idx, value in decision.values.items():
+                    self.assertAlmostEqual(_playcard(user, idx), value)
+                self.assertAlmostEqual(max(decision.values.values()), decision.value)
+                self.assertEqual(decision.value, decision.values[decision.card_idx])
+
+    def testCardClasses(self):
+        solver = Solver()
+        self.assertEqual(12, len(solver.cards))
+        self.assertEqual(solver.class_of[1], solver.class_of[2])
+        self.assertNotEqual(solver.class_of[1], solver.class_of[3])
+        self.assertEqual(0, solver.class_of[0])
+
+    def testPackedState(self):
+        solver = Solver()
+        game_data = lateGame(2, 4).users['player']['game_data']
+        state = solver.state(game_data)
+        # Cards of one class are the same card, player hands are multisets
+        swapped = dict(game_data, hand_player=list(reversed(game_data['hand_player'])),
+                       deck_ai=[{1: 2, 2: 1}.get(c, c) for c in game_data['deck_ai']])
+        self.assertEqual(state, solver.state(swapped))
+        # The AI hand keeps its slot order
+        hand_ai = list(game_data['hand_ai'])
+        i, j = next((i, j) for i in range(len(hand_ai)) for j in range(i)
+                    if solver.class_of[hand_ai[i]] != solver.class_of[hand_ai[j]])
+        hand_ai[i], hand_ai[j] = hand_ai[j], hand_ai[i]
+        self.assertNotEqual(state, solver.state(dict(game_data, hand_ai=hand_ai)))
+
+    def testPlaysOutFromTable(self):
+        game = lateGame(3, 3)
+        now = [1541212952]
+        game.clock = lambda: now[0]
+        solver = Solver()
+        decisions = []
+
+        def choose(game_data):
+            now[0] += 3
+            decisions.append(solver.decide(game_data))
+            return decisions[-1].card_idx
+
+        self.assertNotEqual(ONGOING, play_game(game, 'player', choose)['status'])
+        self.assertTrue(0 < decisions[0].value < 1)
+        # The first decision solved every state the game could reach
+        self.assertEqual({decisions[0].states}, {decision.states for decision in decisions})
+
+    def testSearchLimit(self):
+        game_data = lateGame(4, 4).users['player']['game_data']
+        solver = Solver(max_states=50)
+        with self.assertRaises(SearchLimit):
+            solver.decide(game_data)
+        self.assertEqual(50, len(solver.table))
+        # What was stored is exact, a larger table finishes the search
+        solver.max_states = 100000
+        self.assertAlmostEqual(Solver().decide(game_data).value, solver.decide(game_data).value)
+
+    def testCompare(self):
+        result = compare(4, cards_left=3, seed=5)
+        self.assertEqual(4, result['games'])
+        self.assertLessEqual(result['positions'], 4)
+        for key in ('solver_win_rate', 'random_win_rate'):
+            self.assertTrue(0 <= result[key] <= 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
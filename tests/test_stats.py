@@ -0,0 +1,27 @@
+import unittest
+from stats import percentile, summarize
+
+
+class Test(unittest.TestCase):
+
+    def testPercentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(95, percentile(values, 95))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(100, percentile(values, 100))
+        self.assertEqual(1, percentile(values, 0))
+        self.assertEqual(7, percentile([7], 99))
+        self.assertIsNone(percentile([], 50))
+
+    def testSummarize(self):
+        summary = summarize([3, 1, 2])
+        self.assertEqual(3, summary['count'])
+        self.assertEqual(2, summary['mean'])
+        self.assertEqual(2, summary['p50'])
+        self.assertEqual(3, summary['p99'])
+        self.assertEqual({'count': 0}, summarize([]))
+
+
+if __name__ == "__main__":
+    unittest.main()
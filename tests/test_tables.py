@@ -0,0 +1,84 @@
+import io
+import json
+import unittest
+import engine_eosf
+from tables import Game, UserInfo, UsersTable, export, iterRows
+
+
+class CountingHost(engine_eosf.Account):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.reads = []
+        self.limits = []
+
+    def table(self, table_name, scope, **kwargs):
+        result = super().table(table_name, scope, **kwargs)
+        self.reads.append(len(result.json['rows']))
+        self.limits.append(kwargs.get('limit'))
+        return result
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(engine_eosf.isolate())
+        self.engine = engine_eosf.engine()
+        self.host = CountingHost('host')
+        self.users = UsersTable(self.host)
+        for i in range(200):
+            self.engine.login('user' + 'abcdefghijklmnopqrstuvwxyz'[i % 26] + '12345'[i // 26 % 5] + 'abcdefgh'[i // 130])
+
+    def testGetReadsSingleRow(self):
+        self.engine.login('alice')
+        self.engine.startgame('alice')
+        user = self.users.get('alice')
+        self.assertEqual([1], self.host.reads)
+        self.assertIsInstance(user, UserInfo)
+        self.assertIsInstance(user.game_data, Game)
+        self.assertEqual(self.engine.users['alice'], user.toJson())
+        self.assertEqual(user.game_data.hand_player, user['game_data']['hand_player'])
+
+    def testMissingUser(self):
+        self.engine.login('alicf')
+        self.assertIsNone(self.users.get('alice'))
+        self.assertIsNone(self.users.get('zzzzz'))
+
+    def testEveryUserIsFound(self):
+        for name in self.engine.users:
+            self.assertEqual(name, self.users.get(name).name)
+        self.assertEqual([1] * len(self.engine.users), self.host.reads)
+
+    def testIterRowsPages(self):
+        expected = self.engine.rows('users')
+        for pageSize in (1, 7, 200, 1000):
+            self.host.reads = []
+            rows = list(iterRows(self.host, 'users', pageSize=pageSize))
+            self.assertEqual(expected, rows)
+            self.assertTrue(all(read <= pageSize for read in self.host.reads))
+            self.assertEqual(-(-200 // pageSize), len(self.host.reads))
+
+    def testIterRowsPrefetch(self):
+        rows = list(iterRows(self.host, 'users', pageSize=9, prefetch=True))
+        self.assertEqual(self.engine.rows('users'), rows)
+
+        rows = iterRows(self.host, 'users', pageSize=9, prefetch=True)
+        self.assertEqual(self.engine.rows('users')[:3], [next(rows) for _ in range(3)])
+        rows.close()
+
+    def testIterRowsIsLazy(self):
+        rows = iterRows(self.host, 'users', pageSize=10)
+        next(rows)
+        self.assertEqual([10], self.host.reads)
+
+    def testUsersRowsAndExport(self):
+        users = list(self.users.rows(pageSize=50))
+        self.assertEqual(200, len(users))
+        stream = io.StringIO()
+        self.assertEqual(200, export(self.users.rows(pageSize=50, prefetch=True), stream))
+        self.assertEqual([user.toJson() for user in users],
+                         [json.loads(line) for line in stream.getvalue().splitlines()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
-import unittest, argparse, sys, time
+import unittest, argparse, sys
 from eosfactory.eosf import *
+import block_wait
 
 verbosity([Verbosity.INFO, Verbosity.OUT, Verbosity.TRACE])
 
@@ -86,7 +87,7 @@ class Test(unittest.TestCase):
                 COMMENT('''
                 We need to close the previous game before creating a new one:
                 ''')
-                host.push_action(
+                closed = host.push_action(
                     "close",
                     {
                         "challenger": alice,
@@ -94,7 +95,7 @@ class Test(unittest.TestCase):
                     },
                     permission=(carol, Permission.ACTIVE))
 
-                time.sleep(3)
+                block_wait.waitFor(closed)
 
                 COMMENT('''
                 Second attempt to create a new game: